@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+跨节目的重复音频识别
+同一段音频常以不同的节目URL出现（转载、多个节目同步发布、换了CDN签名的重新上传），
+提交语音识别前依次用代价很低的标识查找已经转录过的音频：规范化后的音频URL、
+音频开头和结尾各几MB的哈希（通过Range请求获取，忽略ID3标签），以及可选的声学指纹（chromaprint的fpcalc）。
+找到时直接复用之前的转录结果；总结缓存以转录文本为键，相同的转录文本也会复用已有的总结
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import array
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import subprocess
+from urllib.parse import parse_qsl, unquote, urlencode, urlparse
+
+import requests
+from dotenv import load_dotenv
+
+import http_client
+import metrics
+import transcript_cache
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("audio_dedup")
+
+# 去重配置
+DEDUP_ENABLED = os.getenv("AUDIO_DEDUP", "1").lower() not in ("0", "false", "no")
+DEDUP_PATH = os.getenv("AUDIO_DEDUP_PATH", os.path.join(".cache", "audio_dedup.sqlite3"))
+HASH_BYTES = int(float(os.getenv("AUDIO_DEDUP_HASH_MB", "1")) * 1024 * 1024)  # 开头和结尾各取多少字节计算哈希
+FINGERPRINT_ENABLED = os.getenv("AUDIO_DEDUP_FINGERPRINT", "0").lower() in ("1", "true", "yes")
+FPCALC_BINARY = os.getenv("FPCALC_BINARY", "fpcalc")
+FINGERPRINT_SECONDS = 120       # 只对开头这么长的音频计算指纹
+FINGERPRINT_THRESHOLD = 0.85    # 指纹相似度（相同比特的比例）不低于该值视为同一音频
+FINGERPRINT_MAX_SHIFT = 8       # 比较指纹时允许的最大错位（指纹项数）
+DURATION_TOLERANCE = 2.0        # 指纹候选的时长差（秒）
+
+CONTENT_RANGE_RE = re.compile(r'bytes (\d+)-(\d+)/(\d+)')
+ID3V1_SIZE = 128
+
+KINDS = ("url", "hash", "fingerprint")
+
+# 规范化URL时去掉的查询参数（不区分大小写）：CDN签名、过期时间和追踪参数，其余参数可能用于选择音频文件，保留
+VOLATILE_PARAMS = frozenset([
+    "sign", "signature", "sig", "token", "auth_key", "auth", "expires", "expire", "e", "t", "ts", "timestamp",
+    "policy", "key-pair-id", "ossaccesskeyid", "hdnts", "wssecret", "wstime", "txsecret", "txtime",
+    "fbclid", "gclid", "from", "source", "share",
+])
+VOLATILE_PARAM_PREFIXES = ("x-amz-", "x-oss-", "x-cos-", "utm_")
+
+
+def normalize_url(audio_url):
+    """
+    规范化音频URL：去掉协议、片段以及CDN签名和追踪参数，其余查询参数排序后保留（有些服务端用 ?id= 选择音频），
+    主机名转为小写，合并重复的斜杠
+    """
+    parsed = urlparse(audio_url.strip())
+    path = re.sub(r'/{2,}', '/', unquote(parsed.path))
+    params = sorted(
+        (name, value) for name, value in parse_qsl(parsed.query, keep_blank_values=True)
+        if name.lower() not in VOLATILE_PARAMS and not name.lower().startswith(VOLATILE_PARAM_PREFIXES)
+    )
+    return f"{parsed.netloc.lower()}{path}" + (f"?{urlencode(params)}" if params else "")
+
+
+def _fetch_range(audio_url, headers, range_value):
+    """
+    请求一个字节区间
+
+    返回:
+        tuple: (内容, 文件总大小)，服务端不支持Range请求时返回None
+    """
+    response = http_client.get(audio_url, headers=dict(headers or {}, Range=f"bytes={range_value}"), stream=True)
+    try:
+        response.raise_for_status()
+        match = CONTENT_RANGE_RE.match(response.headers.get('Content-Range', ''))
+        # 不支持Range时服务端会返回整个文件，不为了计算哈希下载全部内容
+        if response.status_code != 206 or not match:
+            return None
+        content = response.content
+        metrics.incr("dedup_hash_bytes_total", len(content), help="计算音频哈希时下载的字节数")
+        return content, int(match.group(3))
+    finally:
+        response.close()
+
+
+def _id3v2_size(head):
+    """文件开头ID3v2标签的长度（包括标签头），没有标签时为0"""
+    if len(head) < 10 or head[:3] != b'ID3':
+        return 0
+    size = 0
+    for byte in head[6:10]:
+        size = (size << 7) | (byte & 0x7f)
+    footer = 10 if head[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def range_hash(audio_url, headers=None, hash_bytes=None):
+    """
+    计算音频开头和结尾各hash_bytes字节的哈希
+
+    转载时常会改写ID3标签（标题、封面），因此跳过文件开头的ID3v2标签和结尾的ID3v1标签，
+    只对音频数据计算哈希，数据长度也参与计算
+
+    返回:
+        str: 哈希值，服务端不支持Range请求或请求失败时返回None
+    """
+    hash_bytes = hash_bytes or HASH_BYTES
+    try:
+        result = _fetch_range(audio_url, headers, f"0-{hash_bytes - 1}")
+        if result is None:
+            return None
+        head, size = result
+        start = _id3v2_size(head)
+        if start:
+            # 标签之后的音频数据不在已获取的内容中时重新请求
+            if start + hash_bytes > len(head) and start < size:
+                result = _fetch_range(audio_url, headers, f"{start}-{start + hash_bytes - 1}")
+                if result is None:
+                    return None
+                head = result[0]
+            else:
+                head = head[start:start + hash_bytes]
+
+        end = size
+        tail = b''
+        if size > start + hash_bytes:
+            tail_start = max(start + hash_bytes, size - hash_bytes - ID3V1_SIZE)
+            result = _fetch_range(audio_url, headers, f"{tail_start}-{size - 1}")
+            if result is None:
+                return None
+            tail = result[0]
+            if tail[-ID3V1_SIZE:-ID3V1_SIZE + 3] == b'TAG':
+                tail = tail[:-ID3V1_SIZE]
+                end -= ID3V1_SIZE
+            tail = tail[-hash_bytes:]
+    except requests.RequestException as e:
+        logger.warning(f"获取音频片段失败，跳过哈希比对: {e}")
+        return None
+
+    digest = hashlib.sha256(f"{end - start}:".encode('ascii'))
+    digest.update(head)
+    digest.update(tail)
+    return digest.hexdigest()
+
+
+def fingerprint(source, seconds=FINGERPRINT_SECONDS):
+    """
+    使用fpcalc计算音频开头部分的声学指纹，source可以是本地文件路径或URL（fpcalc只读取开头的seconds秒）
+
+    返回:
+        tuple: (音频时长（秒）, 指纹数组)，fpcalc不可用或失败时返回None
+    """
+    fpcalc = shutil.which(FPCALC_BINARY)
+    if not fpcalc:
+        logger.warning(f"未找到fpcalc（{FPCALC_BINARY}），跳过声学指纹比对")
+        return None
+    try:
+        result = subprocess.run([fpcalc, "-raw", "-json", "-length", str(seconds), source],
+                                capture_output=True, timeout=max(60, seconds), check=True)
+        data = json.loads(result.stdout)
+        return float(data["duration"]), array.array('I', (x & 0xffffffff for x in data["fingerprint"]))
+    except (OSError, subprocess.SubprocessError, ValueError, KeyError) as e:
+        logger.warning(f"计算声学指纹失败: {e}")
+        return None
+
+
+def similarity(a, b, max_shift=FINGERPRINT_MAX_SHIFT):
+    """
+    两个指纹的相似度：在允许的错位范围内，重叠部分相同比特的最大比例
+    """
+    best = 0.0
+    for shift in range(-max_shift, max_shift + 1):
+        x, y = (a[shift:], b) if shift >= 0 else (a, b[-shift:])
+        n = min(len(x), len(y))
+        if n < 16:
+            continue
+        errors = sum(bin(x[i] ^ y[i]).count('1') for i in range(n))
+        best = max(best, 1 - errors / (32 * n))
+    return best
+
+
+class AudioIdentity:
+    """
+    一个音频的各种标识，在第一次使用时才计算
+
+    参数:
+        audio_url: 音频URL
+        headers: 请求音频时使用的请求头
+        source: 计算声学指纹时读取的音频，默认为audio_url；已下载到本地时可以传入文件路径
+    """
+
+    def __init__(self, audio_url, headers=None, source=None):
+        self.audio_url = audio_url
+        self.headers = headers
+        self.source = source or audio_url
+        self._values = {}
+
+    def get(self, kind):
+        """获取某种标识，无法计算时返回None"""
+        if kind not in self._values:
+            if kind == "url":
+                value = normalize_url(self.audio_url)
+            elif kind == "hash":
+                value = range_hash(self.audio_url, self.headers)
+            elif kind == "fingerprint":
+                value = fingerprint(self.source) if FINGERPRINT_ENABLED else None
+            else:
+                raise ValueError(f"未知的标识类型: {kind}")
+            self._values[kind] = value
+        return self._values[kind]
+
+
+def connect(path=None):
+    """打开去重数据库，不存在时创建"""
+    path = path or DEDUP_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS identities ("
+        " kind TEXT NOT NULL,"
+        " value TEXT NOT NULL,"
+        " variant TEXT NOT NULL,"
+        " cache_key TEXT NOT NULL,"
+        " episode TEXT,"
+        " created_at REAL NOT NULL,"
+        " PRIMARY KEY (kind, value, variant));"
+        "CREATE TABLE IF NOT EXISTS fingerprints ("
+        " id INTEGER PRIMARY KEY,"
+        " variant TEXT NOT NULL,"
+        " duration REAL NOT NULL,"
+        " fingerprint BLOB NOT NULL,"
+        " cache_key TEXT NOT NULL,"
+        " episode TEXT,"
+        " created_at REAL NOT NULL);"
+        "CREATE INDEX IF NOT EXISTS idx_fingerprints_duration ON fingerprints (variant, duration);"
+    )
+    return conn
+
+
+def _candidates(conn, identity, kind, variant):
+    """某种标识对应的已转录音频: (缓存键, 节目ID)"""
+    value = identity.get(kind)
+    if value is None:
+        return []
+    if kind != "fingerprint":
+        row = conn.execute("SELECT cache_key, episode FROM identities WHERE kind = ? AND value = ? AND variant = ?",
+                           (kind, value, variant)).fetchone()
+        return [(row["cache_key"], row["episode"])] if row else []
+
+    duration, prints = value
+    rows = conn.execute("SELECT * FROM fingerprints WHERE variant = ? AND duration BETWEEN ? AND ?",
+                        (variant, duration - DURATION_TOLERANCE, duration + DURATION_TOLERANCE)).fetchall()
+    scored = []
+    for row in rows:
+        other = array.array('I')
+        other.frombytes(row["fingerprint"])
+        score = similarity(prints, other)
+        if score >= FINGERPRINT_THRESHOLD:
+            scored.append((score, row["cache_key"], row["episode"]))
+    return [(key, episode) for _, key, episode in sorted(scored, reverse=True)]
+
+
+def find(identity, variant, episode_id=None, path=None, cache_dir=None):
+    """
+    查找同一音频已有的转录结果
+
+    参数:
+        identity: AudioIdentity
+        variant: 转录参数（转录方法、语言等），只复用相同参数的结果
+        episode_id: 当前节目ID
+        path: 去重数据库路径
+
+    返回:
+        tuple: (缓存键, 转录缓存条目)，没有找到或对应的缓存已被淘汰时返回None
+    """
+    try:
+        conn = connect(path)
+        try:
+            for kind in KINDS:
+                for key, episode in _candidates(conn, identity, kind, variant):
+                    # 同一节目的音频标识变化说明文件可能被替换过，URL相同不足以说明内容相同
+                    if kind == "url" and episode_id and episode == episode_id:
+                        continue
+                    entry = transcript_cache.get_transcript(key, cache_dir)
+                    if entry:
+                        logger.info(f"音频与节目{episode}相同（{kind}），复用已有的转录结果")
+                        metrics.incr("dedup_hits_total", help="复用其它节目转录结果的次数", kind=kind)
+                        return key, entry
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        logger.warning(f"查询去重数据库失败: {e}")
+        return None
+    metrics.incr("dedup_misses_total", help="没有找到相同音频的次数")
+    return None
+
+
+def record(identity, variant, cache_key, episode_id=None, path=None):
+    """记录音频已转录，之后其它节目遇到相同的音频时复用该转录缓存；写入失败只记录警告"""
+    values = {kind: identity.get(kind) for kind in KINDS}
+    try:
+        conn = connect(path)
+    except sqlite3.Error as e:
+        logger.warning(f"写入去重数据库失败: {e}")
+        return
+    try:
+        with conn:
+            now = time.time()
+            for kind in ("url", "hash"):
+                if values[kind] is not None:
+                    conn.execute("INSERT OR REPLACE INTO identities VALUES (?, ?, ?, ?, ?, ?)",
+                                 (kind, values[kind], variant, cache_key, episode_id, now))
+            if values["fingerprint"] is not None:
+                duration, prints = values["fingerprint"]
+                conn.execute("DELETE FROM fingerprints WHERE variant = ? AND cache_key = ?", (variant, cache_key))
+                conn.execute("INSERT INTO fingerprints (variant, duration, fingerprint, cache_key, episode, created_at)"
+                             " VALUES (?, ?, ?, ?, ?, ?)",
+                             (variant, duration, prints.tobytes(), cache_key, episode_id, now))
+    except sqlite3.Error as e:
+        logger.warning(f"写入去重数据库失败: {e}")
+    finally:
+        conn.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="计算音频标识，或查找已转录过的相同音频")
+    parser.add_argument("audio_url", help="音频URL")
+    parser.add_argument("--variant", help="转录参数，如 volcengine|zh-CN；提供时查找已有的转录结果")
+
+    args = parser.parse_args()
+    from xiaoyuzhou_to_text import HEADERS
+    identity = AudioIdentity(args.audio_url, HEADERS)
+    for kind in KINDS:
+        value = identity.get(kind)
+        if kind == "fingerprint" and value:
+            value = f"{len(value[1])}项，时长{value[0]:.0f}秒"
+        print(f"{kind}: {value}")
+    if args.variant:
+        match = find(identity, args.variant)
+        if not match:
+            print("没有找到相同的音频")
+            sys.exit(1)
+        print(f"已转录: {match[1].get('title')} ({match[1].get('url')})")
+
+
+if __name__ == "__main__":
+    main()
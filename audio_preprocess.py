@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+语音识别前的音频预处理
+把下载的音频转换为16kHz单声道，压缩过长的静音，再编码为体积较小的语音格式（默认Opus），
+减少上传和识别的时间。同时记录处理后音频与原始音频之间的时间对应关系，
+识别结果中的时间戳可以换算回原始音频的时间
+"""
+
+import os
+import sys
+import json
+import math
+import wave
+import bisect
+import shutil
+import argparse
+import subprocess
+import tempfile
+from collections import deque
+
+from dotenv import load_dotenv
+
+import metrics
+from pcm_audio import (FFMPEG_BINARY, FRAME_MS, SAMPLE_RATE, SAMPLE_WIDTH, SILENCE_THRESH_DB, decode_pcm_frames,
+                       read_wav_frames, rms)
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("audio_preprocess")
+
+# 预处理配置
+AUDIO_CODEC = os.getenv("AUDIO_PREPROCESS_CODEC", "ogg")         # ogg（Opus）、mp3 或 wav
+AUDIO_BITRATE = os.getenv("AUDIO_PREPROCESS_BITRATE", "24k")     # ogg和mp3的码率
+MAX_SILENCE_MS = int(os.getenv("AUDIO_MAX_SILENCE_MS", "1000"))  # 超过该时长的静音会被压缩
+KEEP_SILENCE_MS = 300       # 压缩后保留的静音时长，保证句子之间仍有停顿
+
+# 各输出格式的ffmpeg编码参数
+CODECS = {
+    "ogg": ["-c:a", "libopus", "-application", "voip"],
+    "mp3": ["-c:a", "libmp3lame"],
+    "wav": ["-c:a", "pcm_s16le"],
+}
+
+
+class OffsetMap:
+    """
+    处理后音频与原始音频的时间对应关系
+
+    由若干连续区间组成，每个区间为 [处理后的起始毫秒, 原始音频的起始毫秒, 时长毫秒]
+    """
+
+    def __init__(self, regions=None, source_duration=0.0):
+        self.regions = regions or []
+        self.source_duration = source_duration  # 原始音频的时长（秒）
+
+    def add(self, processed_ms, original_ms, length_ms):
+        """追加一段保留的音频，与上一段在两边都连续时合并"""
+        if self.regions:
+            last = self.regions[-1]
+            if last[0] + last[2] == processed_ms and last[1] + last[2] == original_ms:
+                last[2] += length_ms
+                return
+        self.regions.append([processed_ms, original_ms, length_ms])
+
+    def to_original(self, seconds):
+        """把处理后音频中的时间（秒）换算为原始音频中的时间（秒）"""
+        ms = seconds * 1000
+        if not self.regions:
+            return seconds
+        i = max(0, bisect.bisect_right([region[0] for region in self.regions], ms) - 1)
+        processed_ms, original_ms, length_ms = self.regions[i]
+        return (original_ms + min(max(ms - processed_ms, 0), length_ms)) / 1000
+
+    @property
+    def duration(self):
+        """处理后音频的时长（秒）"""
+        return (self.regions[-1][0] + self.regions[-1][2]) / 1000 if self.regions else 0.0
+
+    def save(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"source_duration": self.source_duration, "regions": self.regions}, f,
+                      separators=(',', ':'))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data["regions"], data.get("source_duration", 0.0))
+
+
+def offsets_path(audio_path):
+    """处理后音频对应的时间对应关系文件路径"""
+    return audio_path + ".offsets.json"
+
+
+def compress_silence(frames, offset_map, sample_width=SAMPLE_WIDTH, frame_ms=FRAME_MS,
+                     max_silence_ms=MAX_SILENCE_MS, keep_silence_ms=KEEP_SILENCE_MS,
+                     silence_thresh_db=SILENCE_THRESH_DB):
+    """
+    压缩PCM帧流中过长的静音
+
+    超过max_silence_ms的静音只保留开头和结尾各一半的keep_silence_ms，开头和结尾的静音只保留靠近语音的一侧。
+    保留的每一帧都记录到offset_map中
+
+    参数:
+        frames: PCM帧的迭代器，每帧frame_ms毫秒
+        offset_map: 用于记录时间对应关系的OffsetMap
+
+    生成:
+        bytes: 保留的PCM帧
+    """
+    max_amplitude = float(2 ** (8 * sample_width - 1))
+    thresh = max_amplitude * math.pow(10, silence_thresh_db / 20.0)
+    keep_frames = max(1, keep_silence_ms // frame_ms // 2)
+    max_frames = max(2 * keep_frames, max_silence_ms // frame_ms)
+
+    bytes_per_ms = sample_width * SAMPLE_RATE / 1000
+    original_position = 0   # 当前帧在原始音频中的位置（毫秒）
+    processed_position = 0  # 已输出的音频时长（毫秒）
+
+    def emit(frame, original_ms):
+        nonlocal processed_position
+        length = round(len(frame) / bytes_per_ms)
+        offset_map.add(processed_position, original_ms, length)
+        processed_position += length
+        return frame
+
+    pending = []            # 当前静音段中尚未决定是否保留的帧: (原始时间, 帧)
+    tail = deque(maxlen=keep_frames)
+    skipping = False        # 当前静音已超过上限，中间部分被丢弃
+    leading = True          # 还没有出现过语音
+
+    for frame in frames:
+        original_ms = original_position
+        original_position += round(len(frame) / bytes_per_ms)
+        offset_map.source_duration = original_position / 1000
+
+        if rms(frame, sample_width) < thresh:
+            if skipping:
+                tail.append((original_ms, frame))
+            else:
+                pending.append((original_ms, frame))
+                if len(pending) > max_frames:
+                    # 静音过长：保留开头部分（文件开头的静音不保留），其余只留最后一小段
+                    if not leading:
+                        for item_ms, item in pending[:keep_frames]:
+                            yield emit(item, item_ms)
+                    tail.extend(pending[keep_frames:])
+                    pending = []
+                    skipping = True
+            continue
+
+        for item_ms, item in (tail if skipping else pending):
+            yield emit(item, item_ms)
+        pending = []
+        tail.clear()
+        skipping = False
+        leading = False
+        yield emit(frame, original_ms)
+
+    # 结尾的静音只保留靠近语音的一小段
+    if not skipping:
+        for item_ms, item in pending[:keep_frames]:
+            yield emit(item, item_ms)
+
+
+def _open_frames(audio_path):
+    """读取16kHz单声道PCM帧，可以直接读取的WAV文件不经过ffmpeg"""
+    try:
+        with wave.open(audio_path, 'rb') as wav:
+            direct = (wav.getnchannels() == 1 and wav.getsampwidth() == SAMPLE_WIDTH
+                      and wav.getframerate() == SAMPLE_RATE)
+    except (wave.Error, EOFError, OSError):
+        direct = False
+    if direct:
+        return read_wav_frames(audio_path)[2]
+    return decode_pcm_frames(audio_path, SAMPLE_RATE)[2]
+
+
+def _encode(pcm_frames, output_path, codec, bitrate):
+    """把PCM帧编码为指定格式；wav格式直接写入，不需要ffmpeg"""
+    if codec == "wav":
+        with wave.open(output_path, 'wb') as wav:
+            wav.setnchannels(1)
+            wav.setsampwidth(SAMPLE_WIDTH)
+            wav.setframerate(SAMPLE_RATE)
+            for frame in pcm_frames:
+                wav.writeframes(frame)
+        return
+
+    ffmpeg = shutil.which(FFMPEG_BINARY) or shutil.which("avconv")
+    if not ffmpeg:
+        raise RuntimeError(f"未找到ffmpeg（{FFMPEG_BINARY}），无法编码音频")
+    command = [
+        ffmpeg, "-nostdin", "-y", "-loglevel", "error",
+        "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", "1", "-i", "pipe:0",
+        *CODECS[codec], "-b:a", bitrate, output_path,
+    ]
+    # 错误输出写入临时文件，避免管道写满后阻塞编码进程
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr)
+        try:
+            for frame in pcm_frames:
+                process.stdin.write(frame)
+            process.stdin.close()
+            if process.wait() != 0:
+                stderr.seek(0)
+                raise RuntimeError(f"ffmpeg编码失败: {stderr.read().decode('utf-8', 'replace').strip()}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+
+def preprocess(audio_path, output_path=None, codec=None, bitrate=None, max_silence_ms=None):
+    """
+    预处理音频：转换为16kHz单声道、压缩过长的静音并重新编码
+
+    参数:
+        audio_path: 原始音频文件路径
+        output_path: 输出文件路径，默认在原文件旁边生成
+        codec: 输出格式，ogg（Opus）、mp3 或 wav，默认为AUDIO_PREPROCESS_CODEC
+        bitrate: 码率，默认为AUDIO_PREPROCESS_BITRATE
+        max_silence_ms: 超过该时长的静音会被压缩，默认为AUDIO_MAX_SILENCE_MS
+
+    返回:
+        tuple: (输出文件路径, OffsetMap)，时间对应关系同时保存在 offsets_path(输出文件路径) 中
+    """
+    codec = codec or AUDIO_CODEC
+    if codec not in CODECS:
+        raise ValueError(f"不支持的输出格式: {codec}")
+    output_path = output_path or f"{os.path.splitext(audio_path)[0]}.preprocessed.{codec}"
+    max_silence_ms = MAX_SILENCE_MS if max_silence_ms is None else max_silence_ms
+
+    offset_map = OffsetMap()
+    frames = compress_silence(_open_frames(audio_path), offset_map, max_silence_ms=max_silence_ms)
+    _encode(frames, output_path, codec, bitrate or AUDIO_BITRATE)
+    offset_map.save(offsets_path(output_path))
+
+    original_size = os.path.getsize(audio_path)
+    processed_size = os.path.getsize(output_path)
+    metrics.incr("preprocess_saved_bytes_total", max(0, original_size - processed_size),
+                 help="音频预处理减少的字节数")
+    logger.info(f"音频预处理完成: {original_size / 1024 / 1024:.1f}MB -> {processed_size / 1024 / 1024:.1f}MB，"
+                f"时长{offset_map.source_duration:.0f}秒 -> {offset_map.duration:.0f}秒")
+    return output_path, offset_map
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="语音识别前的音频预处理（单声道16kHz、压缩静音、重新编码）")
+    parser.add_argument("audio", help="原始音频文件路径")
+    parser.add_argument("-o", "--output", help="输出文件路径")
+    parser.add_argument("--codec", choices=sorted(CODECS), default=AUDIO_CODEC, help="输出格式")
+    parser.add_argument("--bitrate", default=AUDIO_BITRATE, help="码率（ogg和mp3）")
+    parser.add_argument("--max-silence-ms", type=int, default=MAX_SILENCE_MS, help="超过该时长的静音会被压缩")
+
+    args = parser.parse_args()
+    try:
+        output_path, _ = preprocess(args.audio, args.output, args.codec, args.bitrate, args.max_silence_ms)
+        print(f"已保存到: {output_path}")
+        print(f"时间对应关系: {offsets_path(output_path)}")
+    except Exception as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+转录和总结后端注册表
+各后端以 "模块:函数" 的形式登记，只有被选中时才导入对应模块，命令行和worker启动时不会加载用不到的依赖。
+新增后端（例如本地模型或其它云端语音识别）只需调用 register_asr() / register_summarizer()，
+并把所在模块加入环境变量 BACKEND_PLUGINS（逗号分隔），无需修改流水线代码
+
+语音识别后端的函数签名为 transcribe(source, language="zh-CN", audio_duration=None, utterance_file=None)，
+source 为音频URL（input="url"）或下载后的本地文件路径（input="file"；启用音频预处理时，
+登记了files=True的后端也会收到本地文件路径），返回转录文本；
+支持先提交再等待的后端还可以登记 submit(audio_url, language) 和 wait(task_id, audio_duration, utterance_file)，
+持久化任务队列会在两步之间保存任务ID，进程重启后重新关联。识别任务本身失败（而不是等待超时或网络错误）时，
+wait 应抛出 TaskFailedError，任务队列会重新提交音频，而不是反复等待同一个已经失败的任务；
+登记了streaming=True的后端还接受 on_text 参数，在识别过程中按顺序传出新识别的文本
+
+总结后端的函数签名与 summarize_transcript.summarize_with_volcengine 相同，返回 (输出文件路径, 总结文本)；
+compress 参数只在命令行指定了 --compress 时传入；登记了 incremental="模块:类" 的总结后端支持边转录边总结，
+该类提供 feed(text) 和 finish(on_delta)，总结函数通过 incremental 参数接收已在进行中的总结
+"""
+
+import os
+import importlib
+import threading
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 启动时导入的后端插件模块（逗号分隔），插件模块在导入时登记后端
+BACKEND_PLUGINS = os.getenv("BACKEND_PLUGINS", "")
+
+DEFAULT_ASR = "volcengine"
+DEFAULT_SUMMARIZER = "volcengine"
+
+_asr_backends = {}
+_summarizers = {}
+_plugins_loaded = False
+_lock = threading.Lock()
+
+
+class TaskFailedError(Exception):
+    """识别服务报告任务失败或不存在，同一个任务ID不会再有结果，需要重新提交"""
+
+
+def _load_target(target):
+    module_name, _, func_name = target.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+class Backend:
+    """
+    一个已登记的后端，函数在第一次调用时才导入
+
+    参数:
+        name: 后端名称，即命令行中 --method / --summarizer 的取值
+        target: "模块:函数"
+        description: 用于命令行帮助的说明
+        input: 语音识别后端需要的音频来源，"url" 或 "file"
+        files: input为"url"的后端是否也接受本地文件（例如自行上传到对象存储），启用音频预处理时需要
+        submit: 可选，"模块:函数"，只提交识别任务并返回任务ID
+        wait: 可选，"模块:函数"，等待已提交的任务完成并返回转录文本
+        streaming: 语音识别后端是否支持on_text参数，在识别过程中传出文本
+        incremental: 可选，"模块:类"，总结后端的边转录边总结实现
+    """
+
+    def __init__(self, name, target, description="", input="url", submit=None, wait=None, files=False,
+                 streaming=False, incremental=None):
+        self.name = name
+        self.target = target
+        self.description = description
+        self.input = input
+        self.files = files or input == "file"
+        self.submit_target = submit
+        self.wait_target = wait
+        self.streaming = streaming
+        self.incremental_target = incremental
+        self._loaded = {}
+
+    def _get(self, target):
+        if target not in self._loaded:
+            self._loaded[target] = _load_target(target)
+        return self._loaded[target]
+
+    @property
+    def resumable(self):
+        """是否支持分开提交和等待"""
+        return bool(self.submit_target and self.wait_target)
+
+    def __call__(self, *args, **kwargs):
+        return self._get(self.target)(*args, **kwargs)
+
+    def submit(self, *args, **kwargs):
+        return self._get(self.submit_target)(*args, **kwargs)
+
+    def wait(self, *args, **kwargs):
+        return self._get(self.wait_target)(*args, **kwargs)
+
+    def incremental(self, *args, **kwargs):
+        """创建边转录边总结的对象，后端不支持时返回None"""
+        if not self.incremental_target:
+            return None
+        return self._get(self.incremental_target)(*args, **kwargs)
+
+
+def register_asr(name, target, description="", input="url", submit=None, wait=None, files=False, streaming=False):
+    """登记语音识别后端，同名后端会被替换"""
+    _asr_backends[name] = Backend(name, target, description, input, submit, wait, files, streaming)
+
+
+def register_summarizer(name, target, description="", incremental=None):
+    """登记总结后端，同名后端会被替换"""
+    _summarizers[name] = Backend(name, target, description, incremental=incremental)
+
+
+def _load_plugins():
+    global _plugins_loaded
+    with _lock:
+        if _plugins_loaded:
+            return
+        _plugins_loaded = True
+        for module_name in BACKEND_PLUGINS.split(","):
+            if module_name.strip():
+                importlib.import_module(module_name.strip())
+
+
+def asr_names():
+    """所有语音识别后端的名称，用于命令行参数的choices"""
+    _load_plugins()
+    return list(_asr_backends)
+
+
+def summarizer_names():
+    """所有总结后端的名称"""
+    _load_plugins()
+    return list(_summarizers)
+
+
+def get_asr(name=None):
+    """获取语音识别后端，名称未登记时抛出ValueError"""
+    _load_plugins()
+    backend = _asr_backends.get(name or DEFAULT_ASR)
+    if backend is None:
+        raise ValueError(f"不支持的转录方法: {name}")
+    return backend
+
+
+def get_summarizer(name=None):
+    """获取总结后端，名称未登记时抛出ValueError"""
+    _load_plugins()
+    backend = _summarizers.get(name or DEFAULT_SUMMARIZER)
+    if backend is None:
+        raise ValueError(f"不支持的总结方法: {name}")
+    return backend
+
+
+def help_text(kind="asr"):
+    """生成命令行帮助中的后端说明"""
+    backends = _asr_backends if kind == "asr" else _summarizers
+    _load_plugins()
+    return ", ".join(f"{b.name} ({b.description})" if b.description else b.name for b in backends.values())
+
+
+register_asr("volcengine", "transcribe_with_volcengine:transcribe", "火山引擎", files=True,
+             submit="transcribe_with_volcengine:submit_task", wait="transcribe_with_volcengine:wait_for_result")
+register_asr("sr", "transcribe_with_sr:transcribe", "Speech Recognition", input="file", streaming=True)
+register_summarizer("volcengine", "summarize_transcript:summarize_with_volcengine", "火山引擎LLM",
+                    incremental="summarize_transcript:IncrementalSummarizer")
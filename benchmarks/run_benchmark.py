@@ -0,0 +1,327 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+离线端到端基准测试
+启动本地替身服务（节目页面、音频CDN、语音识别、LLM），分别以单个节目和批量模式运行完整流水线，
+统计各阶段耗时的分位数、每小时可处理的节目数和峰值内存，结果保存为JSON文件，可以与之前的结果比较
+
+用法:
+    python benchmarks/run_benchmark.py
+    python benchmarks/run_benchmark.py --episodes 50 --asr-delay 5 --compare benchmarks/results/base.json
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import resource
+import socket
+import tempfile
+import threading
+import subprocess
+from datetime import datetime
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import backends  # noqa: E402
+from benchmarks.stubs import StubConfig, StubServer  # noqa: E402
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+SCENARIOS = ("single", "batch")
+
+# 比较结果时的指标和方向：True表示越大越好
+COMPARE_METRICS = {
+    "episodes_per_hour": True,
+    "peak_rss_mb": False,
+}
+COMPARE_STAGE_METRICS = ("p50", "p90")
+
+
+def percentile(values, q):
+    """计算分位数（最近秩法）"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(q / 100 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def summarize_durations(values):
+    """汇总一组耗时（秒）"""
+    return {
+        "count": len(values),
+        "mean": sum(values) / len(values) if values else None,
+        "p50": percentile(values, 50),
+        "p90": percentile(values, 90),
+        "p99": percentile(values, 99),
+        "max": max(values) if values else None,
+    }
+
+
+class StageTimer:
+    """记录各阶段每次调用的耗时"""
+
+    def __init__(self):
+        self.durations = {}
+        self.lock = threading.Lock()
+
+    def wrap(self, module, name, stage):
+        """把模块中的函数替换为记录耗时的版本"""
+        func = getattr(module, name)
+
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                with self.lock:
+                    self.durations.setdefault(stage, []).append(elapsed)
+
+        setattr(module, name, timed)
+
+    def report(self):
+        with self.lock:
+            return {stage: summarize_durations(values) for stage, values in sorted(self.durations.items())}
+
+
+def run_scenario(args):
+    """
+    在当前进程中运行一个场景（由父进程以子进程方式调用，保证峰值内存互不影响）
+
+    返回:
+        dict: 场景结果
+    """
+    config = StubConfig(duration=args.duration, asr_delay=args.asr_delay, asr_rtf=args.asr_rtf,
+                        llm_delay=args.llm_delay, serve_audio=args.method == "sr" or args.preprocess)
+    stub = StubServer(config).start()
+
+    # 所有输出文件和缓存都放在临时目录中；环境变量需要在导入项目模块之前设置
+    workdir = tempfile.mkdtemp(prefix="podcast-bench-")
+    os.chdir(workdir)
+    # 替身识别服务运行在本机，可以访问本地对象存储；固定端口后设置对外地址，否则预处理会被跳过
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        store_port = sock.getsockname()[1]
+    os.environ.update({
+        "VOLCENGINE_SUBMIT_URL": f"{stub.base_url}/api/v1/auc/submit",
+        "VOLCENGINE_QUERY_URL": f"{stub.base_url}/api/v1/auc/query",
+        "ARK_API_URL": f"{stub.base_url}/api/v3/chat/completions",
+        "ARK_API_KEY": "benchmark",
+        "TRANSCRIPT_CACHE_DIR": os.path.join(workdir, "transcripts"),
+        "EPISODE_CACHE_DIR": os.path.join(workdir, "episodes"),
+        "SUMMARY_CACHE_PATH": os.path.join(workdir, "summaries.sqlite3"),
+        "SR_RECOGNIZER": "benchmarks.stubs:fake_recognizer",
+        "AUDIO_PREPROCESS": "1" if args.preprocess else "0",
+        "OBJECT_STORE_DIR": os.path.join(workdir, "objects"),
+        "OBJECT_STORE_PORT": str(store_port),
+        "OBJECT_STORE_PUBLIC_URL": f"http://127.0.0.1:{store_port}",
+        # 替身服务的所有节目使用相同的音频，去重会让除第一期以外的节目都跳过语音识别
+        "AUDIO_DEDUP": "0",
+    })
+
+    import importlib
+    import audio_preprocess
+    import main
+    import summary_cache
+    import xiaoyuzhou_to_text
+
+    # 替身节目的转录文本只有标题不同，而总结缓存的键不包含标题行，不关闭时除第一期外的总结都会命中缓存，
+    # LLM阶段测量的就不是流水线本身；只关闭读取，写入的开销仍计入
+    summary_cache.get_summary = lambda key, path=None: None
+
+    # 后端函数在第一次调用时才从模块中取出，因此直接替换模块中的函数即可计时
+    timer = StageTimer()
+    timer.wrap(xiaoyuzhou_to_text, "extract_episode_metadata", "scrape")
+    timer.wrap(xiaoyuzhou_to_text, "download_audio", "download")
+    timer.wrap(audio_preprocess, "preprocess", "preprocess")
+    for backend, stage in ((backends.get_asr(args.method), "asr"), (backends.get_summarizer(), "llm")):
+        module_name, _, func_name = backend.target.partition(":")
+        timer.wrap(importlib.import_module(module_name), func_name, stage)
+    timer.wrap(main, "process_podcast", "total")
+
+    summarize = not args.no_summary
+    errors = 0
+    start = time.perf_counter()
+    if args.scenario == "single":
+        episodes = args.single_runs
+        for i in range(episodes):
+            try:
+                main.process_podcast(stub.episode_url(f"single{i}"), None, args.method, summarize,
+                                     stream=args.stream)
+            except Exception:
+                errors += 1
+    else:
+        episodes = args.episodes
+        urls = [stub.episode_url(f"batch{i}") for i in range(episodes)]
+        stage_workers = {"scrape": args.scrape_workers, "asr": args.asr_workers, "llm": args.llm_workers}
+        results = main.process_batch(urls, args.method, summarize, stage_workers)
+        errors = sum(1 for r in results if r["error"])
+    wall = time.perf_counter() - start
+    stub.stop()
+
+    # 每期成功的节目至少请求一次LLM，否则结果中混入了缓存命中
+    llm_calls = stub.counts.get("llm", 0) + stub.counts.get("llm_stream", 0)
+    if summarize and llm_calls < episodes - errors:
+        raise RuntimeError(f"{episodes - errors}期节目只请求了{llm_calls}次LLM，总结没有经过替身LLM服务")
+
+    return {
+        "episodes": episodes,
+        "errors": errors,
+        "wall_seconds": wall,
+        "episodes_per_hour": (episodes - errors) * 3600 / wall if wall > 0 else None,
+        "stages": timer.report(),
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "peak_rss_children_mb": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024,
+        "requests": dict(stub.counts),
+        "llm_calls": llm_calls,
+    }
+
+
+def child_command(args, scenario, result_file):
+    """构建在子进程中运行某个场景的命令"""
+    command = [sys.executable, os.path.abspath(__file__), "--child", scenario, "--result-file", result_file]
+    for name in ("episodes", "single_runs", "method", "duration", "asr_delay", "asr_rtf", "llm_delay",
+                 "scrape_workers", "asr_workers", "llm_workers"):
+        command += [f"--{name.replace('_', '-')}", str(getattr(args, name))]
+    if args.no_summary:
+        command.append("--no-summary")
+    if args.stream:
+        command.append("--stream")
+    if args.preprocess:
+        command.append("--preprocess")
+    return command
+
+
+def git_revision():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline, threshold):
+    """
+    与之前的结果比较，打印各项指标的变化
+
+    返回:
+        int: 变差超过阈值的指标数量
+    """
+    regressions = 0
+
+    def show(label, old, new, higher_is_better):
+        nonlocal regressions
+        if old is None or new is None:
+            return
+        change = (new - old) / old * 100 if old else 0.0
+        worse = change < -threshold if higher_is_better else change > threshold
+        regressions += worse
+        flag = "  <-- 回归" if worse else ""
+        print(f"  {label:<28}{old:>12.3f}{new:>12.3f}{change:>+10.1f}%{flag}")
+
+    for scenario, result in current["scenarios"].items():
+        old = baseline.get("scenarios", {}).get(scenario)
+        if not old:
+            continue
+        print(f"\n[{scenario}] {'指标':<24}{'基准':>12}{'当前':>12}{'变化':>11}")
+        for metric, higher_is_better in COMPARE_METRICS.items():
+            show(metric, old.get(metric), result.get(metric), higher_is_better)
+        for stage, stats in result["stages"].items():
+            for metric in COMPARE_STAGE_METRICS:
+                show(f"{stage}.{metric} (s)", old.get("stages", {}).get(stage, {}).get(metric),
+                     stats.get(metric), False)
+    return regressions
+
+
+def print_result(scenario, result):
+    print(f"\n[{scenario}] {result['episodes']}期节目，失败{result['errors']}期，"
+          f"耗时{result['wall_seconds']:.1f}秒，{result['episodes_per_hour']:.0f}期/小时，"
+          f"峰值内存{result['peak_rss_mb']:.1f}MB（子进程{result['peak_rss_children_mb']:.1f}MB）")
+    print(f"  {'阶段':<10}{'次数':>6}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}")
+    for stage, stats in result["stages"].items():
+        print(f"  {stage:<12}{stats['count']:>6}{stats['p50']:>9.3f}{stats['p90']:>9.3f}"
+              f"{stats['p99']:>9.3f}{stats['max']:>9.3f}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="使用本地替身服务运行端到端基准测试")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="要运行的场景，逗号分隔: single,batch")
+    parser.add_argument("--episodes", type=int, default=20, help="批量场景的节目数量")
+    parser.add_argument("--single-runs", type=int, default=3, help="单个节目场景依次处理的节目数量")
+    parser.add_argument("--method", choices=backends.asr_names(), default=backends.DEFAULT_ASR, help="转录方法")
+    parser.add_argument("--duration", type=float, default=600, help="每期节目的音频时长（秒）")
+    parser.add_argument("--asr-delay", type=float, default=3.0, help="模拟语音识别的固定处理时间（秒）")
+    parser.add_argument("--asr-rtf", type=float, default=0.0, help="模拟语音识别处理时间与音频时长的比例")
+    parser.add_argument("--llm-delay", type=float, default=0.5, help="模拟LLM每次请求的响应时间（秒）")
+    parser.add_argument("--no-summary", action="store_true", help="不生成内容总结")
+    parser.add_argument("--stream", action="store_true", help="单个节目场景使用流式总结")
+    parser.add_argument("--preprocess", action="store_true",
+                        help="识别前预处理音频（需要ffmpeg，或设置AUDIO_PREPROCESS_CODEC=wav）")
+    parser.add_argument("--scrape-workers", type=int, default=16, help="批量场景同时抓取页面的数量")
+    parser.add_argument("--asr-workers", type=int, default=4, help="批量场景同时进行的转录任务数量")
+    parser.add_argument("--llm-workers", type=int, default=8, help="批量场景同时进行的LLM总结数量")
+    parser.add_argument("--output", help="结果文件路径，默认保存到 benchmarks/results/ 下")
+    parser.add_argument("--compare", metavar="FILE", help="与之前保存的结果比较")
+    parser.add_argument("--threshold", type=float, default=10.0, help="判定为回归的变化百分比")
+    parser.add_argument("--verbose", action="store_true", help="显示流水线的输出")
+    parser.add_argument("--child", choices=SCENARIOS, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+
+    if args.child:
+        args.scenario = args.child
+        result = run_scenario(args)
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f)
+        return
+
+    report = {
+        "created_at": datetime.now().isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "config": {k: v for k, v in vars(args).items()
+                   if k not in ("output", "compare", "threshold", "verbose", "child", "result_file")},
+        "scenarios": {},
+    }
+    for scenario in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+        if scenario not in SCENARIOS:
+            parser.error(f"未知的场景: {scenario}")
+        print(f"正在运行场景: {scenario}...")
+        fd, result_file = tempfile.mkstemp(suffix=".json")
+        os.close(fd)
+        try:
+            output = None if args.verbose else subprocess.DEVNULL
+            subprocess.run(child_command(args, scenario, result_file), check=True, stdout=output)
+            with open(result_file, 'r', encoding='utf-8') as f:
+                report["scenarios"][scenario] = json.load(f)
+        finally:
+            os.unlink(result_file)
+        print_result(scenario, report["scenarios"][scenario])
+
+    output_file = args.output
+    if not output_file:
+        os.makedirs(RESULTS_DIR, exist_ok=True)
+        stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+        output_file = os.path.join(RESULTS_DIR, f"{stamp}-{report['revision'] or 'unknown'}.json")
+    with open(output_file, 'w', encoding='utf-8') as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"\n结果已保存到: {output_file}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get("config") != report["config"]:
+            print("\n注意: 基准结果的测试参数与本次不同，比较结果仅供参考")
+        regressions = compare(report, baseline, args.threshold)
+        if regressions:
+            print(f"\n有{regressions}项指标变差超过{args.threshold}%")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+基准测试使用的本地替身服务
+在一个本地HTTP服务中模拟小宇宙节目页面、支持Range请求的音频CDN、火山引擎语音识别的submit/query接口
+以及火山引擎LLM（ARK）的chat completions接口（普通和流式），不访问任何外部网络
+"""
+
+import io
+import json
+import math
+import time
+import uuid
+import wave
+import array
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+SAMPLE_RATE = 16000
+CHARS_PER_SECOND = 4    # 模拟转录文本的长度：每秒音频约4个字
+FILLER = "这是一段用于基准测试的模拟转录文本，内容没有实际意义。"
+
+
+def make_wav(duration, sample_rate=SAMPLE_RATE):
+    """生成单声道16位WAV：2秒音调和0.5秒静音交替，可以被sr后端按静音切分"""
+    pattern = array.array('h')
+    for i in range(int(sample_rate * 2)):
+        pattern.append(int(8000 * math.sin(2 * math.pi * 440 * i / sample_rate)))
+    pattern.extend([0] * int(sample_rate * 0.5))
+
+    total = int(duration * sample_rate)
+    samples = array.array('h')
+    while len(samples) < total:
+        samples.extend(pattern[:total - len(samples)])
+
+    buffer = io.BytesIO()
+    with wave.open(buffer, 'wb') as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def fake_text(seconds):
+    """生成与音频时长成比例的模拟文本"""
+    length = max(1, int(seconds * CHARS_PER_SECOND))
+    return (FILLER * (length // len(FILLER) + 1))[:length]
+
+
+def fake_utterances(seconds, length=10):
+    """生成模拟的话语级识别结果，每句约length秒，两个说话人交替"""
+    utterances = []
+    start = 0.0
+    while start < seconds:
+        end = min(seconds, start + length)
+        utterances.append({"text": fake_text(end - start), "start_time": int(start * 1000),
+                           "end_time": int(end * 1000), "additions": {"speaker": str(len(utterances) % 2 + 1)}})
+        start = end
+    return utterances
+
+
+def fake_recognizer(pcm, sample_rate, sample_width, language):
+    """sr后端的替身识别函数，按片段时长返回模拟文本"""
+    return fake_text(len(pcm) / (sample_rate * sample_width))
+
+
+class StubConfig:
+    """
+    替身服务的行为配置
+
+    参数:
+        duration: 每期节目的音频时长（秒）
+        asr_delay: 语音识别任务的固定处理时间（秒）
+        asr_rtf: 语音识别处理时间与音频时长的比例，总处理时间为 asr_delay + asr_rtf * duration
+        llm_delay: LLM每次请求的响应时间（秒）
+        stream_chunks: 流式响应拆分的事件数
+        serve_audio: 是否生成并提供完整的音频内容（sr后端需要；火山引擎只需要HEAD）
+    """
+
+    def __init__(self, duration=600, asr_delay=3.0, asr_rtf=0.0, llm_delay=0.5, stream_chunks=20,
+                 serve_audio=False):
+        self.duration = duration
+        self.asr_delay = asr_delay
+        self.asr_rtf = asr_rtf
+        self.llm_delay = llm_delay
+        self.stream_chunks = stream_chunks
+        self.serve_audio = serve_audio
+
+
+class StubServer:
+    """在后台线程中运行的替身服务"""
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        self.config = config or StubConfig()
+        self.tasks = {}
+        self.lock = threading.Lock()
+        self.counts = {}
+        self._audio = None
+
+        stub = self
+
+        class Handler(_Handler):
+            server_stub = stub
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.thread = threading.Thread(target=self.httpd.serve_forever, name="stub-server", daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def episode_url(self, eid):
+        return f"{self.base_url}/episode/{eid}"
+
+    @property
+    def audio(self):
+        with self.lock:
+            if self._audio is None:
+                self._audio = make_wav(self.config.duration) if self.config.serve_audio else b""
+            return self._audio
+
+    def audio_size(self):
+        if self.config.serve_audio:
+            return len(self.audio)
+        # 不提供音频内容时只报告与时长对应的大小（约64kbps的MP3）
+        return int(self.config.duration * 8000)
+
+    def count(self, name):
+        with self.lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def start(self):
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server_stub = None
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body=b"", content_type="application/json", headers=None):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def _json(self, data, status=200):
+        self._send(status, json.dumps(data, ensure_ascii=False).encode("utf-8"))
+
+    def _body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    # 节目页面和音频CDN
+
+    def do_GET(self):
+        stub = self.server_stub
+        path = urlparse(self.path).path
+        if path.startswith("/episode/"):
+            stub.count("page")
+            return self._episode_page(path.rsplit("/", 1)[-1])
+        if path.startswith("/audio/"):
+            stub.count("audio")
+            return self._audio()
+        self._send(404)
+
+    def do_HEAD(self):
+        if urlparse(self.path).path.startswith("/audio/"):
+            self.server_stub.count("audio_head")
+            return self._audio()
+        self._send(404)
+
+    def _episode_page(self, eid):
+        stub = self.server_stub
+        ext = "wav" if stub.config.serve_audio else "mp3"
+        state = {
+            "episode": {"eid": eid},
+            "props": {"pageProps": {"episode": {
+                "eid": eid,
+                "title": f"基准测试节目 {eid}",
+                "duration": stub.config.duration,
+                "enclosure": {"url": f"{stub.base_url}/audio/{eid}.{ext}"},
+            }}},
+        }
+        # 模拟真实页面：大量无关标记中嵌入 __INITIAL_STATE__
+        html = (
+            f"<html><head><title>基准测试节目 {eid}</title></head><body>"
+            + ("<div class=\"padding\">" + "x" * 200 + "</div>") * 200
+            + f"<script>window.__INITIAL_STATE__={json.dumps(state, ensure_ascii=False)};</script>"
+            + "</body></html>"
+        )
+        self._send(200, html.encode("utf-8"), "text/html; charset=utf-8", {"ETag": f'"{eid}-v1"'})
+
+    def _audio(self):
+        stub = self.server_stub
+        size = stub.audio_size()
+        headers = {"Accept-Ranges": "bytes", "ETag": f'"audio-{size}"'}
+        content_type = "audio/wav" if stub.config.serve_audio else "audio/mpeg"
+        if self.command == "HEAD" or not stub.config.serve_audio:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(size))
+            for name, value in headers.items():
+                self.send_header(name, value)
+            self.end_headers()
+            if self.command != "HEAD":
+                self.wfile.write(b"\0" * size)
+            return
+
+        data = stub.audio
+        range_header = self.headers.get("Range")
+        if range_header and range_header.startswith("bytes="):
+            start, _, end = range_header[len("bytes="):].partition("-")
+            start = int(start)
+            end = min(int(end) if end else size - 1, size - 1)
+            headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+            return self._send(206, data[start:end + 1], content_type, headers)
+        self._send(200, data, content_type, headers)
+
+    # 语音识别和LLM接口
+
+    def do_POST(self):
+        path = urlparse(self.path).path
+        if path.endswith("/auc/submit"):
+            return self._asr_submit()
+        if path.endswith("/auc/query"):
+            return self._asr_query()
+        if path.endswith("/chat/completions"):
+            return self._chat()
+        self._send(404)
+
+    def _asr_submit(self):
+        stub = self.server_stub
+        stub.count("asr_submit")
+        self._body()
+        task_id = uuid.uuid4().hex
+        config = stub.config
+        with stub.lock:
+            stub.tasks[task_id] = time.time() + config.asr_delay + config.asr_rtf * config.duration
+        self._json({"resp": {"id": task_id, "code": 1000, "message": "Success"}})
+
+    def _asr_query(self):
+        stub = self.server_stub
+        stub.count("asr_query")
+        task_id = self._body().get("id")
+        with stub.lock:
+            ready_at = stub.tasks.get(task_id)
+        if ready_at is None:
+            return self._json({"resp": {"id": task_id, "code": 1001, "message": "task not found"}})
+        if time.time() < ready_at:
+            return self._json({"resp": {"id": task_id, "code": 2000, "message": "processing"}})
+        utterances = fake_utterances(stub.config.duration)
+        self._json({"resp": {"id": task_id, "code": 1000, "message": "Success",
+                             "text": "".join(u["text"] for u in utterances), "utterances": utterances}})
+
+    def _chat(self):
+        stub = self.server_stub
+        body = self._body()
+        stub.count("llm_stream" if body.get("stream") else "llm")
+        prompt = body["messages"][-1]["content"]
+        content = f"总结：{prompt[:40]}……（共{len(prompt)}字）\n问题1：这是什么？回答：基准测试。"
+
+        if not body.get("stream"):
+            time.sleep(stub.config.llm_delay)
+            return self._json({"choices": [{"index": 0, "message": {"role": "assistant", "content": content},
+                                            "finish_reason": "stop"}]})
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        chunks = max(1, stub.config.stream_chunks)
+        size = -(-len(content) // chunks)
+        for i in range(0, len(content), size):
+            time.sleep(stub.config.llm_delay / chunks)
+            event = {"choices": [{"index": 0, "delta": {"content": content[i:i + size]}}]}
+            self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+        event = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}]}
+        self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+        self.wfile.flush()
@@ -0,0 +1,296 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+并行分段下载
+服务端支持Range请求时，把文件切分为多个字节区间并行下载到预分配的文件中，
+已完成的区间记录在旁路状态文件里，中断后可以从断点继续，下载完成后校验长度和校验和
+"""
+
+import os
+import sys
+import json
+import time
+import base64
+import hashlib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    import fcntl
+except ImportError:  # Windows没有fcntl，只在进程内加锁
+    fcntl = None
+
+import requests
+from dotenv import load_dotenv
+
+import http_client
+import metrics
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("downloader")
+
+# 下载配置
+DOWNLOAD_WORKERS = int(os.getenv("DOWNLOAD_WORKERS", "4"))                # 并行连接数
+MIN_PART_SIZE = int(os.getenv("DOWNLOAD_MIN_PART_MB", "4")) * 1024 * 1024  # 每个区间的最小字节数
+CHUNK_SIZE = 256 * 1024                                                  # 每次读取的字节数
+PROGRESS_INTERVAL = 0.5                                                  # 进度显示的最短刷新间隔（秒）
+
+_path_locks = {}
+_path_locks_lock = threading.Lock()
+
+
+def probe(url, headers=None):
+    """
+    探测远程文件信息
+
+    返回:
+        dict: 包含 size（字节数，未知时为0）、accept_ranges、etag、content_type、md5（服务端提供时）
+    """
+    try:
+        response = http_client.head(url, headers=headers, allow_redirects=True)
+        response.raise_for_status()
+    except requests.RequestException:
+        # 部分服务端不支持HEAD请求，按不支持Range处理，由普通下载获取文件信息
+        return {"url": url, "size": 0, "accept_ranges": False, "etag": "", "content_type": "", "md5": None,
+                "md5_trusted": False}
+
+    md5 = None
+    md5_trusted = False
+    content_md5 = response.headers.get('Content-MD5')
+    if content_md5:
+        try:
+            md5 = base64.b64decode(content_md5).hex()
+            md5_trusted = True
+        except ValueError:
+            md5 = None
+    etag = response.headers.get('ETag', '').strip()
+    # 对象存储的单段上传文件，ETag通常就是内容的MD5
+    bare_etag = etag.strip('"')
+    if not md5 and len(bare_etag) == 32 and all(c in '0123456789abcdefABCDEF' for c in bare_etag):
+        md5 = bare_etag.lower()
+
+    return {
+        "url": response.url,
+        "size": int(response.headers.get('Content-Length') or 0),
+        "accept_ranges": response.headers.get('Accept-Ranges', '').lower() == 'bytes',
+        "etag": etag,
+        "content_type": response.headers.get('Content-Type', ''),
+        "md5": md5,
+        "md5_trusted": md5_trusted,
+    }
+
+
+def split_ranges(size, workers=None, min_part_size=None):
+    """把 [0, size) 切分为若干个闭区间 (start, end)"""
+    workers = workers or DOWNLOAD_WORKERS
+    min_part_size = min_part_size or MIN_PART_SIZE
+    parts = max(1, min(workers, size // min_part_size))
+    part_size = -(-size // parts)
+    return [(start, min(start + part_size, size) - 1) for start in range(0, size, part_size)]
+
+
+class _Progress:
+    """按固定时间间隔刷新的下载进度条"""
+
+    def __init__(self, total, done=0):
+        self.total = total
+        self.done = done
+        self._lock = threading.Lock()
+        self._last = 0
+
+    def add(self, n):
+        with self._lock:
+            self.done += n
+            now = time.time()
+            if now - self._last < PROGRESS_INTERVAL and self.done < self.total:
+                return
+            self._last = now
+            self._draw()
+
+    def _draw(self):
+        # 输出JSON日志时不显示进度条，避免混入日志流
+        if self.total > 0 and metrics.LOG_FORMAT != "json":
+            done = int(50 * self.done / self.total)
+            sys.stdout.write('\r[%s%s] %d%%' % ('█' * done, ' ' * (50 - done), done * 2))
+            sys.stdout.flush()
+
+    def finish(self):
+        if self.total > 0 and metrics.LOG_FORMAT != "json":
+            self._draw()
+            sys.stdout.write('\n')
+
+
+def _state_path(output_path):
+    return output_path + '.download.json'
+
+
+def _load_state(output_path, info):
+    """读取断点状态，远程文件发生变化时丢弃"""
+    try:
+        with open(_state_path(output_path), 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if state.get("size") != info["size"] or state.get("etag") != info["etag"]:
+        return None
+    if not os.path.exists(output_path) or os.path.getsize(output_path) != info["size"]:
+        return None
+    return state
+
+
+def _save_state(output_path, state):
+    tmp_path = _state_path(output_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, _state_path(output_path))
+
+
+def file_digest(path, algorithm='md5'):
+    """计算文件的摘要"""
+    digest = hashlib.new(algorithm)
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+@contextmanager
+def path_lock(path):
+    """
+    对文件加排它锁，同一路径的下载（包括其它进程中的）依次进行，不会同时写入同一个文件和续传状态
+
+    锁加在旁边的 .lock 文件上，用完后保留该文件，删除它会让等待中的调用拿到另一个文件的锁
+    """
+    with _path_locks_lock:
+        thread_lock = _path_locks.setdefault(os.path.abspath(path), threading.Lock())
+    with thread_lock, open(path + '.lock', 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def download(url, output_path, headers=None, workers=None, info=None):
+    """
+    下载文件，服务端支持Range请求时并行分段下载并支持断点续传
+
+    参数:
+        url: 文件URL
+        output_path: 保存路径
+        headers: 请求头
+        workers: 并行连接数，默认为DOWNLOAD_WORKERS
+        info: probe() 的结果，未提供时自动探测
+
+    返回:
+        str: 保存路径
+    """
+    info = info or probe(url, headers)
+    size = info["size"]
+
+    if not info["accept_ranges"] or size <= 0:
+        _download_single(url, output_path, headers, size)
+    else:
+        _download_ranges(info["url"], output_path, headers, info, workers)
+
+    # 校验长度和校验和
+    if size > 0 and os.path.getsize(output_path) != size:
+        raise IOError(f"下载的文件大小不一致: 期望{size}字节，实际{os.path.getsize(output_path)}字节")
+    if info.get("md5"):
+        actual = file_digest(output_path, 'md5')
+        if actual != info["md5"]:
+            # Content-MD5是明确的校验和；从ETag推测的MD5不一定可靠，只给出提示
+            if not info.get("md5_trusted"):
+                logger.warning(f"提示: 文件MD5与ETag不一致（ETag可能不是MD5），跳过校验")
+            else:
+                os.unlink(output_path)
+                raise IOError(f"下载的文件校验失败: 期望MD5 {info['md5']}，实际 {actual}")
+
+    if os.path.exists(_state_path(output_path)):
+        os.unlink(_state_path(output_path))
+    return output_path
+
+
+def _download_single(url, output_path, headers, size):
+    """服务端不支持Range时，使用单个连接顺序下载"""
+    response = http_client.get(url, headers=headers, stream=True)
+    response.raise_for_status()
+    progress = _Progress(size or int(response.headers.get('content-length', 0)))
+    with open(output_path, 'wb') as f:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            if chunk:
+                f.write(chunk)
+                progress.add(len(chunk))
+                metrics.incr("download_bytes_total", len(chunk), help="下载的音频字节数")
+    progress.finish()
+
+
+def _download_ranges(url, output_path, headers, info, workers):
+    """并行下载各个字节区间，写入预分配文件的对应位置"""
+    size = info["size"]
+    state = _load_state(output_path, info)
+    if state is None:
+        # 预分配文件并记录需要下载的区间
+        with open(output_path, 'wb') as f:
+            f.truncate(size)
+        state = {"size": size, "etag": info["etag"], "ranges": split_ranges(size, workers), "done": {}}
+        _save_state(output_path, state)
+    else:
+        logger.info("检测到未完成的下载，从断点继续...")
+
+    # done 记录每个区间已写入的字节数，续传时从该位置继续
+    done = {int(k): v for k, v in state["done"].items()}
+    progress = _Progress(size, sum(done.values()))
+    state_lock = threading.Lock()
+
+    def fetch(index):
+        start, end = state["ranges"][index]
+        offset = start + done.get(index, 0)
+        if offset > end:
+            return
+        range_headers = dict(headers or {}, Range=f"bytes={offset}-{end}")
+        response = http_client.get(url, headers=range_headers, stream=True)
+        response.raise_for_status()
+        if response.status_code != 206:
+            raise IOError("服务端未按Range请求返回部分内容")
+
+        fd = os.open(output_path, os.O_WRONLY)
+        try:
+            last_saved = time.time()
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                chunk = chunk[:end + 1 - offset]
+                os.pwrite(fd, chunk, offset)
+                offset += len(chunk)
+                progress.add(len(chunk))
+                metrics.incr("download_bytes_total", len(chunk), help="下载的音频字节数")
+                with state_lock:
+                    done[index] = offset - start
+                    # 定期持久化断点状态
+                    if time.time() - last_saved > 1:
+                        state["done"] = done
+                        _save_state(output_path, state)
+                        last_saved = time.time()
+                if offset > end:
+                    break
+        finally:
+            os.close(fd)
+            with state_lock:
+                state["done"] = done
+                _save_state(output_path, state)
+
+        if offset <= end:
+            raise IOError(f"区间 {start}-{end} 下载不完整")
+
+    workers = min(workers or DOWNLOAD_WORKERS, len(state["ranges"]))
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for future in [executor.submit(fetch, i) for i in range(len(state["ranges"]))]:
+            future.result()
+    progress.finish()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+节目页面元数据缓存
+保存从节目页面解析出的标题、音频URL、时长，以及页面的ETag/Last-Modified，
+再次抓取时发送条件请求，页面未变化（304）时直接使用缓存，不再下载和解析页面
+"""
+
+import os
+import json
+import time
+import hashlib
+import tempfile
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 缓存目录
+CACHE_DIR = os.getenv("EPISODE_CACHE_DIR", os.path.join(".cache", "episodes"))
+
+
+def _entry_path(url, cache_dir=None):
+    key = hashlib.sha256(url.encode('utf-8')).hexdigest()
+    return os.path.join(cache_dir or CACHE_DIR, f"{key}.json")
+
+
+def get_metadata(url, cache_dir=None):
+    """读取节目页面的缓存元数据，未命中时返回None"""
+    try:
+        with open(_entry_path(url, cache_dir), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def put_metadata(url, metadata, cache_dir=None):
+    """写入节目页面的元数据"""
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    entry = dict(metadata, url=url, fetched_at=time.time())
+    # 先写临时文件再替换，避免并发读取到不完整的内容
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, _entry_path(url, cache_dir))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def conditional_headers(metadata):
+    """根据缓存的ETag/Last-Modified构建条件请求头"""
+    headers = {}
+    if metadata:
+        if metadata.get("etag"):
+            headers["If-None-Match"] = metadata["etag"]
+        if metadata.get("last_modified"):
+            headers["If-Modified-Since"] = metadata["last_modified"]
+    return headers
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共享的HTTP客户端
+所有网络请求（页面抓取、音频下载、语音识别、LLM）都通过这里发出，
+统一复用连接池，设置连接/读取超时，并对可重试的请求按指数退避自动重试
+"""
+
+import os
+import threading
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from dotenv import load_dotenv
+
+import metrics
+import rate_limiter
+
+# 加载环境变量
+load_dotenv()
+
+# 超时、重试和连接池配置
+CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+MAX_RETRIES = int(os.getenv("HTTP_MAX_RETRIES", "3"))
+BACKOFF_FACTOR = float(os.getenv("HTTP_BACKOFF_FACTOR", "1"))
+POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "32"))
+
+# 幂等请求遇到这些状态码时重试
+RETRY_STATUS = (429, 500, 502, 503, 504)
+IDEMPOTENT_METHODS = frozenset(["GET", "HEAD", "OPTIONS", "PUT", "DELETE"])
+
+_sessions = {}
+_sessions_lock = threading.Lock()
+
+
+def _build_session(idempotent, retry_throttled=True, retry_reads=True):
+    """
+    创建带连接池和重试策略的会话
+
+    幂等会话对连接错误、读取错误和5xx/429状态码都会重试；
+    非幂等会话只重试连接错误和429（请求未被服务端处理），避免重复提交。
+    retry_reads为False时不重试读取错误（例如读取超时），只重试收到响应体之前的连接错误和状态码；
+    retry_throttled为False时不重试429，由限流器处理
+    """
+    status_forcelist = RETRY_STATUS if idempotent else (429,)
+    if not retry_throttled:
+        status_forcelist = tuple(code for code in status_forcelist if code != 429)
+    retry = Retry(
+        total=MAX_RETRIES,
+        connect=MAX_RETRIES,
+        read=MAX_RETRIES if idempotent and retry_reads else 0,
+        status=MAX_RETRIES,
+        status_forcelist=status_forcelist,
+        # 是否可以重试由调用方通过idempotent声明（默认只有IDEMPOTENT_METHODS中的方法），这里不再按方法过滤
+        allowed_methods=None,
+        backoff_factor=BACKOFF_FACTOR,
+        # urllib3会对带Retry-After的429自动重试，交给限流器处理时需要关闭
+        respect_retry_after_header=retry_throttled,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE, max_retries=retry)
+
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+
+def get_session(idempotent=True, retry_throttled=True, retry_reads=True):
+    """获取进程内共享的会话"""
+    key = (idempotent, retry_throttled, retry_reads)
+    with _sessions_lock:
+        if key not in _sessions:
+            _sessions[key] = _build_session(idempotent, retry_throttled, retry_reads)
+        return _sessions[key]
+
+
+def request(method, url, idempotent=None, timeout=None, limiter=None, retry_reads=True, **kwargs):
+    """
+    发送HTTP请求
+
+    参数:
+        method: 请求方法
+        url: 请求地址
+        idempotent: 请求是否可以安全重试，默认GET/HEAD等方法可以，POST不可以
+        timeout: 超时时间，默认为 (CONNECT_TIMEOUT, READ_TIMEOUT)
+        limiter: 限流器，提供时每次发送前先等待令牌，收到429后暂停该接口并在本地排队重试
+        retry_reads: 幂等请求是否重试读取错误；生成时间长、代价高的请求（如LLM补全）应设为False，
+            只重试连接错误和收到响应体之前的429/5xx
+        kwargs: 其余参数同requests.request
+
+    返回:
+        requests.Response
+    """
+    if idempotent is None:
+        idempotent = method.upper() in IDEMPOTENT_METHODS
+    if timeout is None:
+        timeout = (CONNECT_TIMEOUT, READ_TIMEOUT)
+    if limiter is None:
+        return _count_retries(get_session(idempotent, retry_reads=retry_reads).request(method, url, timeout=timeout,
+                                                                                        **kwargs))
+
+    # 429表示请求没有被处理，非幂等请求也可以安全重试
+    session = get_session(idempotent, retry_throttled=False, retry_reads=retry_reads)
+    for attempt in range(rate_limiter.MAX_THROTTLE_RETRIES + 1):
+        limiter.acquire()
+        response = _count_retries(session.request(method, url, timeout=timeout, **kwargs))
+        if response.status_code != 429:
+            limiter.succeed()
+            return response
+        limiter.penalize(rate_limiter.retry_after_seconds(response))
+        if attempt < rate_limiter.MAX_THROTTLE_RETRIES:
+            response.close()
+    return response
+
+
+def _count_retries(response):
+    """记录请求的次数和连接池内部自动重试的次数"""
+    host = urlparse(response.url).netloc
+    metrics.incr("http_requests_total", help="HTTP请求数", host=host, status=response.status_code)
+    retries = getattr(response.raw, "retries", None)
+    if retries is not None and retries.history:
+        metrics.incr("http_retries_total", len(retries.history), help="HTTP请求自动重试的次数", host=host)
+    return response
+
+
+def get(url, **kwargs):
+    """发送GET请求"""
+    return request("GET", url, **kwargs)
+
+
+def head(url, **kwargs):
+    """发送HEAD请求"""
+    return request("HEAD", url, **kwargs)
+
+
+def post(url, idempotent=False, **kwargs):
+    """发送POST请求，只有明确声明幂等的请求才会在服务端错误时重试"""
+    return request("POST", url, idempotent=idempotent, **kwargs)
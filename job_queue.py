@@ -0,0 +1,434 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+持久化任务队列
+每期节目在SQLite（WAL模式）中有一条任务记录，保存当前阶段（已抓取、已提交识别任务、已转录、已总结）、
+火山引擎任务ID和产物路径。后台worker从上次完成的阶段继续处理，进程重启后会重新关联尚未取回结果的识别任务，
+不会重复提交音频
+"""
+
+import os
+import sys
+import time
+import socket
+import sqlite3
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import audio_dedup
+import backends
+import metrics
+import transcript_cache
+import utterance_store
+from main import DEFAULT_STAGE_WORKERS, read_urls
+from xiaoyuzhou_to_text import (HEADERS, download_audio, extract_episode_metadata, save_text, stage_limit,
+                                transcript_filename)
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("job_queue")
+
+# 任务队列数据库路径
+QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", os.path.join(".cache", "jobs.sqlite3"))
+LEASE_SECONDS = 300     # worker领取任务后的租约时长，期间定期续约，过期后其它worker可以接手
+MAX_ATTEMPTS = 3        # 每个阶段的最大尝试次数
+RETRY_DELAY = 60        # 失败后重试前的等待时间（秒），按尝试次数递增
+
+# 任务阶段，按处理顺序排列
+STAGES = ("queued", "scraped", "submitted", "transcribed", "summarized")
+FINAL_STAGES = ("done", "failed")
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+def connect(path=None):
+    """打开任务队列数据库"""
+    path = path or QUEUE_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS jobs ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " url TEXT NOT NULL,"
+        " method TEXT NOT NULL,"
+        " summarize INTEGER NOT NULL,"
+        " stage TEXT NOT NULL DEFAULT 'queued',"
+        " audio_url TEXT,"
+        " audio_identity TEXT,"
+        " title TEXT,"
+        " duration REAL,"
+        " task_id TEXT,"
+        " transcript_file TEXT,"
+        " summary_file TEXT,"
+        " error TEXT,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " next_run_at REAL NOT NULL DEFAULT 0,"
+        " locked_by TEXT,"
+        " locked_at REAL,"
+        " created_at REAL NOT NULL,"
+        " updated_at REAL NOT NULL)"
+    )
+    # 早期版本创建的数据库没有audio_identity列
+    columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+    if "audio_identity" not in columns:
+        conn.execute("ALTER TABLE jobs ADD COLUMN audio_identity TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_stage ON jobs (stage, next_run_at)")
+    return conn
+
+
+def add_job(conn, url, method="volcengine", summarize=True):
+    """
+    添加任务，同一URL和参数已有未失败的任务时直接返回已有任务ID
+
+    返回:
+        int: 任务ID
+    """
+    row = conn.execute(
+        "SELECT id FROM jobs WHERE url = ? AND method = ? AND summarize = ? AND stage != 'failed'",
+        (url, method, int(summarize)),
+    ).fetchone()
+    if row:
+        return row["id"]
+    now = time.time()
+    cursor = conn.execute(
+        "INSERT INTO jobs (url, method, summarize, created_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+        (url, method, int(summarize), now, now),
+    )
+    return cursor.lastrowid
+
+
+def update_job(conn, job_id, **fields):
+    """更新任务字段，每次调用都会立即提交"""
+    fields["updated_at"] = time.time()
+    columns = ", ".join(f"{name} = ?" for name in fields)
+    conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*fields.values(), job_id))
+
+
+def _lock_is_stale(locked_by, locked_at, now):
+    """判断任务的锁是否已失效：租约过期，或持有锁的本机进程已经退出"""
+    if not locked_by or not locked_at or now - locked_at > LEASE_SECONDS:
+        return True
+    host, _, pid = locked_by.rpartition(":")
+    if host == socket.gethostname() and pid.isdigit() and locked_by != WORKER_ID:
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            return False
+    return False
+
+
+def claim_job(conn):
+    """
+    领取一个可以处理的任务
+
+    返回:
+        sqlite3.Row: 任务记录，没有可处理的任务时返回None
+    """
+    now = time.time()
+    rows = conn.execute(
+        "SELECT id, locked_by, locked_at FROM jobs"
+        " WHERE stage NOT IN ('done', 'failed') AND next_run_at <= ?"
+        " ORDER BY id",
+        (now,),
+    ).fetchall()
+    for row in rows:
+        if not _lock_is_stale(row["locked_by"], row["locked_at"], now):
+            continue
+        # 用条件更新保证同一任务只会被一个worker领取
+        cursor = conn.execute(
+            "UPDATE jobs SET locked_by = ?, locked_at = ?"
+            " WHERE id = ? AND locked_by IS ? AND locked_at IS ?",
+            (WORKER_ID, now, row["id"], row["locked_by"], row["locked_at"]),
+        )
+        if cursor.rowcount == 1:
+            return conn.execute("SELECT * FROM jobs WHERE id = ?", (row["id"],)).fetchone()
+    return None
+
+
+def advance(conn, job, limits=None):
+    """
+    把任务推进一个阶段
+
+    参数:
+        conn: 数据库连接
+        job: 任务记录
+        limits: 各阶段并发限制
+
+    返回:
+        str: 推进后的阶段
+    """
+    stage = job["stage"]
+
+    if stage == "queued":
+        with stage_limit(limits, "scrape"), metrics.span("scrape"):
+            metadata = extract_episode_metadata(job["url"])
+            # 音频标识只在抓取时获取一次并保存，之后各阶段使用同一个缓存键，
+            # 即使CDN重新签名导致ETag或大小变化，转录阶段也能找到提交阶段对应的缓存
+            identity = transcript_cache.audio_identity(metadata["audio_url"], HEADERS)
+        update_job(conn, job["id"], stage="scraped", audio_url=metadata["audio_url"], audio_identity=identity,
+                   title=metadata["title"], duration=metadata.get("duration"), attempts=0)
+        return "scraped"
+
+    if stage == "scraped":
+        # 已有相同节目的转录缓存时直接使用
+        key = _cache_key(conn, job)
+        cached = transcript_cache.get_transcript(key)
+        if cached:
+            logger.info(f"命中转录缓存，跳过语音识别: {job['url']}")
+            utterance_store.copy_store(transcript_cache.utterance_path(key), _utterance_file(job))
+            return _save_transcript(conn, job, cached["text"])
+
+        # 其它节目URL下的相同音频已经转录过时复用其结果
+        identity = audio_dedup.AudioIdentity(job["audio_url"], HEADERS)
+        if audio_dedup.DEDUP_ENABLED:
+            with metrics.span("dedup"):
+                match = audio_dedup.find(identity, _variant(job), _episode_id(job))
+            if match:
+                match_key, entry = match
+                transcript_cache.put_transcript(key, entry["text"], title=job["title"], url=job["url"],
+                                                audio_url=job["audio_url"])
+                utterance_store.copy_store(transcript_cache.utterance_path(match_key),
+                                           transcript_cache.utterance_path(key))
+                utterance_store.copy_store(transcript_cache.utterance_path(key), _utterance_file(job))
+                return _save_transcript(conn, job, entry["text"])
+
+        backend = backends.get_asr(job["method"])
+        if backend.resumable:
+            with stage_limit(limits, "asr"), metrics.span("asr_submit"):
+                task_id = backend.submit(job["audio_url"])
+            # 任务ID立即持久化，之后即使进程退出也可以重新关联
+            update_job(conn, job["id"], stage="submitted", task_id=task_id, attempts=0)
+            return "submitted"
+
+        utterance_file = _utterance_file(job)
+        utterance_store.copy_store(None, utterance_file)
+        with stage_limit(limits, "asr"):
+            source, audio_path = job["audio_url"], None
+            if backend.input == "file":
+                with metrics.span("download"):
+                    source = audio_path = download_audio(job["audio_url"])
+            try:
+                with metrics.span("asr", method=job["method"]):
+                    text = backend(source, audio_duration=job["duration"], utterance_file=utterance_file)
+            finally:
+                if audio_path and os.path.exists(audio_path):
+                    os.unlink(audio_path)
+        _cache_transcript(job, key, text, utterance_file, identity)
+        return _save_transcript(conn, job, text)
+
+    if stage == "submitted":
+        utterance_file = _utterance_file(job)
+        try:
+            text = backends.get_asr(job["method"]).wait(job["task_id"], job["duration"], utterance_file)
+        except backends.TaskFailedError:
+            # 任务在服务端已经失败，退回到提交之前的阶段，下次重试时重新提交；等待超时和网络错误仍等待原任务
+            logger.warning(f"识别任务 {job['task_id']} 已失败，下次重试时重新提交")
+            update_job(conn, job["id"], stage="scraped", task_id=None)
+            raise
+        _cache_transcript(job, _cache_key(conn, job), text, utterance_file)
+        return _save_transcript(conn, job, text)
+
+    if stage == "transcribed":
+        if not job["summarize"]:
+            update_job(conn, job["id"], stage="done", attempts=0, locked_by=None, locked_at=None)
+            return "done"
+        with stage_limit(limits, "llm"):
+            summary_file, _ = backends.get_summarizer()(job["transcript_file"])
+        update_job(conn, job["id"], stage="summarized", summary_file=summary_file, attempts=0)
+        return "summarized"
+
+    if stage == "summarized":
+        update_job(conn, job["id"], stage="done", locked_by=None, locked_at=None)
+        return "done"
+
+    raise ValueError(f"未知的任务阶段: {stage}")
+
+
+def _cache_key(conn, job):
+    """任务的转录缓存键；早期版本抓取的任务没有保存音频标识，第一次使用时获取并保存"""
+    identity = job["audio_identity"]
+    if not identity:
+        identity = transcript_cache.audio_identity(job["audio_url"], HEADERS)
+        update_job(conn, job["id"], audio_identity=identity)
+    return transcript_cache.cache_key(_episode_id(job), identity, job["method"])
+
+
+def _episode_id(job):
+    return transcript_cache.episode_id_from_url(job["url"])
+
+
+def _variant(job):
+    return f"{job['method']}|zh-CN"
+
+
+def _cache_transcript(job, key, text, utterance_file, identity=None):
+    """写入转录缓存，并记录音频标识供其它节目复用"""
+    transcript_cache.put_transcript(key, text, title=job["title"], url=job["url"], audio_url=job["audio_url"])
+    utterance_store.copy_store(utterance_file, transcript_cache.utterance_path(key))
+    if audio_dedup.DEDUP_ENABLED:
+        identity = identity or audio_dedup.AudioIdentity(job["audio_url"], HEADERS)
+        audio_dedup.record(identity, _variant(job), key, _episode_id(job))
+
+
+def _utterance_file(job):
+    return utterance_store.sidecar_path(transcript_filename(job["title"]))
+
+
+def _save_transcript(conn, job, text):
+    transcript_file = save_text(text, transcript_filename(job["title"]), job["title"])
+    update_job(conn, job["id"], stage="transcribed", transcript_file=transcript_file, attempts=0)
+    return "transcribed"
+
+
+def run_job(conn, job, limits=None):
+    """从任务当前阶段开始一直处理到完成，失败时记录错误并安排重试"""
+    with metrics.episode_context(transcript_cache.episode_id_from_url(job["url"])):
+        job_id = job["id"]
+        logger.info(f"开始处理任务 {job_id}（阶段: {job['stage']}）: {job['url']}")
+        try:
+            while job["stage"] not in FINAL_STAGES:
+                advance(conn, job, limits)
+                job = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            logger.info(f"任务 {job_id} 处理完成")
+        except Exception as e:
+            attempts = job["attempts"] + 1
+            if attempts >= MAX_ATTEMPTS:
+                logger.error(f"任务 {job_id} 在阶段 {job['stage']} 失败，不再重试: {e}")
+                update_job(conn, job_id, stage="failed", error=str(e), attempts=attempts,
+                           locked_by=None, locked_at=None)
+            else:
+                logger.warning(f"任务 {job_id} 在阶段 {job['stage']} 失败，稍后重试: {e}")
+                update_job(conn, job_id, error=str(e), attempts=attempts,
+                           next_run_at=time.time() + RETRY_DELAY * attempts, locked_by=None, locked_at=None)
+
+
+def run_worker(path=None, stage_workers=None, once=False, idle_interval=5):
+    """
+    运行worker，持续领取并处理任务
+
+    参数:
+        path: 任务队列数据库路径
+        stage_workers: 各阶段并发数，形如 {"scrape": 16, "asr": 4, "llm": 8}
+        once: 处理完当前所有可处理的任务后退出
+        idle_interval: 没有任务时的等待时间（秒）
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    workers.update({k: v for k, v in (stage_workers or {}).items() if v})
+    limits = {stage: threading.BoundedSemaphore(n) for stage, n in workers.items()}
+    max_workers = max(1, sum(workers.values()))
+
+    conn = connect(path)
+    conn_lock = threading.Lock()
+    active = set()
+    stop = threading.Event()
+
+    # 定期为正在处理的任务续约
+    def heartbeat():
+        while not stop.wait(LEASE_SECONDS / 3):
+            with conn_lock:
+                for job_id in list(active):
+                    conn.execute("UPDATE jobs SET locked_at = ? WHERE id = ? AND locked_by = ?",
+                                 (time.time(), job_id, WORKER_ID))
+
+    def work(job):
+        # 每个线程使用独立的数据库连接
+        job_conn = connect(path)
+        try:
+            run_job(job_conn, job, limits)
+        finally:
+            job_conn.close()
+            with conn_lock:
+                active.discard(job["id"])
+
+    threading.Thread(target=heartbeat, name="job-heartbeat", daemon=True).start()
+    logger.info(f"worker {WORKER_ID} 已启动，最多同时处理 {max_workers} 个任务")
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while True:
+                job = None
+                with conn_lock:
+                    if len(active) < max_workers:
+                        job = claim_job(conn)
+                        if job:
+                            active.add(job["id"])
+                if job:
+                    executor.submit(work, job)
+                    continue
+                with conn_lock:
+                    idle = not active
+                if once and idle:
+                    break
+                time.sleep(idle_interval if idle else 0.5)
+    finally:
+        stop.set()
+        conn.close()
+
+
+def print_status(conn):
+    """打印各阶段的任务数量和失败的任务"""
+    for row in conn.execute("SELECT stage, COUNT(*) AS n FROM jobs GROUP BY stage ORDER BY stage"):
+        print(f"{row['stage']}: {row['n']}")
+    for row in conn.execute("SELECT id, url, error FROM jobs WHERE stage = 'failed' ORDER BY id"):
+        print(f"  失败 {row['id']}: {row['url']} - {row['error']}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="持久化任务队列：添加任务、运行worker、查看状态")
+    parser.add_argument("--db", default=QUEUE_PATH, help="任务队列数据库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="添加任务")
+    add_parser.add_argument("urls", nargs="*", help="小宇宙播客的URL")
+    add_parser.add_argument("-f", "--file", help="从文件读取URL列表，\"-\" 表示从标准输入读取")
+    add_parser.add_argument("--method", choices=backends.asr_names(), default=backends.DEFAULT_ASR,
+                            help=f"转录方法: {backends.help_text('asr')}")
+    add_parser.add_argument("--no-summary", action="store_true", help="不生成内容总结")
+
+    worker_parser = subparsers.add_parser("worker", help="运行worker处理任务")
+    worker_parser.add_argument("--once", action="store_true", help="处理完当前任务后退出")
+    worker_parser.add_argument("--scrape-workers", type=int, default=DEFAULT_STAGE_WORKERS["scrape"],
+                               help="同时抓取页面的数量")
+    worker_parser.add_argument("--asr-workers", type=int, default=DEFAULT_STAGE_WORKERS["asr"],
+                               help="同时进行的转录任务数量")
+    worker_parser.add_argument("--llm-workers", type=int, default=DEFAULT_STAGE_WORKERS["llm"],
+                               help="同时进行的LLM总结数量")
+
+    subparsers.add_parser("status", help="查看任务状态")
+
+    args = parser.parse_args()
+
+    if args.command == "add":
+        urls = list(args.urls)
+        if args.file:
+            urls.extend(url for url in read_urls(args.file) if url not in urls)
+        if not urls:
+            print("未提供URL，退出程序")
+            sys.exit(1)
+        conn = connect(args.db)
+        for url in urls:
+            print(f"任务 {add_job(conn, url, args.method, not args.no_summary)}: {url}")
+        conn.close()
+    elif args.command == "worker":
+        run_worker(args.db, {"scrape": args.scrape_workers, "asr": args.asr_workers, "llm": args.llm_workers},
+                   once=args.once)
+    else:
+        conn = connect(args.db)
+        print_status(conn)
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
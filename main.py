@@ -9,57 +9,224 @@
 import os
 import sys
 import argparse
+import threading
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
 # 导入现有模块
-from xiaoyuzhou_to_text import process_url
-from summarize_transcript import summarize_with_volcengine
+import backends
+import metrics
+from xiaoyuzhou_to_text import process_url, stage_limit
+from transcript_cache import episode_id_from_url
 
 # 加载环境变量
 load_dotenv()
 
-def process_podcast(url, output_file=None, transcription_method="volcengine", summarize=True):
+logger = metrics.get_logger("main")
+
+# 批量模式下各阶段的默认并发数
+DEFAULT_STAGE_WORKERS = {
+    "scrape": 16,  # 页面抓取
+    "asr": 4,      # 语音识别任务
+    "llm": 8,      # LLM总结
+}
+
+# 转录后端支持流式输出时，是否在转录过程中提前开始分段总结
+SUMMARY_PIPELINE = os.getenv("SUMMARY_PIPELINE", "1").lower() in ("1", "true", "yes")
+
+def process_podcast(url, output_file=None, transcription_method="volcengine", summarize=True, limits=None,
+                    use_cache=True, refresh=False, stream=False, metadata=None, summarizer=None, preprocess=None,
+                    compress=None):
     """
     处理播客URL，转录为文字并生成总结
     
     参数:
         url: 小宇宙播客URL
         output_file: 输出文件路径
-        transcription_method: 转录方法，可选值: "volcengine", "sr"
+        transcription_method: 转录方法，即后端注册表中语音识别后端的名称，如 "volcengine"、"sr"
         summarize: 是否生成总结
+        limits: 各阶段并发限制，形如 {"scrape": 信号量, "asr": 信号量, "llm": 信号量}
+        use_cache: 是否使用转录和总结缓存
+        refresh: 忽略已有缓存重新转录和总结
+        stream: 是否流式输出总结，边生成边写入文件并在终端显示
+        metadata: 已知的节目信息（包含 audio_url、title），提供时跳过页面抓取
+        summarizer: 总结后端的名称，默认为 "volcengine"
+        preprocess: 识别前是否预处理音频，默认为AUDIO_PREPROCESS
+        compress: 总结前是否压缩转录文本，默认为TRANSCRIPT_COMPRESS
     
     返回:
         tuple: (转录文件路径, 总结文件路径)
     """
-    print(f"开始处理播客: {url}")
+    with metrics.episode_context(episode_id_from_url(url)):
+        logger.info(f"开始处理播客: {url}")
+        
+        # 转录后端能在识别过程中传出文本时，边转录边提交已完成部分的分段总结，转录结束后只剩合并
+        incremental = None
+        if summarize and SUMMARY_PIPELINE and backends.get_asr(transcription_method).streaming:
+            incremental = backends.get_summarizer(summarizer).incremental(use_cache=use_cache, refresh=refresh,
+                                                                           compress=compress)
+        
+        try:
+            # 第一步：转录
+            transcript_file, transcript_text = process_url(url, output_file, transcription_method, limits=limits,
+                                                           use_cache=use_cache, refresh=refresh, metadata=metadata,
+                                                           preprocess=preprocess,
+                                                           on_text=incremental.feed if incremental else None)
+            logger.info(f"转录完成，文件保存在: {transcript_file}")
+            
+            # 第二步：总结（如果需要）
+            summary_file = None
+            if summarize:
+                logger.info("开始生成内容总结...")
+                try:
+                    # 只在明确指定时传入compress，不支持该参数的总结后端不受影响
+                    options = {} if compress is None else {"compress": compress}
+                    if incremental:
+                        options["incremental"] = incremental
+                    with stage_limit(limits, "llm"):
+                        summary_file, summary_text = backends.get_summarizer(summarizer)(
+                            transcript_file, use_cache=use_cache, refresh=refresh, stream=stream, **options
+                        )
+                    logger.info(f"总结完成，文件保存在: {summary_file}")
+                except Exception as e:
+                    logger.error(f"总结生成失败: {e}")
+        finally:
+            if incremental:
+                incremental.close()
+    
+    return transcript_file, summary_file
+
+def read_urls(source):
+    """
+    从文件或标准输入读取URL列表
+    
+    参数:
+        source: 文件路径，"-" 表示标准输入
     
-    # 第一步：转录
-    transcript_file, transcript_text = process_url(url, output_file, transcription_method)
-    print(f"转录完成，文件保存在: {transcript_file}")
+    返回:
+        list: 去重后的URL列表（保持原有顺序，忽略空行和#开头的注释行）
+    """
+    if source == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        with open(source, 'r', encoding='utf-8') as f:
+            lines = f.read().splitlines()
     
-    # 第二步：总结（如果需要）
-    summary_file = None
-    if summarize:
-        print("开始生成内容总结...")
+    urls = []
+    for line in lines:
+        line = line.strip()
+        if line and not line.startswith("#") and line not in urls:
+            urls.append(line)
+    return urls
+
+def process_batch(urls, transcription_method="volcengine", summarize=True, stage_workers=None,
+                  use_cache=True, refresh=False, metadata=None, on_result=None, summarizer=None, preprocess=None,
+                  compress=None):
+    """
+    批量处理多个播客URL，各阶段按流水线方式并发执行
+    
+    每个播客在独立线程中依次经过抓取、转录、总结三个阶段，
+    每个阶段的同时执行数量由各自的信号量限制，单个播客失败不会中断整个批次。
+    
+    参数:
+        urls: 小宇宙播客URL列表
+        transcription_method: 转录方法，即后端注册表中语音识别后端的名称
+        summarize: 是否生成总结
+        stage_workers: 各阶段并发数，形如 {"scrape": 16, "asr": 4, "llm": 8}
+        use_cache: 是否使用转录和总结缓存
+        refresh: 忽略已有缓存重新转录和总结
+        metadata: URL到已知节目信息的映射，对应的播客跳过页面抓取
+        on_result: 每个播客处理结束时调用的回调函数，参数为该播客的处理结果
+        summarizer: 总结后端的名称
+        preprocess: 识别前是否预处理音频
+        compress: 总结前是否压缩转录文本
+    
+    返回:
+        list: 每个URL的处理结果，形如 {"url", "transcript_file", "summary_file", "error"}
+    """
+    workers = dict(DEFAULT_STAGE_WORKERS)
+    workers.update({k: v for k, v in (stage_workers or {}).items() if v})
+    limits = {stage: threading.BoundedSemaphore(n) for stage, n in workers.items()}
+    
+    def run(url):
+        result = {"url": url, "transcript_file": None, "summary_file": None, "error": None}
         try:
-            summary_file, summary_text = summarize_with_volcengine(transcript_file)
-            print(f"总结完成，文件保存在: {summary_file}")
+            result["transcript_file"], result["summary_file"] = process_podcast(
+                url, None, transcription_method, summarize, limits=limits,
+                use_cache=use_cache, refresh=refresh, metadata=(metadata or {}).get(url), summarizer=summarizer,
+                preprocess=preprocess, compress=compress
+            )
         except Exception as e:
-            print(f"总结生成失败: {e}")
+            result["error"] = str(e)
+            logger.error(f"处理失败 [{url}]: {e}")
+        if on_result:
+            on_result(result)
+        return result
     
-    return transcript_file, summary_file
+    # 线程数为各阶段并发数之和，保证每个阶段都能被填满
+    logger.info(f"批量处理 {len(urls)} 个播客，各阶段并发数: {workers}")
+    with ThreadPoolExecutor(max_workers=max(1, sum(workers.values()))) as executor:
+        results = list(executor.map(run, urls))
+    
+    failed = [r for r in results if r["error"]]
+    logger.info(f"批量处理完成: 成功 {len(results) - len(failed)} 个，失败 {len(failed)} 个")
+    for r in failed:
+        logger.info(f"  失败: {r['url']} - {r['error']}")
+    return results
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="小宇宙播客一键转录与总结工具")
     parser.add_argument("url", nargs="?", help="小宇宙播客的URL")
     parser.add_argument("-o", "--output", help="输出文件路径")
-    parser.add_argument("--method", choices=["volcengine", "sr"], default="volcengine",
-                      help="转录方法: volcengine (火山引擎), sr (Speech Recognition)")
+    parser.add_argument("--method", choices=backends.asr_names(), default=backends.DEFAULT_ASR,
+                      help=f"转录方法: {backends.help_text('asr')}")
+    parser.add_argument("--summarizer", choices=backends.summarizer_names(), default=backends.DEFAULT_SUMMARIZER,
+                      help=f"总结方法: {backends.help_text('summarizer')}")
     parser.add_argument("--no-summary", action="store_true", help="不生成内容总结")
+    parser.add_argument("--batch", metavar="FILE",
+                      help="批量模式: 从文件读取URL列表（每行一个），\"-\" 表示从标准输入读取")
+    parser.add_argument("--scrape-workers", type=int, default=DEFAULT_STAGE_WORKERS["scrape"],
+                      help="批量模式下同时抓取页面的数量")
+    parser.add_argument("--asr-workers", type=int, default=DEFAULT_STAGE_WORKERS["asr"],
+                      help="批量模式下同时进行的转录任务数量")
+    parser.add_argument("--llm-workers", type=int, default=DEFAULT_STAGE_WORKERS["llm"],
+                      help="批量模式下同时进行的LLM总结数量")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入转录和总结缓存")
+    parser.add_argument("--refresh", action="store_true", help="忽略已有缓存，重新转录、总结并更新缓存")
+    parser.add_argument("--preprocess", action="store_true", default=None,
+                        help="识别前预处理音频（单声道16kHz、压缩静音、重新编码），减少上传和识别时间")
+    parser.add_argument("--compress", action="store_true", default=None,
+                        help="总结前先在本地去掉填充词和重复句，减少提示词的token数")
+    parser.add_argument("--stream", action="store_true",
+                      help="流式输出总结，边生成边写入文件并在终端显示（批量模式下不生效）")
+    parser.add_argument("--metrics", metavar="FILE",
+                      help="结束时把各阶段耗时和计数等指标写入文件（.json为JSON格式，否则为Prometheus文本格式）")
     
     args = parser.parse_args()
+    if args.metrics:
+        metrics.METRICS_FILE = args.metrics
+    
+    # 批量模式
+    if args.batch:
+        urls = read_urls(args.batch)
+        if not urls:
+            print("未提供URL，退出程序")
+            sys.exit(1)
+        
+        results = process_batch(
+            urls,
+            args.method,
+            not args.no_summary,
+            {"scrape": args.scrape_workers, "asr": args.asr_workers, "llm": args.llm_workers},
+            use_cache=not args.no_cache,
+            refresh=args.refresh,
+            summarizer=args.summarizer,
+            preprocess=args.preprocess,
+            compress=args.compress
+        )
+        sys.exit(1 if any(r["error"] for r in results) else 0)
     
     # 如果没有提供URL，进入交互模式
     url = args.url
@@ -76,7 +243,13 @@ def main():
             url, 
             args.output, 
             args.method, 
-            not args.no_summary
+            not args.no_summary,
+            use_cache=not args.no_cache,
+            refresh=args.refresh,
+            stream=args.stream,
+            summarizer=args.summarizer,
+            preprocess=args.preprocess,
+            compress=args.compress
         )
         
         print("\n处理完成!")
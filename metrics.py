@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+计时、指标和日志
+各模块通过 get_logger() 输出日志，默认格式与原来的print输出相同，设置 LOG_FORMAT=json 后输出结构化JSON日志，
+每条日志都带有当前节目ID和阶段。span() 记录各阶段耗时，incr() 记录下载字节数、查询次数、重试次数、
+LLM token数等计数，可以导出为Prometheus文本格式或JSON
+"""
+
+import os
+import sys
+import json
+import time
+import atexit
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 日志配置：text（默认，只输出消息）或 json
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+# 进程退出时把指标写入该文件，扩展名为.json时输出JSON，否则输出Prometheus文本格式
+METRICS_FILE = os.getenv("METRICS_FILE")
+
+# 耗时直方图的分桶（秒）
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+current_episode = contextvars.ContextVar("current_episode", default=None)
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+_lock = threading.Lock()
+_counters = {}     # (名称, 标签) -> 值
+_histograms = {}   # (名称, 标签) -> {"buckets": [...], "sum": 值, "count": 次数}
+_help = {}
+
+
+class JsonFormatter(logging.Formatter):
+    """把日志输出为一行JSON，附带节目ID、阶段和通过extra传入的字段"""
+
+    RESERVED = set(vars(logging.makeLogRecord({}))) | {"message", "asctime"}
+
+    def format(self, record):
+        entry = {
+            "time": round(record.created, 3),
+            "level": record.levelname.lower(),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        episode = getattr(record, "episode", None) or current_episode.get()
+        stage = getattr(record, "stage", None) or current_stage.get()
+        if episode:
+            entry["episode"] = episode
+        if stage:
+            entry["stage"] = stage
+        for name, value in vars(record).items():
+            if name not in self.RESERVED and name not in entry:
+                entry[name] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+def configure_logging(fmt=None, level=None, stream=None):
+    """
+    配置项目日志的输出格式，各模块的日志都挂在 "podcast" 日志器下
+
+    参数:
+        fmt: "text" 或 "json"
+        level: 日志级别
+        stream: 输出流，默认为标准输出
+    """
+    logger = logging.getLogger("podcast")
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stdout)
+    handler.setFormatter(JsonFormatter() if (fmt or LOG_FORMAT) == "json" else logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel((level or LOG_LEVEL).upper())
+    logger.propagate = False
+
+
+def get_logger(name):
+    """获取模块的日志器"""
+    return logging.getLogger(f"podcast.{name}")
+
+
+configure_logging()
+logger = get_logger("metrics")
+
+
+def _key(name, labels):
+    return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+
+def incr(name, value=1, help=None, **labels):
+    """增加计数器"""
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+        if help:
+            _help.setdefault(name, help)
+
+
+def observe(name, value, buckets=DURATION_BUCKETS, help=None, **labels):
+    """记录一次观测值（如耗时）"""
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = {"le": buckets, "buckets": [0] * len(buckets), "sum": 0.0, "count": 0}
+        for i, bound in enumerate(hist["le"]):
+            if value <= bound:
+                hist["buckets"][i] += 1
+        hist["sum"] += value
+        hist["count"] += 1
+        if help:
+            _help.setdefault(name, help)
+
+
+@contextmanager
+def episode_context(episode_id):
+    """在代码块内把日志和计时关联到指定的节目"""
+    token = current_episode.set(episode_id)
+    try:
+        yield
+    finally:
+        current_episode.reset(token)
+
+
+@contextmanager
+def span(stage, level=logging.INFO, **fields):
+    """
+    记录一个阶段的耗时
+
+    结束时写入 stage_duration_seconds 直方图，并输出一条带耗时的日志；出错时额外计数 stage_errors_total
+
+    参数:
+        stage: 阶段名称，如 scrape、download、asr_submit、asr_wait、llm
+        level: 结束时输出日志的级别，嵌套在其它阶段内的细分阶段可以使用DEBUG
+        fields: 附加到日志中的字段
+    """
+    token = current_stage.set(stage)
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        incr("stage_errors_total", help="各阶段出错的次数", stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        observe("stage_duration_seconds", elapsed, help="各阶段的耗时（秒）", stage=stage, status=status)
+        logger.log(level, f"阶段 {stage} {'完成' if status == 'ok' else '失败'}，耗时{elapsed:.2f}秒",
+                   extra=dict(fields, event="span", duration=round(elapsed, 3), status=status))
+        current_stage.reset(token)
+
+
+def snapshot():
+    """返回当前所有指标"""
+    with _lock:
+        counters = [{"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(_counters.items())]
+        histograms = [{"name": name, "labels": dict(labels), "count": hist["count"], "sum": hist["sum"],
+                       "buckets": dict(zip(map(str, hist["le"]), hist["buckets"]))}
+                      for (name, labels), hist in sorted(_histograms.items())]
+    return {"counters": counters, "histograms": histograms}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels.items()) + list((extra or {}).items())
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def prometheus_text():
+    """把指标导出为Prometheus文本格式"""
+    data = snapshot()
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            if name in _help:
+                lines.append(f"# HELP {name} {_help[name]}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for counter in data["counters"]:
+        header(counter["name"], "counter")
+        lines.append(f"{counter['name']}{_labels_text(counter['labels'])} {counter['value']}")
+    for hist in data["histograms"]:
+        name = hist["name"]
+        header(name, "histogram")
+        for bound, count in hist["buckets"].items():
+            lines.append(f"{name}_bucket{_labels_text(hist['labels'], {'le': bound})} {count}")
+        lines.append(f"{name}_bucket{_labels_text(hist['labels'], {'le': '+Inf'})} {hist['count']}")
+        lines.append(f"{name}_sum{_labels_text(hist['labels'])} {hist['sum']}")
+        lines.append(f"{name}_count{_labels_text(hist['labels'])} {hist['count']}")
+    return "\n".join(lines) + "\n"
+
+
+def write_metrics(path):
+    """把指标写入文件，扩展名为.json时输出JSON，否则输出Prometheus文本格式"""
+    with open(path, 'w', encoding='utf-8') as f:
+        if path.endswith(".json"):
+            json.dump(snapshot(), f, ensure_ascii=False, indent=2)
+        else:
+            f.write(prometheus_text())
+
+
+def _write_metrics_at_exit():
+    if METRICS_FILE:
+        try:
+            write_metrics(METRICS_FILE)
+        except OSError as e:
+            logger.error(f"写入指标文件失败: {e}")
+
+
+atexit.register(_write_metrics_at_exit)
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+音频文件的对象存储
+火山引擎语音识别只接受音频URL，本地文件（例如预处理后的音频）需要先放到识别服务可以访问的地址。
+默认的本地存储把文件复制到缓存目录，并由进程内的HTTP服务提供下载（支持HEAD和Range请求）；
+识别服务无法直接访问本机时，可以把 OBJECT_STORE_PUBLIC_URL 设置为指向该服务的公网地址（如反向代理或隧道），
+或者通过 OBJECT_STORE="模块:类" 使用自定义存储（例如对象存储服务），该类需要实现 put(path) 和 delete(url)
+"""
+
+import os
+import re
+import uuid
+import shutil
+import importlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+import metrics
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("object_store")
+
+# 存储配置
+OBJECT_STORE = os.getenv("OBJECT_STORE", "local")                        # local 或 "模块:类"
+OBJECT_STORE_DIR = os.getenv("OBJECT_STORE_DIR", os.path.join(".cache", "objects"))
+OBJECT_STORE_HOST = os.getenv("OBJECT_STORE_HOST", "127.0.0.1")
+OBJECT_STORE_PORT = int(os.getenv("OBJECT_STORE_PORT", "0"))             # 0表示随机端口
+OBJECT_STORE_PUBLIC_URL = os.getenv("OBJECT_STORE_PUBLIC_URL", "")       # 识别服务访问本地存储时使用的地址前缀
+
+RANGE_RE = re.compile(r'bytes=(\d*)-(\d*)$')
+CONTENT_TYPES = {".ogg": "audio/ogg", ".mp3": "audio/mpeg", ".wav": "audio/wav", ".m4a": "audio/mp4"}
+CHUNK_SIZE = 64 * 1024
+
+_store = None
+_store_lock = threading.Lock()
+
+
+class _FileHandler(BaseHTTPRequestHandler):
+    """提供存储目录中文件的下载，支持HEAD和单个Range请求"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_HEAD(self):
+        self._serve(body=False)
+
+    def do_GET(self):
+        self._serve(body=True)
+
+    def _serve(self, body):
+        name = os.path.basename(urlparse(self.path).path)
+        path = os.path.join(self.server.root, name)
+        if not name or not os.path.isfile(path):
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        size = os.path.getsize(path)
+        start, end = 0, size - 1
+        status = 200
+        match = RANGE_RE.match(self.headers.get("Range", ""))
+        if match and (match.group(1) or match.group(2)):
+            if match.group(1):
+                start = int(match.group(1))
+                end = min(int(match.group(2)), size - 1) if match.group(2) else size - 1
+            else:
+                start = max(0, size - int(match.group(2)))
+            if start > end:
+                self.send_response(416)
+                self.send_header("Content-Range", f"bytes */{size}")
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            status = 206
+
+        self.send_response(status)
+        self.send_header("Content-Type", CONTENT_TYPES.get(os.path.splitext(name)[1], "application/octet-stream"))
+        self.send_header("Content-Length", str(end - start + 1))
+        self.send_header("Accept-Ranges", "bytes")
+        if status == 206:
+            self.send_header("Content-Range", f"bytes {start}-{end}/{size}")
+        self.end_headers()
+        if not body:
+            return
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            try:
+                while remaining > 0:
+                    chunk = f.read(min(CHUNK_SIZE, remaining))
+                    if not chunk:
+                        break
+                    self.wfile.write(chunk)
+                    remaining -= len(chunk)
+            except (BrokenPipeError, ConnectionResetError):
+                pass
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+
+class LocalObjectStore:
+    """
+    本地对象存储：文件复制到存储目录后由进程内的HTTP服务提供下载
+
+    参数:
+        root: 存储目录
+        host: HTTP服务监听地址
+        port: HTTP服务端口，0表示随机端口
+        public_url: 对外的地址前缀，默认为 http://监听地址:端口
+    """
+
+    def __init__(self, root=None, host=None, port=None, public_url=None):
+        self.root = os.path.abspath(root or OBJECT_STORE_DIR)
+        self.host = host or OBJECT_STORE_HOST
+        self.port = OBJECT_STORE_PORT if port is None else port
+        self.public_url = (public_url if public_url is not None else OBJECT_STORE_PUBLIC_URL).rstrip("/")
+        self._server = None
+        self._lock = threading.Lock()
+
+    def _ensure_server(self):
+        with self._lock:
+            if self._server is None:
+                os.makedirs(self.root, exist_ok=True)
+                server = ThreadingHTTPServer((self.host, self.port), _FileHandler)
+                server.daemon_threads = True
+                server.root = self.root
+                threading.Thread(target=server.serve_forever, name="object-store", daemon=True).start()
+                self._server = server
+                if not self.public_url:
+                    logger.warning(f"本地对象存储只监听 http://{self.host}:{server.server_address[1]}，"
+                                   f"远程语音识别服务需要能访问该地址，必要时设置OBJECT_STORE_PUBLIC_URL")
+            return self._server
+
+    @property
+    def base_url(self):
+        server = self._ensure_server()
+        return self.public_url or f"http://{self.host}:{server.server_address[1]}"
+
+    def put(self, path):
+        """
+        存入文件
+
+        返回:
+            str: 文件的下载地址
+        """
+        self._ensure_server()
+        # 随机文件名，地址无法被猜到；保留扩展名，识别服务据此判断音频格式
+        name = f"{uuid.uuid4().hex}{os.path.splitext(path)[1].lower()}"
+        shutil.copyfile(path, os.path.join(self.root, name))
+        return f"{self.base_url}/{name}"
+
+    def delete(self, url):
+        """删除之前存入的文件"""
+        name = os.path.basename(urlparse(url).path)
+        try:
+            os.unlink(os.path.join(self.root, name))
+        except OSError:
+            pass
+
+    def close(self):
+        with self._lock:
+            if self._server is not None:
+                self._server.shutdown()
+                self._server.server_close()
+                self._server = None
+
+
+def is_public():
+    """存入的文件能否被远程服务访问：使用自定义存储或设置了OBJECT_STORE_PUBLIC_URL时才能访问"""
+    return OBJECT_STORE != "local" or bool(OBJECT_STORE_PUBLIC_URL)
+
+
+def get_store():
+    """获取进程内共享的对象存储"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            if OBJECT_STORE == "local":
+                _store = LocalObjectStore()
+            else:
+                module_name, _, class_name = OBJECT_STORE.partition(":")
+                _store = getattr(importlib.import_module(module_name), class_name)()
+        return _store
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+PCM音频读取
+语音识别和音频预处理共用的音频参数，以及把WAV文件或任意格式的音频（通过ffmpeg）按固定帧长读取为单声道PCM的函数。
+只依赖标准库，导入时不会加载任何语音识别后端
+"""
+
+import os
+import sys
+import math
+import wave
+import array
+import shutil
+import operator
+import subprocess
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 音频参数
+SAMPLE_RATE = 16000         # 识别使用的采样率
+SAMPLE_WIDTH = 2            # 16位PCM
+FRAME_MS = 30               # 静音检测的帧长（毫秒）
+SILENCE_THRESH_DB = -40     # 低于该音量（相对满幅度的dBFS）视为静音
+
+# 解码和编码使用的ffmpeg可执行文件
+FFMPEG_BINARY = os.getenv("FFMPEG_BINARY", "ffmpeg")
+
+# 各采样字节数对应的有符号整数数组类型
+ARRAY_TYPECODES = {1: 'b', 2: 'h', 4: 'i'}
+
+# Python 3.12起可以用math.sumprod在C中求平方和，更早的版本逐个相乘（每小时16kHz音频约5秒）
+if hasattr(math, 'sumprod'):
+    def _sum_of_squares(samples):
+        return math.sumprod(samples, samples)
+else:
+    def _sum_of_squares(samples):
+        return sum(map(operator.mul, samples, samples))
+
+
+def rms(frame, sample_width=SAMPLE_WIDTH):
+    """
+    计算一帧小端有符号PCM数据的均方根音量（替代Python 3.13中已移除的audioop.rms）
+
+    返回:
+        float: 均方根，空帧返回0
+    """
+    samples = array.array(ARRAY_TYPECODES[sample_width])
+    samples.frombytes(frame[:len(frame) - len(frame) % sample_width])
+    if not samples:
+        return 0.0
+    if sys.byteorder == 'big' and sample_width > 1:
+        samples.byteswap()
+    return math.sqrt(_sum_of_squares(samples) / len(samples))
+
+
+def read_wav_frames(wav_path, frame_ms=FRAME_MS):
+    """
+    按固定帧长读取WAV文件中的PCM数据
+
+    返回:
+        tuple: (采样率, 采样字节数, 帧生成器)
+    """
+    wav = wave.open(wav_path, 'rb')
+    if wav.getnchannels() != 1:
+        wav.close()
+        raise ValueError("只支持单声道WAV文件")
+    sample_rate = wav.getframerate()
+    sample_width = wav.getsampwidth()
+    frames_per_read = int(sample_rate * frame_ms / 1000)
+
+    def frames():
+        try:
+            while True:
+                data = wav.readframes(frames_per_read)
+                if not data:
+                    break
+                yield data
+        finally:
+            wav.close()
+
+    return sample_rate, sample_width, frames()
+
+
+def decode_pcm_frames(audio_path, sample_rate=SAMPLE_RATE, frame_ms=FRAME_MS):
+    """
+    用ffmpeg把任意格式的音频流式解码为单声道16位PCM，按固定帧长读取
+
+    解码结果通过管道传递，不生成中间WAV文件，内存中只保留当前帧
+
+    返回:
+        tuple: (采样率, 采样字节数, 帧生成器)
+    """
+    ffmpeg = shutil.which(FFMPEG_BINARY) or shutil.which("avconv")
+    if not ffmpeg:
+        raise RuntimeError(f"未找到ffmpeg（{FFMPEG_BINARY}），无法解码音频")
+
+    command = [
+        ffmpeg, "-nostdin", "-loglevel", "error",
+        "-i", audio_path,
+        "-f", "s16le", "-acodec", "pcm_s16le", "-ac", "1", "-ar", str(sample_rate),
+        "-",
+    ]
+    frame_bytes = int(sample_rate * frame_ms / 1000) * SAMPLE_WIDTH
+
+    def frames():
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                                   bufsize=frame_bytes * 64)
+        try:
+            while True:
+                data = process.stdout.read(frame_bytes)
+                if not data:
+                    break
+                yield data
+            process.stdout.close()
+            error = process.stderr.read().decode('utf-8', 'replace').strip()
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg解码失败: {error}")
+        finally:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+
+    return sample_rate, SAMPLE_WIDTH, frames()
+
+
+def is_mono_pcm_wav(path):
+    """判断文件是否为可以直接分段读取的单声道16位PCM WAV文件"""
+    if not path.lower().endswith('.wav'):
+        return False
+    try:
+        with wave.open(path, 'rb') as wav:
+            return wav.getnchannels() == 1 and wav.getsampwidth() == SAMPLE_WIDTH
+    except (wave.Error, EOFError, OSError):
+        return False
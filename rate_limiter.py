@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+共享限流器
+按接口（语音识别提交、查询、LLM）和集群/模型分别维护令牌桶和并发信号量，请求在本地排队等待配额，
+而不是发出后被服务端拒绝。收到429时暂停该接口并降低速率，之后随成功请求逐步恢复到配置的速率
+
+配置方式为环境变量 RATE_LIMIT_<接口>_<集群或模型>（只对该集群/模型生效）或 RATE_LIMIT_<接口>，
+值为 "每秒请求数,最大并发数"，0表示不限制，例如:
+    RATE_LIMIT_ASR_SUBMIT=2,0
+    RATE_LIMIT_ASR_QUERY_VOLC_AUC_COMMON=20,0
+    RATE_LIMIT_LLM=5,8
+"""
+
+import os
+import re
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+from dotenv import load_dotenv
+
+import metrics
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("rate_limiter")
+
+# 各接口的默认限制: (每秒请求数, 最大并发数)
+DEFAULT_LIMITS = {
+    "asr_submit": (5, 0),
+    "asr_query": (20, 0),
+    "llm": (5, 8),
+}
+# 连续收到429时最多在本地重试的次数
+MAX_THROTTLE_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "8"))
+# 收到429且服务端未给出Retry-After时的默认暂停时间（秒）
+DEFAULT_PENALTY = 1.0
+# 速率降低的下限（相对配置速率的比例）
+MIN_RATE_RATIO = 0.1
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+class RateLimiter:
+    """
+    令牌桶 + 并发信号量
+
+    参数:
+        name: 限流器名称，用于日志
+        rate: 每秒请求数，0表示不限制
+        concurrency: 最大并发数，0表示不限制
+        burst: 令牌桶容量，默认为一秒的请求数
+    """
+
+    def __init__(self, name, rate=0, concurrency=0, burst=None):
+        self.name = name
+        self.max_rate = float(rate)
+        self.rate = self.max_rate
+        self.burst = float(burst or max(1.0, self.max_rate))
+        self.tokens = self.burst
+        self.concurrency = int(concurrency)
+        self.paused_until = 0.0
+        self.throttled = 0   # 累计收到429的次数
+        self._updated = time.monotonic()
+        self._cond = threading.Condition()
+        self._semaphore = threading.BoundedSemaphore(self.concurrency) if self.concurrency > 0 else None
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """等待直到可以发出一个请求；不限速率时只等待429之后的暂停结束"""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    self._cond.wait(self.paused_until - now)
+                    continue
+                if self.max_rate <= 0:
+                    return
+                self._refill(now)
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                else:
+                    self._cond.wait((1 - self.tokens) / self.rate)
+
+    def slot(self):
+        """占用一个并发名额，在with代码块（包括读取响应）结束后释放"""
+        return self._semaphore if self._semaphore else nullcontext()
+
+    def penalize(self, retry_after=None):
+        """
+        收到429时调用：暂停发出新请求，并把速率减半
+
+        参数:
+            retry_after: 服务端要求的等待时间（秒）
+        """
+        with self._cond:
+            self.throttled += 1
+            delay = retry_after if retry_after is not None else DEFAULT_PENALTY
+            self.paused_until = max(self.paused_until, time.monotonic() + delay)
+            if self.max_rate > 0:
+                self.rate = max(self.max_rate * MIN_RATE_RATIO, self.rate / 2)
+                self.tokens = min(self.tokens, 0)
+            self._cond.notify_all()
+        metrics.incr("rate_limited_total", help="请求被服务端限流（429）的次数", limiter=self.name)
+        logger.warning(f"[{self.name}] 请求被限流，暂停{delay:.1f}秒，当前速率{self.rate:.2f}次/秒")
+
+    def succeed(self):
+        """请求成功时调用，速率逐步恢复到配置值"""
+        if self.rate < self.max_rate:
+            with self._cond:
+                self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+    @contextmanager
+    def limit(self):
+        """占用并发名额并等待令牌"""
+        with self.slot():
+            self.acquire()
+            yield
+
+
+def _env_key(*parts):
+    return "RATE_LIMIT_" + "_".join(re.sub(r'\W+', '_', part).strip('_').upper() for part in parts if part)
+
+
+def parse_limit(value):
+    """解析 "每秒请求数,最大并发数" 形式的配置"""
+    rate, _, concurrency = value.partition(",")
+    return float(rate or 0), int(concurrency or 0)
+
+
+def get_limiter(kind, scope=None):
+    """
+    获取进程内共享的限流器
+
+    参数:
+        kind: 接口类型，见DEFAULT_LIMITS
+        scope: 集群名或模型标识，不同集群/模型的配额分别计算
+    """
+    name = f"{kind}:{scope}" if scope else kind
+    with _limiters_lock:
+        if name not in _limiters:
+            value = os.getenv(_env_key(kind, scope)) or os.getenv(_env_key(kind))
+            rate, concurrency = parse_limit(value) if value else DEFAULT_LIMITS.get(kind, (0, 0))
+            _limiters[name] = RateLimiter(name, rate, concurrency)
+        return _limiters[name]
+
+
+def retry_after_seconds(response):
+    """解析响应中的Retry-After头（秒数形式），没有时返回None"""
+    value = response.headers.get("Retry-After")
+    try:
+        return max(0.0, float(value)) if value else None
+    except ValueError:
+        return None
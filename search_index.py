@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+转录文本和总结的全文检索
+把文本切分为句段，中文按相邻两个字（bigram）、英文和数字按单词建立倒排索引（SQLite FTS5），
+保存转录文本和总结时增量更新，只处理新增或有变化的文件。有话语级结果的转录文本按话语建立索引，
+检索结果可以定位到毫秒级的时间点
+"""
+
+import os
+import re
+import time
+import sqlite3
+import argparse
+import threading
+
+from dotenv import load_dotenv
+
+import metrics
+import utterance_store
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("search_index")
+
+# 索引数据库路径
+INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", os.path.join(".cache", "search.sqlite3"))
+SEGMENT_CHARS = 200       # 没有话语信息时每个句段的最大字数
+SNIPPET_CHARS = 60        # 检索结果中片段的长度
+SUMMARY_SUFFIX = "_summary.md"
+
+CJK_RE = re.compile(r'[㐀-鿿豈-﫿]+|[0-9a-z]+')
+SENTENCE_END_RE = re.compile(r'(?<=[。！？!?；;…\n])')
+
+_write_lock = threading.Lock()
+
+
+def tokenize(text):
+    """
+    把文本转换为以空格分隔的索引词
+
+    中文连续字符按相邻两个字切分（只有一个字时保留单字），英文和数字转为小写后按单词切分
+    """
+    terms = []
+    for run in CJK_RE.findall(text.lower()):
+        if run.isascii() or len(run) == 1:
+            terms.append(run)
+        else:
+            terms.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return " ".join(terms)
+
+
+def match_query(query):
+    """把检索词转换为FTS5查询，空格分隔的每个词都必须出现，中文词要求连续出现"""
+    phrases = []
+    for word in query.split():
+        for run in CJK_RE.findall(word.lower()):
+            if run.isascii():
+                phrases.append(f'"{run}"')
+            elif len(run) == 1:
+                # 单字只能按前缀匹配包含该字开头的二元词
+                phrases.append(f'"{run}"*')
+            else:
+                phrases.append('"' + " ".join(run[i:i + 2] for i in range(len(run) - 1)) + '"')
+    return " AND ".join(phrases)
+
+
+def connect(path=None):
+    """打开索引数据库，不存在时创建"""
+    path = path or INDEX_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(
+        "CREATE TABLE IF NOT EXISTS documents ("
+        " id INTEGER PRIMARY KEY,"
+        " path TEXT UNIQUE NOT NULL,"
+        " episode TEXT NOT NULL,"
+        " kind TEXT NOT NULL,"
+        " title TEXT,"
+        " signature TEXT NOT NULL,"
+        " indexed_at REAL NOT NULL);"
+        "CREATE INDEX IF NOT EXISTS idx_documents_episode ON documents (episode);"
+        "CREATE TABLE IF NOT EXISTS segments ("
+        " id INTEGER PRIMARY KEY,"
+        " doc_id INTEGER NOT NULL,"
+        " start_ms INTEGER,"
+        " char_offset INTEGER NOT NULL,"
+        " text TEXT NOT NULL);"
+        "CREATE INDEX IF NOT EXISTS idx_segments_doc ON segments (doc_id);"
+        # 不保存索引词原文（contentless），删除时根据句段文本重新计算索引词
+        "CREATE VIRTUAL TABLE IF NOT EXISTS segment_terms USING fts5(terms, content='');"
+    )
+    return conn
+
+
+def document_kind(path):
+    return "summary" if path.endswith(SUMMARY_SUFFIX) else "transcript"
+
+
+def episode_of(path):
+    """同一期节目的转录文件和总结文件归为一组"""
+    path = os.path.abspath(path)
+    if path.endswith(SUMMARY_SUFFIX):
+        return path[:-len(SUMMARY_SUFFIX)]
+    return os.path.splitext(path)[0]
+
+
+def _signature(path):
+    """文件（以及话语文件）的大小和修改时间，未变化时跳过重新索引"""
+    parts = []
+    for name in (path, utterance_store.sidecar_path(path) if document_kind(path) == "transcript" else None):
+        if name and os.path.exists(name):
+            stat = os.stat(name)
+            parts.append(f"{stat.st_size}:{stat.st_mtime_ns}")
+    return "|".join(parts)
+
+
+def _segments(path, text):
+    """
+    把文档切分为句段
+
+    返回:
+        list: (开始时间毫秒数或None, 在文件中的字符偏移, 文本)
+    """
+    utterance_file = utterance_store.sidecar_path(path)
+    if document_kind(path) == "transcript" and os.path.exists(utterance_file):
+        segments = []
+        cursor = 0
+        for u in utterance_store.iter_utterances(utterance_file):
+            position = text.find(u.text, cursor)
+            if position < 0:
+                position = cursor
+            else:
+                cursor = position + len(u.text)
+            segments.append((int(u.start * 1000), position, u.text))
+        return segments
+
+    segments = []
+    offset = 0
+    start = 0
+    current = ""
+    for sentence in SENTENCE_END_RE.split(text):
+        if current and len(current) + len(sentence) > SEGMENT_CHARS:
+            segments.append((None, start, current))
+            start = offset
+            current = ""
+        current += sentence
+        offset += len(sentence)
+    if current.strip():
+        segments.append((None, start, current))
+    return segments
+
+
+def _delete_document(conn, doc_id):
+    for row in conn.execute("SELECT id, text FROM segments WHERE doc_id = ?", (doc_id,)).fetchall():
+        conn.execute("INSERT INTO segment_terms (segment_terms, rowid, terms) VALUES ('delete', ?, ?)",
+                     (row["id"], tokenize(row["text"])))
+    conn.execute("DELETE FROM segments WHERE doc_id = ?", (doc_id,))
+    conn.execute("DELETE FROM documents WHERE id = ?", (doc_id,))
+
+
+def index_file(conn, path, force=False):
+    """
+    把一个转录文件或总结文件加入索引，文件未变化时跳过
+
+    返回:
+        bool: 是否重新建立了该文件的索引
+    """
+    path = os.path.abspath(path)
+    signature = _signature(path)
+    row = conn.execute("SELECT id, signature FROM documents WHERE path = ?", (path,)).fetchone()
+    if row and row["signature"] == signature and not force:
+        return False
+
+    with open(path, 'r', encoding='utf-8') as f:
+        text = f.read()
+    kind = document_kind(path)
+    title = os.path.basename(episode_of(path))
+    if kind == "transcript" and text.startswith("标题: "):
+        title = text.split("\n", 1)[0][len("标题: "):].strip()
+
+    with _write_lock, conn:
+        if row:
+            _delete_document(conn, row["id"])
+        doc_id = conn.execute(
+            "INSERT INTO documents (path, episode, kind, title, signature, indexed_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (path, episode_of(path), kind, title, signature, time.time()),
+        ).lastrowid
+        for start_ms, char_offset, segment in _segments(path, text):
+            segment_id = conn.execute(
+                "INSERT INTO segments (doc_id, start_ms, char_offset, text) VALUES (?, ?, ?, ?)",
+                (doc_id, start_ms, char_offset, segment),
+            ).lastrowid
+            conn.execute("INSERT INTO segment_terms (rowid, terms) VALUES (?, ?)", (segment_id, tokenize(segment)))
+    return True
+
+
+def add_document(path, index_path=None):
+    """保存转录文本或总结后调用，增量更新索引；索引出错不影响主流程"""
+    try:
+        conn = connect(index_path)
+        try:
+            index_file(conn, path)
+        finally:
+            conn.close()
+    except (sqlite3.Error, OSError, UnicodeDecodeError) as e:
+        logger.warning(f"更新检索索引失败 [{path}]: {e}")
+
+
+def update(paths, index_path=None, force=False):
+    """
+    扫描文件或目录，只为新增和有变化的转录、总结文件建立索引，并移除已删除文件的索引
+
+    返回:
+        tuple: (重新索引的文件数, 移除的文件数)
+    """
+    files = []
+    roots = []
+    for path in paths:
+        if os.path.isdir(path):
+            roots.append(os.path.abspath(path))
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".txt") or name.endswith(SUMMARY_SUFFIX):
+                    files.append(os.path.join(path, name))
+        else:
+            files.append(path)
+
+    conn = connect(index_path)
+    try:
+        indexed = 0
+        for path in files:
+            try:
+                indexed += index_file(conn, path, force)
+            except (OSError, UnicodeDecodeError) as e:
+                logger.warning(f"跳过无法读取的文件 [{path}]: {e}")
+
+        removed = 0
+        for row in conn.execute("SELECT id, path FROM documents").fetchall():
+            if os.path.dirname(row["path"]) in roots and not os.path.exists(row["path"]):
+                with _write_lock, conn:
+                    _delete_document(conn, row["id"])
+                removed += 1
+        return indexed, removed
+    finally:
+        conn.close()
+
+
+def _snippet(text, query):
+    """截取包含检索词的片段，返回(片段, 检索词在句段中的位置)"""
+    lowered = text.lower()
+    position = -1
+    for word in query.lower().split():
+        position = lowered.find(word)
+        if position >= 0:
+            break
+    position = max(position, 0)
+    begin = max(0, position - SNIPPET_CHARS // 3)
+    snippet = text[begin:begin + SNIPPET_CHARS].replace("\n", " ")
+    return ("…" if begin else "") + snippet + ("…" if begin + SNIPPET_CHARS < len(text) else ""), position
+
+
+def search(query, limit=10, snippets=3, kind=None, index_path=None):
+    """
+    检索转录文本和总结，按节目汇总相关度排序
+
+    参数:
+        query: 检索词，空格分隔的多个词需要同时出现
+        limit: 返回的节目数量
+        snippets: 每期节目返回的片段数量
+        kind: 只检索 "transcript" 或 "summary"
+
+    返回:
+        list: 每期节目一个字典，包含 episode、title、score、hits 和 snippets；
+              每个片段包含 path、kind、start_ms（有话语信息时）、offset（字符偏移）和 text
+    """
+    expression = match_query(query)
+    if not expression:
+        return []
+
+    conn = connect(index_path)
+    try:
+        # bm25越小越相关，取负值后按节目求和
+        rows = conn.execute(
+            "SELECT s.id, s.doc_id, s.start_ms, s.char_offset, s.text, d.path, d.episode, d.kind, d.title,"
+            " -m.score AS score"
+            " FROM (SELECT rowid, bm25(segment_terms) AS score FROM segment_terms WHERE segment_terms MATCH ?) m"
+            " JOIN segments s ON s.id = m.rowid JOIN documents d ON d.id = s.doc_id"
+            " WHERE ? IS NULL OR d.kind = ?",
+            (expression, kind, kind),
+        ).fetchall()
+    finally:
+        conn.close()
+
+    episodes = {}
+    for row in rows:
+        entry = episodes.setdefault(row["episode"], {"episode": row["episode"], "title": row["title"],
+                                                     "score": 0.0, "hits": 0, "rows": []})
+        entry["score"] += row["score"]
+        entry["hits"] += 1
+        entry["rows"].append(row)
+        if row["kind"] == "transcript":
+            entry["title"] = row["title"]
+
+    results = sorted(episodes.values(), key=lambda e: e["score"], reverse=True)[:limit]
+    for entry in results:
+        best = sorted(entry.pop("rows"), key=lambda r: r["score"], reverse=True)[:snippets]
+        entry["snippets"] = []
+        for row in sorted(best, key=lambda r: (r["kind"], r["start_ms"] or 0, r["char_offset"])):
+            text, position = _snippet(row["text"], query)
+            entry["snippets"].append({"path": row["path"], "kind": row["kind"], "start_ms": row["start_ms"],
+                                      "offset": row["char_offset"] + position, "text": text})
+        entry["score"] = round(entry["score"], 3)
+    return results
+
+
+def print_stats(index_path=None):
+    conn = connect(index_path)
+    try:
+        for row in conn.execute("SELECT kind, COUNT(*) AS n FROM documents GROUP BY kind"):
+            print(f"{row['kind']}: {row['n']}个文件")
+        print(f"句段: {conn.execute('SELECT COUNT(*) FROM segments').fetchone()[0]}")
+    finally:
+        conn.close()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="检索转录文本和总结")
+    parser.add_argument("--db", default=INDEX_PATH, help="索引数据库路径")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="检索，按节目返回排序结果")
+    search_parser.add_argument("query", nargs="+", help="检索词")
+    search_parser.add_argument("-n", "--limit", type=int, default=10, help="返回的节目数量")
+    search_parser.add_argument("--snippets", type=int, default=3, help="每期节目显示的片段数量")
+    search_parser.add_argument("--kind", choices=["transcript", "summary"], help="只检索转录文本或总结")
+
+    update_parser = subparsers.add_parser("update", help="为新增和有变化的文件建立索引")
+    update_parser.add_argument("paths", nargs="*", default=["."], help="文件或目录，默认为当前目录")
+    update_parser.add_argument("--force", action="store_true", help="重新索引所有指定的文件")
+
+    subparsers.add_parser("stats", help="显示索引统计")
+
+    args = parser.parse_args()
+
+    if args.command == "update":
+        indexed, removed = update(args.paths, args.db, args.force)
+        print(f"更新了{indexed}个文件的索引，移除了{removed}个已删除文件的索引")
+    elif args.command == "stats":
+        print_stats(args.db)
+    else:
+        query = " ".join(args.query)
+        start = time.perf_counter()
+        results = search(query, args.limit, args.snippets, args.kind, args.db)
+        elapsed = (time.perf_counter() - start) * 1000
+        print(f"找到{len(results)}期节目（{elapsed:.1f}毫秒）")
+        for i, entry in enumerate(results, 1):
+            print(f"\n{i}. {entry['title']}（相关度{entry['score']}，命中{entry['hits']}处）")
+            for snippet in entry["snippets"]:
+                if snippet["start_ms"] is not None:
+                    position = f"{utterance_store.format_time(snippet['start_ms'] / 1000)} {snippet['start_ms']}ms"
+                else:
+                    position = f"{'总结' if snippet['kind'] == 'summary' else '文本'}第{snippet['offset']}字"
+                print(f"   [{position}] {snippet['text']}")
+                print(f"      {snippet['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,308 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+本地HTTP服务
+常驻进程中运行转录与总结流水线，连接池、轮询器和缓存在请求之间保持复用。
+同一期节目（URL、转录方法、是否总结均相同）正在处理时，新的请求会共享已有任务，不会重复抓取、转录和总结
+
+接口:
+    POST /jobs               提交任务，请求体为 {"url": ..., "method": "volcengine", "summarize": true}
+    GET  /jobs               列出任务
+    GET  /jobs/<id>          查询任务状态
+    GET  /jobs/<id>/stream   以Server-Sent Events推送任务状态变化，任务结束后关闭连接
+    GET  /health             健康检查
+    GET  /metrics            以Prometheus文本格式导出各阶段耗时和计数
+"""
+
+import os
+import json
+import time
+import uuid
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse
+
+from dotenv import load_dotenv
+
+import backends
+import metrics
+from main import DEFAULT_STAGE_WORKERS, process_podcast
+from transcript_cache import episode_id_from_url
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("server")
+
+# 服务配置
+SERVICE_HOST = os.getenv("SERVICE_HOST", "127.0.0.1")
+SERVICE_PORT = int(os.getenv("SERVICE_PORT", "8765"))
+MAX_FINISHED_JOBS = int(os.getenv("SERVICE_MAX_FINISHED_JOBS", "1000"))  # 保留的已结束任务数量
+STREAM_KEEPALIVE = 15  # 推送状态时的心跳间隔（秒）
+MAX_BODY_BYTES = 64 * 1024  # 提交任务的请求体上限（字节）
+
+FINISHED = ("done", "failed")
+
+
+class Job:
+    """一个处理任务，状态变化时通知等待的连接"""
+
+    def __init__(self, url, method, summarize):
+        self.id = uuid.uuid4().hex
+        self.url = url
+        self.method = method
+        self.summarize = summarize
+        self.status = "queued"
+        self.transcript_file = None
+        self.summary_file = None
+        self.error = None
+        self.requests = 1          # 共享该任务的请求数
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.version = 0           # 每次状态变化加一，推送时用于判断是否有新状态
+        self.changed = threading.Condition()
+
+    def update(self, **fields):
+        with self.changed:
+            for name, value in fields.items():
+                setattr(self, name, value)
+            self.updated_at = time.time()
+            self.version += 1
+            self.changed.notify_all()
+
+    def wait(self, version, timeout):
+        """等待状态变化，返回当前版本号"""
+        with self.changed:
+            self.changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def to_dict(self):
+        return {
+            "id": self.id,
+            "url": self.url,
+            "method": self.method,
+            "summarize": self.summarize,
+            "status": self.status,
+            "transcript_file": self.transcript_file,
+            "summary_file": self.summary_file,
+            "error": self.error,
+            "requests": self.requests,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+
+class JobManager:
+    """
+    管理任务并合并重复请求
+
+    参数:
+        stage_workers: 各阶段并发数，形如 {"scrape": 16, "asr": 4, "llm": 8}
+        use_cache: 是否使用转录和总结缓存
+    """
+
+    def __init__(self, stage_workers=None, use_cache=True):
+        workers = dict(DEFAULT_STAGE_WORKERS)
+        workers.update({k: v for k, v in (stage_workers or {}).items() if v})
+        self.limits = {stage: threading.BoundedSemaphore(n) for stage, n in workers.items()}
+        self.use_cache = use_cache
+        self.executor = ThreadPoolExecutor(max_workers=max(1, sum(workers.values())),
+                                           thread_name_prefix="podcast-job")
+        self.jobs = OrderedDict()
+        self.inflight = {}
+        self.lock = threading.Lock()
+
+    def submit(self, url, method="volcengine", summarize=True):
+        """
+        提交任务，同一期节目正在处理时返回已有任务
+
+        返回:
+            tuple: (任务, 是否与已有任务合并)
+        """
+        # 按节目ID合并，同一期节目带不同查询参数（如分享链接的 ?s=...）的请求共用一个任务
+        key = (episode_id_from_url(url), method, bool(summarize))
+        with self.lock:
+            job = self.inflight.get(key)
+            if job:
+                job.requests += 1
+                return job, True
+            job = Job(url, method, bool(summarize))
+            self.jobs[job.id] = job
+            self.inflight[key] = job
+            self._evict()
+        self.executor.submit(self._run, key, job)
+        return job, False
+
+    def get(self, job_id):
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self.lock:
+            return [job.to_dict() for job in self.jobs.values()]
+
+    def _run(self, key, job):
+        job.update(status="running")
+        try:
+            transcript_file, summary_file = process_podcast(
+                job.url, None, job.method, job.summarize, limits=self.limits, use_cache=self.use_cache
+            )
+            job.update(status="done", transcript_file=transcript_file, summary_file=summary_file)
+        except Exception as e:
+            logger.error(f"处理失败 [{job.url}]: {e}")
+            job.update(status="failed", error=str(e))
+        finally:
+            with self.lock:
+                if self.inflight.get(key) is job:
+                    del self.inflight[key]
+
+    def _evict(self):
+        """只保留最近的MAX_FINISHED_JOBS个已结束任务"""
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in FINISHED]
+        for job_id in finished[:max(0, len(finished) - MAX_FINISHED_JOBS)]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+class RequestHandler(BaseHTTPRequestHandler):
+    """处理HTTP请求，任务管理器通过 server.manager 访问"""
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        parts = [p for p in urlparse(self.path).path.split("/") if p]
+        manager = self.server.manager
+
+        if parts == ["health"]:
+            return self._send_json(200, {"status": "ok"})
+        if parts == ["metrics"]:
+            return self._send_text(200, metrics.prometheus_text())
+        if parts == ["jobs"]:
+            return self._send_json(200, {"jobs": manager.list()})
+        if len(parts) in (2, 3) and parts[0] == "jobs":
+            job = manager.get(parts[1])
+            if not job:
+                return self._send_json(404, {"error": "任务不存在"})
+            if len(parts) == 2:
+                return self._send_json(200, job.to_dict())
+            if parts[2] == "stream":
+                return self._stream(job)
+        self._send_json(404, {"error": "未知的接口"})
+
+    def do_POST(self):
+        if urlparse(self.path).path.rstrip("/") != "/jobs":
+            return self._send_json(404, {"error": "未知的接口"})
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+        except ValueError:
+            length = -1
+        # 长度无效或过大时不读取请求体（读取负数长度会一直阻塞到客户端断开），回复后关闭连接
+        if length < 0:
+            self.close_connection = True
+            return self._send_json(400, {"error": "Content-Length无效"}, {"Connection": "close"})
+        if length > MAX_BODY_BYTES:
+            self.close_connection = True
+            return self._send_json(413, {"error": f"请求体超过{MAX_BODY_BYTES}字节"}, {"Connection": "close"})
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send_json(400, {"error": "请求体不是有效的JSON"})
+
+        url = (body.get("url") or "").strip() if isinstance(body, dict) else ""
+        method = body.get("method", "volcengine") if url else None
+        if not url:
+            return self._send_json(400, {"error": "缺少url"})
+        if method not in backends.asr_names():
+            return self._send_json(400, {"error": f"不支持的转录方法: {method}"})
+        summarize = body.get("summarize", True)
+        if not isinstance(summarize, bool):
+            return self._send_json(400, {"error": "summarize必须是布尔值"})
+
+        job, coalesced = self.server.manager.submit(url, method, summarize)
+        self._send_json(200 if coalesced else 202, dict(job.to_dict(), coalesced=coalesced),
+                        {"Location": f"/jobs/{job.id}"})
+
+    def _send_json(self, status, data, headers=None):
+        self._send_text(status, json.dumps(data, ensure_ascii=False), headers, "application/json; charset=utf-8")
+
+    def _send_text(self, status, text, headers=None, content_type="text/plain; version=0.0.4; charset=utf-8"):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _stream(self, job):
+        """推送任务状态，直到任务结束或客户端断开"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        version = -1
+        try:
+            while True:
+                current = job.wait(version, STREAM_KEEPALIVE)
+                if current == version:
+                    self.wfile.write(b": keepalive\n\n")
+                else:
+                    version = current
+                    data = json.dumps(job.to_dict(), ensure_ascii=False)
+                    self.wfile.write(f"event: status\ndata: {data}\n\n".encode("utf-8"))
+                self.wfile.flush()
+                if job.status in FINISHED:
+                    break
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+
+def serve(host=None, port=None, stage_workers=None, use_cache=True):
+    """启动HTTP服务，阻塞直到进程被中断"""
+    server = ThreadingHTTPServer((host or SERVICE_HOST, port or SERVICE_PORT), RequestHandler)
+    server.daemon_threads = True
+    server.manager = JobManager(stage_workers, use_cache)
+    logger.info(f"服务已启动: http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("正在停止服务...")
+    finally:
+        server.server_close()
+        server.manager.shutdown()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="以本地HTTP服务方式运行播客转录与总结")
+    parser.add_argument("--host", default=SERVICE_HOST, help="监听地址")
+    parser.add_argument("--port", type=int, default=SERVICE_PORT, help="监听端口")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入转录和总结缓存")
+    parser.add_argument("--scrape-workers", type=int, default=DEFAULT_STAGE_WORKERS["scrape"],
+                        help="同时抓取页面的数量")
+    parser.add_argument("--asr-workers", type=int, default=DEFAULT_STAGE_WORKERS["asr"],
+                        help="同时进行的转录任务数量")
+    parser.add_argument("--llm-workers", type=int, default=DEFAULT_STAGE_WORKERS["llm"],
+                        help="同时进行的LLM总结数量")
+
+    args = parser.parse_args()
+    serve(args.host, args.port,
+          {"scrape": args.scrape_workers, "asr": args.asr_workers, "llm": args.llm_workers},
+          use_cache=not args.no_cache)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,111 +6,629 @@
 """
 
 import os
+import re
+import sys
 import json
+import logging
 import argparse
-import requests
+import threading
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+import http_client
+import metrics
+import rate_limiter
+import search_index
+import summary_cache
+import transcript_compress
+import utterance_store
+
 # 加载环境变量
 load_dotenv()
 
-def summarize_with_volcengine(transcript_file, output_file=None):
+logger = metrics.get_logger("summarize_transcript")
+
+# LLM API配置
+API_URL = os.getenv("ARK_API_URL", "https://ark.cn-beijing.volces.com/api/v3/chat/completions")
+MODEL = "ep-20250214142937-g8bvt"  # 使用用户提供的模型标识符
+TEMPERATURE = 0.7
+MAX_TOKENS = 4000
+# 补全请求的读取超时（秒）。生成较长的回答可能超过通用的HTTP_READ_TIMEOUT，超时后也不重试；0表示不限制
+LLM_READ_TIMEOUT = float(os.getenv("ARK_READ_TIMEOUT", "600")) or None
+
+# 提示词
+SYSTEM_PROMPT = "你是一个专业的播客内容分析助手。"
+PROMPT_TEMPLATE = """我现在要给你发一个播客的内容记录。我需要你：
+1. 首先用一段话总结播客的答题内容；
+2. 按照"问题"和"回答"进行播客内容的具体总结，格式是：问题1：balabala, 回答：balabal; 问题2：...
+
+播客内容：{transcript_text}
+"""
+
+# 长文本分段总结配置：超过单段token预算的转录文本会被切分后并发总结，再合并结果
+CHUNK_TOKENS = int(os.getenv("SUMMARY_CHUNK_TOKENS", "12000"))
+CHUNK_WORKERS = int(os.getenv("SUMMARY_CHUNK_WORKERS", "4"))
+
+MAP_PROMPT_TEMPLATE = """下面是一个播客内容记录的第{index}部分（共{total}部分）。我需要你：
+1. 首先用一段话总结这一部分的主要内容；
+2. 按照"问题"和"回答"总结这一部分的具体内容，格式是：问题1：balabala, 回答：balabal; 问题2：...
+
+播客内容（第{index}部分）：{transcript_text}
+"""
+
+# 边转录边总结时，提交某一段时还不知道总段数
+PIPELINE_MAP_PROMPT_TEMPLATE = """下面是一个播客内容记录的第{index}部分（后面可能还有其它部分）。我需要你：
+1. 首先用一段话总结这一部分的主要内容；
+2. 按照"问题"和"回答"总结这一部分的具体内容，格式是：问题1：balabala, 回答：balabal; 问题2：...
+
+播客内容（第{index}部分）：{transcript_text}
+"""
+
+REDUCE_PROMPT_TEMPLATE = """下面是同一个播客按顺序分成若干部分后，每一部分的总结。请把它们合并成一份完整的总结。我需要你：
+1. 首先用一段话总结播客的答题内容；
+2. 按照"问题"和"回答"进行播客内容的具体总结，合并重复的问题并保持原有顺序，格式是：问题1：balabala, 回答：balabal; 问题2：...
+
+各部分总结：
+{partial_summaries}
+"""
+
+# 句子结束标点和次级断句标点
+SENTENCE_END_RE = re.compile(r'(?<=[。！？!?；;…\n])')
+CLAUSE_END_RE = re.compile(r'(?<=[，,、：:])')
+CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u9fff\uf900-\ufaff\uff00-\uffef]')
+# 转录文件开头的标题行（xiaoyuzhou_to_text.save_text写入）
+TITLE_LINE_RE = re.compile(r'标题: [^\n]*\n+')
+
+def estimate_tokens(text):
+    """
+    粗略估算文本的token数
+    
+    中文字符和全角标点按每个1个token计算，其余字符按每4个字符1个token计算
+    """
+    cjk = len(CJK_RE.findall(text))
+    other = len(text) - cjk - text.count(' ') - text.count('\n')
+    return cjk + (max(other, 0) + 3) // 4
+
+def split_transcript(text, max_tokens=None):
+    """
+    在句子和标点边界处把转录文本切分为不超过token预算的若干段
+    
+    参数:
+        text: 转录文本
+        max_tokens: 每段的token预算，默认为CHUNK_TOKENS
+    
+    返回:
+        list: 文本段列表
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    
+    # 先按句子切分，超长的句子再按逗号等次级标点切分，仍然超长的按字符数硬切
+    pieces = []
+    for sentence in SENTENCE_END_RE.split(text):
+        if not sentence:
+            continue
+        if estimate_tokens(sentence) <= max_tokens:
+            pieces.append(sentence)
+            continue
+        for clause in CLAUSE_END_RE.split(sentence):
+            while estimate_tokens(clause) > max_tokens:
+                pieces.append(clause[:max_tokens])
+                clause = clause[max_tokens:]
+            if clause:
+                pieces.append(clause)
+    
+    chunks = []
+    current = []
+    current_tokens = 0
+    for piece in pieces:
+        tokens = estimate_tokens(piece)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current = []
+            current_tokens = 0
+        current.append(piece)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def split_utterances(utterances, max_tokens=None):
+    """
+    在话语边界处把转录结果切分为不超过token预算的若干段，有说话人信息时每句前标注说话人
+    
+    参数:
+        utterances: Utterance的可迭代对象
+        max_tokens: 每段的token预算，默认为CHUNK_TOKENS
+    
+    返回:
+        list: 文本段列表
+    """
+    max_tokens = max_tokens or CHUNK_TOKENS
+    
+    chunks = []
+    current = []
+    current_tokens = 0
+    for u in utterances:
+        line = f"说话人{u.speaker}：{u.text}\n" if u.speaker else f"{u.text}\n"
+        tokens = estimate_tokens(line)
+        if current and current_tokens + tokens > max_tokens:
+            chunks.append("".join(current))
+            current = []
+            current_tokens = 0
+        # 单句话超过预算时退回到按标点切分
+        if tokens > max_tokens:
+            chunks.extend(split_transcript(line, max_tokens))
+            continue
+        current.append(line)
+        current_tokens += tokens
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+def complete(prompt, use_cache=True, refresh=False, on_delta=None):
+    """
+    使用默认的模型和采样参数完成一次对话请求，优先读取总结缓存
+    
+    参数:
+        prompt: 用户提示词
+        use_cache: 是否使用总结缓存
+        refresh: 忽略已有缓存重新请求LLM
+        on_delta: 流式输出回调，提供时使用流式请求，每收到一段文本调用一次
+    
+    返回:
+        str: 模型生成的文本
+    """
+    # 构建请求体
+    payload = {
+        "model": MODEL,
+        "messages": [
+            {
+                "role": "system",
+                "content": SYSTEM_PROMPT
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "temperature": TEMPERATURE,
+        "max_tokens": MAX_TOKENS
+    }
+    
+    key = summary_cache.cache_key(payload) if use_cache else None
+    if key and not refresh:
+        text = summary_cache.get_summary(key)
+        if text is not None:
+            logger.info("命中总结缓存，跳过LLM请求")
+            metrics.incr("summary_cache_hits_total", help="命中总结缓存的次数")
+            if on_delta:
+                on_delta(text)
+            return text
+    
+    # 并发名额覆盖整个请求，包括读取流式响应
+    limiter = rate_limiter.get_limiter("llm", MODEL)
+    with limiter.slot(), metrics.span("llm_request", logging.DEBUG, stream=bool(on_delta)):
+        if on_delta:
+            text = stream_completion(payload, on_delta)
+        else:
+            text = request_completion(payload)
+    if key:
+        summary_cache.put_summary(key, text, model=MODEL)
+    return text
+
+def complete_all(prompts, use_cache=True, refresh=False, workers=None):
+    """并发完成多个提示词，按顺序返回生成的文本"""
+    with ThreadPoolExecutor(max_workers=workers or CHUNK_WORKERS) as executor:
+        # 在工作线程中沿用调用方的日志上下文（节目ID）
+        futures = [executor.submit(contextvars.copy_context().run, complete, prompt, use_cache, refresh)
+                   for prompt in prompts]
+        return [future.result() for future in futures]
+
+def summarize_text(transcript_text, use_cache=True, refresh=False, chunk_tokens=None, workers=None,
+                   on_delta=None, utterances=None):
+    """
+    总结转录文本，超长文本自动切分后并发总结各段，再合并为最终总结
+    
+    参数:
+        transcript_text: 转录文本
+        use_cache: 是否使用总结缓存
+        refresh: 忽略已有缓存重新请求LLM
+        chunk_tokens: 每段的token预算，默认为CHUNK_TOKENS
+        workers: 并发请求数，默认为CHUNK_WORKERS
+        on_delta: 流式输出回调，只用于生成最终总结的那一次请求
+        utterances: 话语级转录结果（Utterance的可迭代对象），提供时长文本在话语边界处切分
+    
+    返回:
+        str: 总结文本
+    """
+    chunk_tokens = chunk_tokens or CHUNK_TOKENS
+    workers = workers or CHUNK_WORKERS
+    
+    if utterances is not None and estimate_tokens(transcript_text) > chunk_tokens:
+        chunks = split_utterances(utterances, chunk_tokens)
+    else:
+        chunks = split_transcript(transcript_text, chunk_tokens)
+    if len(chunks) <= 1:
+        return complete(PROMPT_TEMPLATE.format(transcript_text=transcript_text), use_cache, refresh, on_delta)
+    
+    # 第一步(map)：并发总结每一段
+    logger.info(f"转录文本较长（约{estimate_tokens(transcript_text)} tokens），分为{len(chunks)}段并发总结...")
+    total = len(chunks)
+    prompts = [
+        MAP_PROMPT_TEMPLATE.format(index=i + 1, total=total, transcript_text=chunk)
+        for i, chunk in enumerate(chunks)
+    ]
+    partials = complete_all(prompts, use_cache, refresh, workers)
+    
+    # 第二步(reduce)：合并各段总结，合并输入仍然超长时分组逐层合并
+    return reduce_summaries(partials, use_cache, refresh, chunk_tokens, workers, on_delta)
+
+def reduce_summaries(partials, use_cache=True, refresh=False, chunk_tokens=None, workers=None,
+                     on_delta=None):
+    """
+    把按顺序排列的各段总结合并为最终总结
+    
+    参数:
+        partials: 各段总结列表
+        其余参数同summarize_text
+    
+    返回:
+        str: 合并后的总结文本
+    """
+    chunk_tokens = chunk_tokens or CHUNK_TOKENS
+    workers = workers or CHUNK_WORKERS
+    
+    while True:
+        # 按token预算把相邻的总结分组，每组合并为一份
+        groups = [[]]
+        group_tokens = 0
+        for partial in partials:
+            tokens = estimate_tokens(partial)
+            if groups[-1] and group_tokens + tokens > chunk_tokens:
+                groups.append([])
+                group_tokens = 0
+            groups[-1].append(partial)
+            group_tokens += tokens
+        # 单段总结已超过预算时，至少两两合并，保证每一轮都在减少段数
+        if len(groups) == len(partials) > 1:
+            groups = [partials[i:i + 2] for i in range(0, len(partials), 2)]
+        
+        prompts = [
+            REDUCE_PROMPT_TEMPLATE.format(partial_summaries="\n\n".join(
+                f"【第{i + 1}部分】\n{partial}" for i, partial in enumerate(group)
+            ))
+            for group in groups
+        ]
+        logger.info(f"正在合并{len(partials)}段总结...")
+        if len(prompts) == 1:
+            return complete(prompts[0], use_cache, refresh, on_delta)
+        
+        partials = complete_all(prompts, use_cache, refresh, workers)
+
+
+class IncrementalSummarizer:
+    """
+    边转录边总结：转录后端每识别出一段文本就调用feed()，累计的文本达到单段token预算时
+    立即提交这一段的总结（map），转录结束后只需总结剩余部分并合并（reduce）
+
+    参数:
+        use_cache: 是否使用总结缓存
+        refresh: 忽略已有缓存重新请求LLM
+        chunk_tokens: 每段的token预算，默认为CHUNK_TOKENS
+        workers: 并发请求数，默认为CHUNK_WORKERS
+        compress: 是否压缩转录文本，默认为TRANSCRIPT_COMPRESS
+    """
+
+    def __init__(self, use_cache=True, refresh=False, chunk_tokens=None, workers=None, compress=None):
+        self.use_cache = use_cache
+        self.refresh = refresh
+        self.chunk_tokens = chunk_tokens or CHUNK_TOKENS
+        self.workers = workers or CHUNK_WORKERS
+        enabled = transcript_compress.COMPRESS_ENABLED if compress is None else compress
+        self._compressor = transcript_compress.TranscriptCompressor() if enabled else None
+        self._buffer = ""
+        self._futures = []
+        self._executor = None
+        self._lock = threading.Lock()
+        self._tokens = [0, 0]  # 压缩前后的token估算
+
+    @property
+    def started(self):
+        """是否已经提交过分段总结"""
+        return bool(self._futures)
+
+    def _submit(self, chunk):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.workers)
+        prompt = PIPELINE_MAP_PROMPT_TEMPLATE.format(index=len(self._futures) + 1, transcript_text=chunk)
+        logger.info(f"提前总结第{len(self._futures) + 1}段（约{estimate_tokens(chunk)} tokens）")
+        self._futures.append(self._executor.submit(contextvars.copy_context().run, complete, prompt,
+                                                   self.use_cache, self.refresh))
+
+    def feed(self, text):
+        """追加一段新识别出的文本（各段按顺序拼接后即为完整的转录文本）"""
+        with self._lock:
+            if self._compressor:
+                before = estimate_tokens(text)
+                compressed = self._compressor.compress(text)
+                # 保留英文等语言分段之间的空格
+                text = ' ' + compressed if compressed and text[:1].isspace() else compressed
+                self._tokens[0] += before
+                self._tokens[1] += estimate_tokens(text)
+            self._buffer += text
+            if estimate_tokens(self._buffer) <= self.chunk_tokens:
+                return
+            # 只提交完整的段，最后一段留在缓冲区中继续累积
+            chunks = split_transcript(self._buffer, self.chunk_tokens)
+            for chunk in chunks[:-1]:
+                self._submit(chunk)
+            self._buffer = chunks[-1]
+
+    def finish(self, on_delta=None):
+        """
+        总结剩余的文本并合并各段总结
+
+        返回:
+            str: 最终总结；没有提交过分段总结时返回None，由调用方按普通方式总结完整的转录文本
+        """
+        with self._lock:
+            try:
+                if not self._futures:
+                    return None
+                if self._compressor:
+                    before, after = self._tokens
+                    metrics.incr("compress_tokens_saved_total", before - after,
+                                 help="转录文本预压缩减少的token数（估算）")
+                    logger.info(f"转录文本预压缩: 约{before} tokens -> 约{after} tokens"
+                                f"（减少{(before - after) / max(before, 1):.1%}）")
+                if self._buffer.strip():
+                    self._submit(self._buffer)
+                    self._buffer = ""
+                partials = [future.result() for future in self._futures]
+                return reduce_summaries(partials, self.use_cache, self.refresh, self.chunk_tokens, self.workers,
+                                        on_delta)
+            finally:
+                self.close()
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+def summarize_with_volcengine(transcript_file, output_file=None, use_cache=True, refresh=False,
+                              chunk_tokens=None, workers=None, stream=False, compress=None, incremental=None):
     """
     使用火山引擎LLM API对转录文本进行总结
     
     参数:
         transcript_file: 转录文本文件路径
         output_file: 输出文件路径，默认为None（自动生成）
+        use_cache: 是否使用总结缓存
+        refresh: 忽略已有缓存重新请求LLM，并用新结果更新缓存
+        chunk_tokens: 长文本分段总结时每段的token预算，默认为CHUNK_TOKENS
+        workers: 分段总结的并发请求数，默认为CHUNK_WORKERS
+        stream: 是否流式输出，边生成边写入文件并在终端显示
+        compress: 是否先在本地压缩转录文本（去掉填充词和重复句），默认为TRANSCRIPT_COMPRESS
+        incremental: 转录过程中已经在提前总结的IncrementalSummarizer，提供时只需完成剩余部分和合并
     
     返回:
         tuple: (输出文件路径, 总结文本)
     """
     # 读取转录文本
-    print(f"读取转录文本: {transcript_file}")
+    logger.info(f"读取转录文本: {transcript_file}")
     with open(transcript_file, 'r', encoding='utf-8') as f:
         transcript_text = f.read()
+    # 去掉标题行，总结只取决于转录内容：同一音频以不同标题转载时可以复用总结缓存
+    match = TITLE_LINE_RE.match(transcript_text)
+    if match:
+        transcript_text = transcript_text[match.end():]
     
-    # 构建提示词
-    prompt = f"""我现在要给你发一个播客的内容记录。我需要你：
-1. 首先用一段话总结播客的答题内容；
-2. 按照"问题"和"回答"进行播客内容的具体总结，格式是：问题1：balabala, 回答：balabal; 问题2：...
-
-播客内容：{transcript_text}
-"""
+    if output_file is None:
+        base_name = os.path.splitext(transcript_file)[0]
+        output_file = f"{base_name}_summary.md"
+    
+    # 转录过程中没有提前总结（文本较短或命中了转录缓存）时按普通方式总结
+    if incremental is not None and not incremental.started:
+        incremental.close()
+        incremental = None
+    
+    # 转录文件旁边有话语级结果时，长文本按话语边界切分
+    utterances = None
+    utterance_file = utterance_store.sidecar_path(transcript_file)
+    if os.path.exists(utterance_file):
+        utterances = utterance_store.iter_utterances(utterance_file)
+    
+    if incremental is None and (transcript_compress.COMPRESS_ENABLED if compress is None else compress):
+        with metrics.span("compress"):
+            before = estimate_tokens(transcript_text)
+            transcript_text = transcript_compress.compress(transcript_text)
+            after = estimate_tokens(transcript_text)
+        if utterances is not None:
+            utterances = transcript_compress.compress_utterances(utterances)
+        metrics.incr("compress_tokens_saved_total", before - after, help="转录文本预压缩减少的token数（估算）")
+        logger.info(f"转录文本预压缩: 约{before} tokens -> 约{after} tokens"
+                    f"（减少{(before - after) / max(before, 1):.1%}）")
     
-    # 准备API请求
-    api_url = "https://ark.cn-beijing.volces.com/api/v3/chat/completions"
+    def run(on_delta=None):
+        if incremental is not None:
+            return incremental.finish(on_delta)
+        return summarize_text(transcript_text, use_cache, refresh, chunk_tokens, workers,
+                              on_delta=on_delta, utterances=utterances)
     
+    with metrics.span("llm"):
+        if not stream:
+            summary_text = run()
+            
+            # 保存总结文本
+            with open(output_file, 'w', encoding='utf-8') as f:
+                f.write(summary_text)
+        else:
+            # 流式输出：每收到一段文本立即写入文件并刷新到终端，连接中断时已生成的部分会保留在文件中
+            with open(output_file, 'w', encoding='utf-8') as f:
+                def on_delta(delta):
+                    f.write(delta)
+                    f.flush()
+                    sys.stdout.write(delta)
+                    sys.stdout.flush()
+                
+                try:
+                    summary_text = run(on_delta)
+                except Exception:
+                    sys.stdout.write("\n")
+                    if f.tell() > 0:
+                        logger.error(f"总结生成中断，已生成的部分保存在: {output_file}")
+                    raise
+            sys.stdout.write("\n")
+    
+    logger.info(f"总结文本已保存到: {output_file}")
+    search_index.add_document(output_file)
+    
+    # 返回文件路径和总结文本
+    return output_file, summary_text
+
+def count_tokens(payload, text, usage=None):
+    """记录LLM请求的token用量，API未返回用量时按字符数估算"""
+    if usage:
+        prompt_tokens, completion_tokens = usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    else:
+        prompt_tokens = sum(estimate_tokens(m["content"]) for m in payload["messages"])
+        completion_tokens = estimate_tokens(text)
+    metrics.incr("llm_tokens_total", prompt_tokens, help="LLM请求的token数", model=MODEL, type="prompt")
+    metrics.incr("llm_tokens_total", completion_tokens, help="LLM请求的token数", model=MODEL, type="completion")
+
+def api_headers():
+    """构建LLM API请求头"""
     # 从环境变量获取API密钥
     ark_api_key = os.getenv("ARK_API_KEY")
     
     if not ark_api_key:
         raise ValueError("请在.env文件中设置ARK_API_KEY")
     
-    headers = {
+    return {
         "Content-Type": "application/json",
         "Authorization": f"Bearer {ark_api_key}"
     }
+
+def request_completion(payload):
+    """
+    向火山引擎LLM API发送chat completions请求
     
-    # 构建请求体
-    payload = {
-        "model": "ep-20250214142937-g8bvt",  # 使用用户提供的模型标识符
-        "messages": [
-            {
-                "role": "system",
-                "content": "你是一个专业的播客内容分析助手。"
-            },
-            {
-                "role": "user",
-                "content": prompt
-            }
-        ],
-        "temperature": 0.7,
-        "max_tokens": 4000
-    }
+    参数:
+        payload: 请求体
     
-    print("正在发送请求到火山引擎LLM API...")
-    response = requests.post(api_url, headers=headers, json=payload)
+    返回:
+        str: 模型生成的文本
+    """
+    headers = api_headers()
+    
+    logger.info("正在发送请求到火山引擎LLM API...")
+    response = http_client.post(API_URL, idempotent=True, retry_reads=False, headers=headers, json=payload,
+                                timeout=(http_client.CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+                                limiter=rate_limiter.get_limiter("llm", MODEL))
     
     if response.status_code != 200:
-        print(f"API请求失败: {response.status_code}")
-        print(response.text)
+        logger.error(f"API请求失败: {response.status_code}")
+        logger.error(response.text)
         raise Exception(f"API请求失败: {response.status_code}, {response.text}")
     
     # 解析响应
     result = response.json()
-    print(f"API响应状态码: {response.status_code}")
+    logger.info(f"API响应状态码: {response.status_code}")
     
     try:
         summary_text = result["choices"][0]["message"]["content"]
     except KeyError as e:
-        print(f"API响应解析错误: {e}")
-        print(f"API响应内容: {result}")
+        logger.error(f"API响应解析错误: {e}")
+        logger.error(f"API响应内容: {result}")
         raise Exception(f"API响应格式不符合预期: {e}")
     
-    # 保存总结文本
-    if output_file is None:
-        base_name = os.path.splitext(transcript_file)[0]
-        output_file = f"{base_name}_summary.md"
+    count_tokens(payload, summary_text, result.get("usage"))
+    return summary_text
+
+def stream_completion(payload, on_delta):
+    """
+    以SSE流式方式发送chat completions请求（stream: true）
+    
+    参数:
+        payload: 请求体
+        on_delta: 每收到一段生成文本时调用的回调函数
+    
+    返回:
+        str: 完整的生成文本
+    """
+    headers = api_headers()
+    # 请求在流的最后返回token用量
+    payload = dict(payload, stream=True, stream_options={"include_usage": True})
     
-    with open(output_file, 'w', encoding='utf-8') as f:
-        f.write(summary_text)
+    logger.info("正在发送流式请求到火山引擎LLM API...")
+    response = http_client.post(API_URL, idempotent=True, retry_reads=False, headers=headers, json=payload,
+                                stream=True, timeout=(http_client.CONNECT_TIMEOUT, LLM_READ_TIMEOUT),
+                                limiter=rate_limiter.get_limiter("llm", MODEL))
     
-    print(f"总结文本已保存到: {output_file}")
+    if response.status_code != 200:
+        logger.error(f"API请求失败: {response.status_code}")
+        logger.error(response.text)
+        raise Exception(f"API请求失败: {response.status_code}, {response.text}")
     
-    # 返回文件路径和总结文本
-    return output_file, summary_text
+    parts = []
+    usage = None
+    finished = False
+    try:
+        for line in response.iter_lines():
+            # SSE事件以"data:"开头，空行和注释行忽略
+            if not line or not line.startswith(b"data:"):
+                continue
+            data = line[len(b"data:"):].strip()
+            if data == b"[DONE]":
+                finished = True
+                break
+            
+            try:
+                chunk = json.loads(data.decode('utf-8'))
+                choice = chunk["choices"][0] if chunk.get("choices") else {}
+            except (ValueError, KeyError, IndexError) as e:
+                raise Exception(f"流式响应格式不符合预期: {e}")
+            
+            usage = chunk.get("usage") or usage
+            delta = (choice.get("delta") or {}).get("content")
+            if delta:
+                parts.append(delta)
+                on_delta(delta)
+            if choice.get("finish_reason"):
+                finished = True
+    finally:
+        response.close()
+    
+    if not finished:
+        raise Exception("流式响应意外中断，总结不完整")
+    
+    text = "".join(parts)
+    count_tokens(payload, text, usage)
+    return text
 
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="将转录文本发送给LLM进行总结")
     parser.add_argument("transcript_file", help="转录文本文件路径")
     parser.add_argument("-o", "--output", help="输出文件路径")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入总结缓存")
+    parser.add_argument("--refresh", action="store_true", help="忽略已有缓存，重新请求LLM并更新缓存")
+    parser.add_argument("--chunk-tokens", type=int, default=CHUNK_TOKENS,
+                        help="长文本分段总结时每段的token预算")
+    parser.add_argument("--workers", type=int, default=CHUNK_WORKERS, help="分段总结的并发请求数")
+    parser.add_argument("--stream", action="store_true", help="流式输出，边生成边写入文件并在终端显示")
+    parser.add_argument("--compress", action="store_true", default=None,
+                        help="先在本地去掉填充词和重复句，减少提示词的token数")
     
     args = parser.parse_args()
     
     try:
-        file_path, summary = summarize_with_volcengine(args.transcript_file, args.output)
+        file_path, summary = summarize_with_volcengine(args.transcript_file, args.output,
+                                                       use_cache=not args.no_cache, refresh=args.refresh,
+                                                       chunk_tokens=args.chunk_tokens, workers=args.workers,
+                                                       stream=args.stream, compress=args.compress)
         print("\n总结预览:")
         print("-" * 40)
         preview = summary[:500] + "..." if len(summary) > 500 else summary
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+LLM总结结果缓存
+以 转录文本、提示词、模型和采样参数 的哈希作为键，把总结结果保存在单个SQLite文件中，
+重复运行或失败重试时跳过已经完成的LLM调用
+"""
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+
+from dotenv import load_dotenv
+
+# 加载环境变量
+load_dotenv()
+
+# 缓存文件路径和条目数上限（超出后按最近使用时间淘汰）
+CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", os.path.join(".cache", "summaries.sqlite3"))
+CACHE_MAX_ENTRIES = int(os.getenv("SUMMARY_CACHE_MAX_ENTRIES", "2000"))
+
+
+def cache_key(payload):
+    """
+    根据LLM请求体计算缓存键
+
+    请求体中包含了模型、消息（提示词模板与转录文本）、temperature、max_tokens等全部输入，
+    与是否流式输出无关的字段不参与计算
+    """
+    relevant = {k: v for k, v in payload.items() if k not in ("stream",)}
+    raw = json.dumps(relevant, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _connect(path=None):
+    path = path or CACHE_PATH
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    conn = sqlite3.connect(path, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS summaries ("
+        " key TEXT PRIMARY KEY,"
+        " model TEXT,"
+        " content TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " accessed_at REAL NOT NULL)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_summaries_accessed ON summaries (accessed_at)")
+    return conn
+
+
+def get_summary(key, path=None):
+    """读取缓存的总结文本，未命中时返回None"""
+    conn = _connect(path)
+    try:
+        with conn:
+            row = conn.execute("SELECT content FROM summaries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE summaries SET accessed_at = ? WHERE key = ?", (time.time(), key))
+        return row[0]
+    finally:
+        conn.close()
+
+
+def put_summary(key, content, model=None, path=None, max_entries=None):
+    """写入总结文本，并淘汰超出条目数上限的最久未使用条目"""
+    max_entries = CACHE_MAX_ENTRIES if max_entries is None else max_entries
+    now = time.time()
+    conn = _connect(path)
+    try:
+        with conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, model, content, created_at, accessed_at)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (key, model, content, now, now),
+            )
+            conn.execute(
+                "DELETE FROM summaries WHERE key IN ("
+                " SELECT key FROM summaries ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (max_entries,),
+            )
+    finally:
+        conn.close()
@@ -0,0 +1,317 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+播客增量同步工具
+抓取关注的小宇宙播客主页或RSS订阅，与本地记录的已处理节目比较，只转录和总结新增或变化的节目
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import threading
+import xml.etree.ElementTree as ET
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+
+import backends
+import episode_cache
+import http_client
+import metrics
+from main import DEFAULT_STAGE_WORKERS, process_batch, read_urls
+from xiaoyuzhou_to_text import HEADERS, embedded_data, parse_episodes
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("sync_podcasts")
+
+# 同步状态文件，记录每个播客的ETag和每期节目的处理状态
+STATE_PATH = os.getenv("SYNC_STATE_PATH", os.path.join(".cache", "sync_state.json"))
+
+EPISODE_URL = "https://www.xiaoyuzhoufm.com/episode/{eid}"
+ITUNES_NS = "{http://www.itunes.com/dtds/podcast-1.0.dtd}"
+
+
+def load_state(path=None):
+    """读取同步状态"""
+    try:
+        with open(path or STATE_PATH, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+    state.setdefault("shows", {})
+    state.setdefault("episodes", {})
+    return state
+
+
+def save_state(state, path=None):
+    """保存同步状态，先写临时文件再替换，避免中断时损坏"""
+    path = path or STATE_PATH
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+def parse_duration(value):
+    """把 "HH:MM:SS"、"MM:SS" 或秒数形式的时长转换为秒"""
+    if not value:
+        return None
+    try:
+        seconds = 0
+        for part in value.strip().split(":"):
+            seconds = seconds * 60 + float(part)
+        return seconds
+    except ValueError:
+        return None
+
+
+def parse_show_page(html):
+    """从小宇宙播客主页中解析节目列表"""
+    for data in embedded_data(html):
+        episodes = [
+            {
+                "key": episode["eid"],
+                "url": EPISODE_URL.format(eid=episode["eid"]),
+                "title": episode["title"],
+                "audio_url": episode["audio_url"],
+                "duration": episode["duration"],
+            }
+            for episode in parse_episodes(data) if episode["eid"]
+        ]
+        if episodes:
+            return episodes
+    return []
+
+
+def parse_feed(xml_text):
+    """从RSS订阅中解析节目列表"""
+    root = ET.fromstring(xml_text)
+    episodes = []
+    for item in root.iter("item"):
+        enclosure = item.find("enclosure")
+        audio_url = enclosure.get("url") if enclosure is not None else None
+        if not audio_url:
+            continue
+        link = (item.findtext("link") or "").strip()
+        guid = (item.findtext("guid") or "").strip()
+        episodes.append({
+            "key": guid or link or audio_url.split("?", 1)[0],
+            "url": link or audio_url,
+            "title": (item.findtext("title") or "").strip() or None,
+            "audio_url": audio_url,
+            "duration": parse_duration(item.findtext(f"{ITUNES_NS}duration")),
+        })
+    return episodes
+
+
+def fetch_show(show_url, show_state):
+    """
+    抓取播客主页或RSS订阅
+
+    参数:
+        show_url: 播客主页或RSS订阅地址
+        show_state: 上次抓取时记录的状态（ETag等），会被更新
+
+    返回:
+        list: 节目列表，内容未变化（304）时返回None
+    """
+    headers = dict(HEADERS, **episode_cache.conditional_headers(show_state))
+    response = http_client.get(show_url, headers=headers)
+    if response.status_code == 304:
+        return None
+    response.raise_for_status()
+
+    content_type = response.headers.get('Content-Type', '')
+    head = response.text.lstrip()[:100]
+    if 'xml' in content_type or head.startswith('<?xml') or head.startswith('<rss'):
+        episodes = parse_feed(response.content)
+    else:
+        episodes = parse_show_page(response.text)
+
+    # 只在解析出节目后保存校验值；页面结构临时变化导致没有解析出节目时，
+    # 保存校验值会让之后的每次同步都得到304而不再重新解析
+    if episodes:
+        show_state["etag"] = response.headers.get('ETag')
+        show_state["last_modified"] = response.headers.get('Last-Modified')
+    else:
+        logger.warning(f"没有从 {show_url} 解析出任何节目，下次同步时重新抓取完整内容")
+        show_state.pop("etag", None)
+        show_state.pop("last_modified", None)
+    return episodes
+
+
+def update_episodes(show_url, episodes, state, mark_only=False):
+    """
+    把抓取到的节目与本地记录比较，新增或音频发生变化的节目标记为待处理
+
+    返回:
+        int: 新标记为待处理的节目数量
+    """
+    queued = 0
+    for episode in episodes:
+        record = state["episodes"].get(episode["key"])
+        audio_path = episode["audio_url"].split("?", 1)[0]
+        if record and record.get("audio_url", "").split("?", 1)[0] == audio_path:
+            # 音频未变化，只更新可能过期的CDN签名
+            record["audio_url"] = episode["audio_url"]
+            continue
+
+        state["episodes"][episode["key"]] = dict(
+            episode,
+            show=show_url,
+            status="skipped" if mark_only else "pending",
+            updated_at=time.time(),
+        )
+        queued += 0 if mark_only else 1
+    return queued
+
+
+def sync(show_urls, transcription_method="volcengine", summarize=True, stage_workers=None,
+         use_cache=True, dry_run=False, mark_only=False, state_path=None):
+    """
+    同步关注的播客，只处理新增或变化的节目
+
+    参数:
+        show_urls: 播客主页或RSS订阅地址列表
+        transcription_method: 转录方法
+        summarize: 是否生成总结
+        stage_workers: 各阶段并发数
+        use_cache: 是否使用缓存
+        dry_run: 只列出待处理的节目，不实际处理
+        mark_only: 把当前所有节目记为已处理（用于首次同步时跳过历史节目）
+        state_path: 同步状态文件路径
+
+    返回:
+        list: 本次处理的结果
+    """
+    state = load_state(state_path)
+    state_lock = threading.Lock()
+
+    def check(show_url):
+        show_state = dict(state["shows"].get(show_url, {}))
+        try:
+            episodes = fetch_show(show_url, show_state)
+        except Exception as e:
+            logger.error(f"抓取播客失败 [{show_url}]: {e}")
+            return
+        show_state["checked_at"] = time.time()
+        with state_lock:
+            state["shows"][show_url] = show_state
+            if episodes is None:
+                logger.info(f"播客无更新: {show_url}")
+                return
+            queued = update_episodes(show_url, episodes, state, mark_only)
+        logger.info(f"播客 {show_url}: 共{len(episodes)}期，新增或变化{queued}期")
+
+    # 每个播客只发送一次（条件）请求
+    workers = (stage_workers or {}).get("scrape") or DEFAULT_STAGE_WORKERS["scrape"]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(check, show_urls))
+    save_state(state, state_path)
+    if mark_only:
+        return []
+
+    # 之前失败或中断的节目也会重新处理
+    pending = [key for key, record in state["episodes"].items() if record.get("status") in ("pending", "failed")]
+    if not pending:
+        logger.info("没有需要处理的新节目")
+        return []
+
+    # 每期节目使用不同的URL处理（URL决定缓存和输出文件）：RSS条目的link可能都是播客主页，
+    # 与任何其它节目（包括已处理的）相同时改用音频地址
+    url_counts = Counter(record.get("url") for record in state["episodes"].values())
+    keys_by_url = {}
+    for key in pending:
+        record = state["episodes"][key]
+        url = record["url"] if url_counts[record["url"]] == 1 else record["audio_url"]
+        if url in keys_by_url:
+            url = f"{record['audio_url']}#{key}"
+        keys_by_url[url] = key
+
+    logger.info(f"待处理节目: {len(pending)}期")
+    if dry_run:
+        for url, key in keys_by_url.items():
+            print(f"  {state['episodes'][key].get('title')} - {url}")
+        return []
+
+    metadata = {
+        url: {
+            "audio_url": state["episodes"][key]["audio_url"],
+            "title": state["episodes"][key].get("title") or "未知标题",
+            "duration": state["episodes"][key].get("duration"),
+        }
+        for url, key in keys_by_url.items()
+    }
+
+    def on_result(result):
+        with state_lock:
+            record = state["episodes"][keys_by_url[result["url"]]]
+            record["status"] = "failed" if result["error"] else "done"
+            record["error"] = result["error"]
+            record["transcript_file"] = result["transcript_file"]
+            record["summary_file"] = result["summary_file"]
+            record["updated_at"] = time.time()
+            save_state(state, state_path)
+
+    return process_batch(list(keys_by_url), transcription_method, summarize, stage_workers,
+                         use_cache=use_cache, metadata=metadata, on_result=on_result)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="同步关注的播客，只转录和总结新节目")
+    parser.add_argument("shows", nargs="*", help="小宇宙播客主页或RSS订阅地址")
+    parser.add_argument("-f", "--file", help="从文件读取播客地址（每行一个），\"-\" 表示从标准输入读取")
+    parser.add_argument("--method", choices=backends.asr_names(), default=backends.DEFAULT_ASR,
+                        help=f"转录方法: {backends.help_text('asr')}")
+    parser.add_argument("--no-summary", action="store_true", help="不生成内容总结")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入转录和总结缓存")
+    parser.add_argument("--dry-run", action="store_true", help="只列出待处理的节目，不实际处理")
+    parser.add_argument("--mark-only", action="store_true",
+                        help="把当前所有节目记为已处理，不进行转录（首次同步时跳过历史节目）")
+    parser.add_argument("--state", default=STATE_PATH, help="同步状态文件路径")
+    parser.add_argument("--scrape-workers", type=int, default=DEFAULT_STAGE_WORKERS["scrape"],
+                        help="同时抓取页面的数量")
+    parser.add_argument("--asr-workers", type=int, default=DEFAULT_STAGE_WORKERS["asr"],
+                        help="同时进行的转录任务数量")
+    parser.add_argument("--llm-workers", type=int, default=DEFAULT_STAGE_WORKERS["llm"],
+                        help="同时进行的LLM总结数量")
+
+    args = parser.parse_args()
+
+    shows = list(args.shows)
+    if args.file:
+        shows.extend(url for url in read_urls(args.file) if url not in shows)
+    if not shows:
+        print("未提供播客地址，退出程序")
+        sys.exit(1)
+
+    results = sync(
+        shows,
+        args.method,
+        not args.no_summary,
+        {"scrape": args.scrape_workers, "asr": args.asr_workers, "llm": args.llm_workers},
+        use_cache=not args.no_cache,
+        dry_run=args.dry_run,
+        mark_only=args.mark_only,
+        state_path=args.state,
+    )
+    sys.exit(1 if any(r["error"] for r in results) else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+测试公共工具
+把仓库根目录加入导入路径，每个测试在独立的临时目录中运行（缓存和输出文件都写在这里），
+并提供在后台线程中运行的本地HTTP服务，代替真实的音频CDN和LLM接口
+"""
+
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class _Server(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        # 客户端提前断开（例如校验失败后放弃读取响应）是测试的预期情况
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+@pytest.fixture(autouse=True)
+def workdir(tmp_path, monkeypatch):
+    """在临时目录中运行测试，相对路径的缓存文件不会写入仓库"""
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def http_server():
+    """
+    启动本地HTTP服务
+
+    用法: base_url = http_server(Handler, **attrs)，Handler为BaseHTTPRequestHandler的子类，
+    attrs会设置为服务对象的属性（处理类通过self.server访问），测试结束后自动关闭
+    """
+    servers = []
+
+    def start(handler_class, **attrs):
+        server = _Server(("127.0.0.1", 0), handler_class)
+        for name, value in attrs.items():
+            setattr(server, name, value)
+        threading.Thread(target=server.serve_forever, args=(0.05,), daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
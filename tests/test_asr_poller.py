@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""识别任务轮询器：查询并发执行，临时错误在下一次查询时重试，只有任务失败或超时才结束"""
+
+import time
+import threading
+
+import pytest
+
+import backends
+import transcribe_with_volcengine
+from transcribe_with_volcengine import AsrPoller
+
+
+@pytest.fixture(autouse=True)
+def fast_polls(monkeypatch):
+    monkeypatch.setattr(transcribe_with_volcengine, "MIN_POLL_INTERVAL", 0.01)
+    monkeypatch.setattr(transcribe_with_volcengine, "MAX_POLL_INTERVAL", 0.02)
+
+
+@pytest.fixture
+def poller():
+    pollers = []
+
+    def create(query, workers=4):
+        pollers.append(AsrPoller(query, workers))
+        return pollers[-1]
+
+    yield create
+    for p in pollers:
+        p.close()
+
+
+def test_transient_errors_are_retried(poller):
+    calls = []
+
+    def query(task_id):
+        calls.append(task_id)
+        if len(calls) < 3:
+            raise ConnectionError("连接被重置")
+        return {"resp": {"code": 1000, "text": "完成"}}
+
+    result = poller(query).track("t1").result(timeout=5)
+
+    assert result["resp"]["text"] == "完成"
+    assert len(calls) == 3
+
+
+def test_task_failure_ends_immediately(poller):
+    calls = []
+
+    def query(task_id):
+        calls.append(task_id)
+        raise backends.TaskFailedError("任务失败: 音频无法下载")
+
+    with pytest.raises(backends.TaskFailedError):
+        poller(query).track("t1").result(timeout=5)
+    assert len(calls) == 1
+
+
+def test_deadline_reached_after_repeated_errors(poller):
+    def query(task_id):
+        raise ConnectionError("连接被重置")
+
+    with pytest.raises(TimeoutError) as excinfo:
+        poller(query).track("t1", max_wait=0.1).result(timeout=5)
+    assert isinstance(excinfo.value.__cause__, ConnectionError)
+
+
+def test_slow_query_does_not_block_other_tasks(poller):
+    release = threading.Event()
+
+    def query(task_id):
+        if task_id == "slow":
+            release.wait(5)
+        return {"resp": {"code": 1000, "text": task_id}}
+
+    p = poller(query)
+    slow = p.track("slow")
+    time.sleep(0.05)
+    fast = p.track("fast")
+
+    assert fast.result(timeout=2)["resp"]["text"] == "fast"
+    assert not slow.done()
+    release.set()
+    assert slow.result(timeout=2)["resp"]["text"] == "slow"
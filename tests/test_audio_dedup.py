@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""跨节目的重复音频识别：URL规范化，以及记录后按URL和Range哈希查找已有的转录结果"""
+
+import os
+import re
+from http.server import BaseHTTPRequestHandler
+from urllib.parse import parse_qs, urlparse
+
+import pytest
+
+import audio_dedup
+import transcript_cache
+
+# 按路径和 ?id= 区分的音频内容，/mirror.mp3 是 /play.mp3?id=1 的转载
+AUDIO = {
+    ("/play.mp3", "1"): os.urandom(300 * 1024),
+    ("/play.mp3", "2"): os.urandom(300 * 1024),
+}
+AUDIO[("/mirror.mp3", None)] = AUDIO[("/play.mp3", "1")]
+
+
+class AudioHandler(BaseHTTPRequestHandler):
+    """支持Range请求的音频服务"""
+
+    def do_GET(self):
+        parsed = urlparse(self.path)
+        data = AUDIO.get((parsed.path, parse_qs(parsed.query).get("id", [None])[0]))
+        if data is None:
+            self.send_response(404)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        start, end = map(int, re.fullmatch(r"bytes=(\d+)-(\d+)", self.headers["Range"]).groups())
+        end = min(end, len(data) - 1)
+        body = data[start:end + 1]
+        self.send_response(206)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.mark.parametrize("url, expected", [
+    ("https://CDN.example.com//audio/ep1.mp3?sign=abc&t=123#start", "cdn.example.com/audio/ep1.mp3"),
+    ("http://cdn.example.com/audio/ep1.mp3?X-Amz-Signature=1&X-Amz-Expires=60&utm_source=app",
+     "cdn.example.com/audio/ep1.mp3"),
+    ("https://host.example.com/play.mp3?id=123&token=x", "host.example.com/play.mp3?id=123"),
+    ("https://host.example.com/play.mp3?lang=zh&id=123", "host.example.com/play.mp3?id=123&lang=zh"),
+    ("https://host.example.com/%E8%8A%82%E7%9B%AE.mp3", "host.example.com/节目.mp3"),
+])
+def test_normalize_url(url, expected):
+    assert audio_dedup.normalize_url(url) == expected
+
+
+def test_normalize_url_keeps_episode_selector():
+    assert audio_dedup.normalize_url("https://host.example.com/play.mp3?id=1") != \
+        audio_dedup.normalize_url("https://host.example.com/play.mp3?id=2")
+
+
+@pytest.fixture
+def dedup(http_server, workdir, monkeypatch):
+    """启动音频服务，记录 /play.mp3?id=1 已转录，返回 (服务地址, 查找函数)"""
+    monkeypatch.setattr(audio_dedup, "HASH_BYTES", 64 * 1024)
+    base_url = http_server(AudioHandler)
+    db_path = str(workdir / "dedup.sqlite3")
+    cache_dir = str(workdir / "transcripts")
+
+    transcript_cache.put_transcript("key-1", "第一期的转录", cache_dir, title="第一期")
+    audio_dedup.record(audio_dedup.AudioIdentity(f"{base_url}/play.mp3?id=1&sign=old"), "volcengine|zh-CN",
+                       "key-1", episode_id="ep-1", path=db_path)
+
+    def find(audio_url, variant="volcengine|zh-CN", episode_id="ep-new"):
+        return audio_dedup.find(audio_dedup.AudioIdentity(audio_url), variant, episode_id, db_path, cache_dir)
+
+    return base_url, find
+
+
+def test_find_by_url_with_new_signature(dedup):
+    base_url, find = dedup
+
+    key, entry = find(f"{base_url}/play.mp3?sign=new&id=1")
+
+    assert key == "key-1"
+    assert entry["text"] == "第一期的转录"
+
+
+def test_find_by_hash_for_reposted_audio(dedup):
+    base_url, find = dedup
+
+    key, _ = find(f"{base_url}/mirror.mp3")
+
+    assert key == "key-1"
+
+
+def test_different_episode_parameter_not_reused(dedup):
+    base_url, find = dedup
+
+    assert find(f"{base_url}/play.mp3?id=2&sign=old") is None
+
+
+def test_different_variant_not_reused(dedup):
+    base_url, find = dedup
+
+    assert find(f"{base_url}/play.mp3?id=1", variant="sr|zh-CN") is None
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""并行分段下载：Range切分、断点续传、不支持HEAD/Range时的回退，以及长度和校验和检查"""
+
+import os
+import re
+import base64
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import downloader
+
+DATA = os.urandom(1024 * 1024 + 123)
+
+
+def file_handler(data=DATA, head=True, ranges=True, content_md5=None, truncate_first=None):
+    """
+    创建模拟音频CDN的请求处理类
+
+    参数:
+        data: 文件内容
+        head: 是否支持HEAD请求，为False时返回405
+        ranges: 是否支持Range请求，为False时忽略Range头返回完整文件
+        content_md5: HEAD响应中的Content-MD5，默认为正确的值
+        truncate_first: 第一个从0开始的Range请求只发送这么多字节后断开连接，模拟下载中断
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        requests = []
+        lock = threading.Lock()
+        truncated = False
+
+        def do_HEAD(self):
+            with Handler.lock:
+                Handler.requests.append(("HEAD", None))
+            if not head:
+                self.send_response(405)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.send_header("Content-Type", "audio/mpeg")
+            self.send_header("ETag", '"v1"')
+            if ranges:
+                self.send_header("Accept-Ranges", "bytes")
+            md5 = content_md5 or base64.b64encode(hashlib.md5(data).digest()).decode()
+            self.send_header("Content-MD5", md5)
+            self.end_headers()
+
+        def do_GET(self):
+            range_header = self.headers.get("Range")
+            with Handler.lock:
+                Handler.requests.append(("GET", range_header))
+            match = re.fullmatch(r"bytes=(\d+)-(\d+)", range_header or "")
+            if not ranges or not match:
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+                return
+
+            start, end = int(match.group(1)), int(match.group(2))
+            body = data[start:end + 1]
+            self.send_response(206)
+            self.send_header("Content-Length", str(len(body)))
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(data)}")
+            self.end_headers()
+            with Handler.lock:
+                truncate = truncate_first and start == 0 and not Handler.truncated
+                Handler.truncated = Handler.truncated or bool(truncate)
+            if truncate:
+                self.wfile.write(body[:truncate_first])
+                self.wfile.flush()
+                self.close_connection = True
+                return
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture(autouse=True)
+def small_parts(monkeypatch):
+    """把最小区间改小，让1MB的测试文件也会被切分为多个区间"""
+    monkeypatch.setattr(downloader, "MIN_PART_SIZE", 256 * 1024)
+
+
+def read(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def test_split_ranges_covers_file():
+    ranges = downloader.split_ranges(1000, workers=3, min_part_size=100)
+
+    assert len(ranges) == 3
+    assert ranges[0][0] == 0 and ranges[-1][1] == 999
+    assert all(b[0] == a[1] + 1 for a, b in zip(ranges, ranges[1:]))
+    assert downloader.split_ranges(1000, workers=8, min_part_size=600) == [(0, 999)]
+
+
+def test_parallel_range_download(http_server, workdir):
+    handler = file_handler()
+    url = http_server(handler) + "/episode.mp3"
+    output_path = str(workdir / "episode.mp3")
+
+    downloader.download(url, output_path, workers=4)
+
+    assert read(output_path) == DATA
+    assert not os.path.exists(downloader._state_path(output_path))
+    range_requests = [r for method, r in handler.requests if method == "GET"]
+    assert len(range_requests) == 4
+    assert all(r and r.startswith("bytes=") for r in range_requests)
+
+
+def test_resume_after_interrupted_range(http_server, workdir):
+    handler = file_handler(truncate_first=300 * 1024)
+    url = http_server(handler) + "/episode.mp3"
+    output_path = str(workdir / "episode.mp3")
+
+    with pytest.raises(Exception):
+        downloader.download(url, output_path, workers=2)
+    # 中断后保留断点状态，记录了第一个区间已写入的字节数
+    assert os.path.exists(downloader._state_path(output_path))
+    done = int(downloader._load_state(output_path, downloader.probe(url))["done"]["0"])
+    assert 0 < done <= 300 * 1024
+
+    handler.requests.clear()
+    downloader.download(url, output_path, workers=2)
+
+    assert read(output_path) == DATA
+    assert not os.path.exists(downloader._state_path(output_path))
+    # 只重新请求第一个区间剩余的部分
+    range_requests = [r for method, r in handler.requests if method == "GET"]
+    assert len(range_requests) == 1
+    assert range_requests[0].startswith(f"bytes={done}-")
+
+
+def test_fallback_when_head_not_supported(http_server, workdir):
+    handler = file_handler(head=False)
+    url = http_server(handler) + "/episode.mp3"
+    output_path = str(workdir / "episode.mp3")
+
+    downloader.download(url, output_path)
+
+    assert read(output_path) == DATA
+    assert [r for method, r in handler.requests if method == "GET"] == [None]
+
+
+def test_fallback_when_ranges_not_supported(http_server, workdir):
+    handler = file_handler(ranges=False)
+    url = http_server(handler) + "/episode.mp3"
+    output_path = str(workdir / "episode.mp3")
+
+    downloader.download(url, output_path, workers=4)
+
+    assert read(output_path) == DATA
+    assert [r for method, r in handler.requests if method == "GET"] == [None]
+
+
+def test_range_ignored_by_server_raises(http_server, workdir):
+    # HEAD声明支持Range，GET却忽略Range头返回完整文件
+    url = http_server(file_handler(ranges=False)) + "/episode.mp3"
+    info = dict(downloader.probe(url), accept_ranges=True)
+
+    with pytest.raises(IOError, match="Range"):
+        downloader.download(url, str(workdir / "episode.mp3"), info=info)
+
+
+def test_content_md5_mismatch_removes_file(http_server, workdir):
+    wrong_md5 = base64.b64encode(hashlib.md5(b"other").digest()).decode()
+    url = http_server(file_handler(content_md5=wrong_md5)) + "/episode.mp3"
+    output_path = str(workdir / "episode.mp3")
+
+    with pytest.raises(IOError, match="MD5"):
+        downloader.download(url, output_path)
+
+    assert not os.path.exists(output_path)
@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""持久化任务队列：领取和租约、各阶段的推进、识别任务失败后重新提交，以及失败重试"""
+
+import sqlite3
+import subprocess
+import sys
+import time
+
+import pytest
+
+import audio_dedup
+import backends
+import job_queue
+import transcript_cache
+
+URL = "https://www.xiaoyuzhoufm.com/episode/abc123"
+SUBMITTED = {}
+
+
+def fake_transcribe(source, language="zh-CN", audio_duration=None, utterance_file=None):
+    return "直接识别的文本"
+
+
+def fake_submit(audio_url, language="zh-CN"):
+    task_id = f"task-{len(SUBMITTED) + 1}"
+    SUBMITTED[task_id] = audio_url
+    return task_id
+
+
+def fake_wait(task_id, audio_duration=None, utterance_file=None):
+    if SUBMITTED.get(task_id) == "failed":
+        raise backends.TaskFailedError("任务失败: 音频无法下载")
+    return f"{task_id}的识别结果"
+
+
+@pytest.fixture(autouse=True)
+def queue(workdir, monkeypatch):
+    """使用临时数据库，替换页面抓取和音频标识，登记模拟的识别后端"""
+    SUBMITTED.clear()
+    identities = []
+
+    def audio_identity(audio_url, headers=None):
+        # 每次请求都返回不同的ETag，模拟CDN重新签名
+        identities.append(audio_url)
+        return f"etag:v{len(identities)}"
+
+    monkeypatch.setattr(job_queue, "extract_episode_metadata",
+                        lambda url: {"audio_url": "https://cdn.example.com/abc.mp3", "title": "测试节目",
+                                     "duration": 60})
+    monkeypatch.setattr(transcript_cache, "audio_identity", audio_identity)
+    monkeypatch.setattr(audio_dedup, "DEDUP_ENABLED", False)
+    monkeypatch.setattr(backends, "_asr_backends", dict(backends._asr_backends))
+    backends.register_asr("fake", f"{__name__}:fake_transcribe", submit=f"{__name__}:fake_submit",
+                          wait=f"{__name__}:fake_wait")
+    backends.register_asr("fake_direct", f"{__name__}:fake_transcribe")
+    conn = job_queue.connect(str(workdir / "jobs.sqlite3"))
+    yield conn, identities
+    conn.close()
+
+
+def get(conn, job_id):
+    return conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+
+
+def test_add_job_reuses_unfinished_job(queue):
+    conn, _ = queue
+
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+
+    assert job_queue.add_job(conn, URL, "fake", False) == job_id
+    assert job_queue.add_job(conn, URL, "fake", True) != job_id
+    job_queue.update_job(conn, job_id, stage="failed")
+    assert job_queue.add_job(conn, URL, "fake", False) != job_id
+
+
+def test_claim_respects_lease(queue):
+    conn, _ = queue
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+
+    job = job_queue.claim_job(conn)
+    assert job["id"] == job_id and job["locked_by"] == job_queue.WORKER_ID
+    # 租约有效期内不能再次领取
+    assert job_queue.claim_job(conn) is None
+
+    # 其它worker的租约过期后可以接手
+    job_queue.update_job(conn, job_id, locked_by="other-host:1",
+                         locked_at=time.time() - job_queue.LEASE_SECONDS - 1)
+    assert job_queue.claim_job(conn)["id"] == job_id
+
+
+def test_claim_takes_over_lock_of_exited_local_process(queue):
+    conn, _ = queue
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    job_queue.update_job(conn, job_id, locked_by=f"{job_queue.socket.gethostname()}:{process.pid}",
+                         locked_at=time.time())
+
+    assert job_queue.claim_job(conn)["id"] == job_id
+
+
+def test_claim_skips_delayed_and_finished_jobs(queue):
+    conn, _ = queue
+    delayed = job_queue.add_job(conn, URL, "fake", False)
+    job_queue.update_job(conn, delayed, next_run_at=time.time() + 60)
+    done = job_queue.add_job(conn, URL + "x", "fake", False)
+    job_queue.update_job(conn, done, stage="done")
+
+    assert job_queue.claim_job(conn) is None
+
+
+def test_advance_through_stages_with_stable_cache_key(queue):
+    conn, identities = queue
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+
+    stages = []
+    while get(conn, job_id)["stage"] not in job_queue.FINAL_STAGES:
+        stages.append(job_queue.advance(conn, get(conn, job_id)))
+
+    assert stages == ["scraped", "submitted", "transcribed", "done"]
+    job = get(conn, job_id)
+    assert job["task_id"] == "task-1"
+    # 音频标识只在抓取时获取一次，提交和转录阶段使用同一个缓存键
+    assert len(identities) == 1
+    key = transcript_cache.cache_key("abc123", "etag:v1", "fake")
+    assert transcript_cache.get_transcript(key)["text"] == "task-1的识别结果"
+    with open(job["transcript_file"], encoding="utf-8") as f:
+        assert f.read().endswith("task-1的识别结果")
+
+
+def test_cached_transcript_skips_recognition(queue):
+    conn, _ = queue
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+    job_queue.advance(conn, get(conn, job_id))
+    transcript_cache.put_transcript(transcript_cache.cache_key("abc123", "etag:v1", "fake"), "缓存的文本")
+
+    assert job_queue.advance(conn, get(conn, job_id)) == "transcribed"
+    assert SUBMITTED == {}
+
+
+def test_non_resumable_backend_transcribes_directly(queue):
+    conn, _ = queue
+    job_id = job_queue.add_job(conn, URL, "fake_direct", False)
+    job_queue.advance(conn, get(conn, job_id))
+
+    assert job_queue.advance(conn, get(conn, job_id)) == "transcribed"
+    assert get(conn, job_id)["task_id"] is None
+
+
+def test_failed_task_is_resubmitted(queue):
+    conn, _ = queue
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+    job_queue.advance(conn, get(conn, job_id))
+    job_queue.advance(conn, get(conn, job_id))
+    SUBMITTED["task-1"] = "failed"
+
+    with pytest.raises(backends.TaskFailedError):
+        job_queue.advance(conn, get(conn, job_id))
+    job = get(conn, job_id)
+    assert job["stage"] == "scraped" and job["task_id"] is None
+
+    assert job_queue.advance(conn, job) == "submitted"
+    assert get(conn, job_id)["task_id"] == "task-2"
+
+
+def test_run_job_retries_then_fails(queue, monkeypatch):
+    conn, _ = queue
+    job_id = job_queue.add_job(conn, URL, "fake", False)
+
+    def broken(url):
+        raise ConnectionError("页面无法访问")
+
+    monkeypatch.setattr(job_queue, "extract_episode_metadata", broken)
+    for attempt in range(1, job_queue.MAX_ATTEMPTS):
+        job_queue.run_job(conn, job_queue.claim_job(conn) or get(conn, job_id))
+        job = get(conn, job_id)
+        assert job["stage"] == "queued" and job["attempts"] == attempt
+        assert job["locked_by"] is None and job["next_run_at"] > time.time()
+        assert "页面无法访问" in job["error"]
+
+    job_queue.run_job(conn, get(conn, job_id))
+    assert get(conn, job_id)["stage"] == "failed"
+
+
+def test_old_database_gets_identity_column(queue, workdir):
+    _, identities = queue
+    path = str(workdir / "old.sqlite3")
+    old = sqlite3.connect(path)
+    old.execute("CREATE TABLE jobs (id INTEGER PRIMARY KEY AUTOINCREMENT, url TEXT NOT NULL, method TEXT NOT NULL,"
+                " summarize INTEGER NOT NULL, stage TEXT NOT NULL DEFAULT 'queued', audio_url TEXT, title TEXT,"
+                " duration REAL, task_id TEXT, transcript_file TEXT, summary_file TEXT, error TEXT,"
+                " attempts INTEGER NOT NULL DEFAULT 0, next_run_at REAL NOT NULL DEFAULT 0, locked_by TEXT,"
+                " locked_at REAL, created_at REAL NOT NULL, updated_at REAL NOT NULL)")
+    old.execute("INSERT INTO jobs (url, method, summarize, stage, audio_url, title, created_at, updated_at)"
+                " VALUES (?, 'fake', 0, 'scraped', 'https://cdn.example.com/abc.mp3', '测试节目', 0, 0)", (URL,))
+    old.commit()
+    old.close()
+
+    conn = job_queue.connect(path)
+    try:
+        # 升级前已抓取的任务在第一次需要缓存键时获取并保存音频标识
+        job_queue.advance(conn, get(conn, 1))
+        job_queue.advance(conn, get(conn, 1))
+        assert get(conn, 1)["audio_identity"] == "etag:v1"
+        assert len(identities) == 1
+    finally:
+        conn.close()
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""本地HTTP服务：提交任务时的请求校验"""
+
+import json
+import socket
+from urllib.parse import urlparse
+
+import pytest
+
+import server
+
+
+class FakeManager:
+    """记录提交的任务，不实际处理"""
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, url, method="volcengine", summarize=True):
+        self.submitted.append((url, method, summarize))
+        return server.Job(url, method, summarize), False
+
+
+@pytest.fixture
+def service(http_server):
+    manager = FakeManager()
+    base_url = http_server(server.RequestHandler, manager=manager)
+    return urlparse(base_url), manager
+
+
+def post(address, body, content_length=None, timeout=5):
+    """用原始套接字发送请求，可以构造无效的Content-Length；返回 (状态码, JSON响应)"""
+    length = len(body) if content_length is None else content_length
+    request = (f"POST /jobs HTTP/1.1\r\nHost: {address.netloc}\r\nContent-Type: application/json\r\n"
+               f"Content-Length: {length}\r\n\r\n").encode("ascii") + body
+    with socket.create_connection((address.hostname, address.port), timeout=timeout) as sock:
+        sock.sendall(request)
+        response = sock.makefile("rb")
+        status = int(response.readline().split()[1])
+        headers = {}
+        while True:
+            line = response.readline().strip()
+            if not line:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, json.loads(response.read(int(headers["content-length"])))
+
+
+def test_submit_job(service):
+    address, manager = service
+    status, data = post(address, json.dumps({"url": "https://www.xiaoyuzhoufm.com/episode/abc"}).encode())
+
+    assert status == 202
+    assert data["status"] == "queued" and data["coalesced"] is False
+    assert manager.submitted == [("https://www.xiaoyuzhoufm.com/episode/abc", "volcengine", True)]
+
+
+@pytest.mark.parametrize("content_length", ["-1", "abc"])
+def test_invalid_content_length_rejected(service, content_length):
+    address, manager = service
+
+    # 不读取请求体，立即返回而不是等待客户端断开
+    status, data = post(address, b"", content_length=content_length, timeout=2)
+
+    assert status == 400
+    assert "Content-Length" in data["error"]
+    assert manager.submitted == []
+
+
+def test_oversized_body_rejected(service):
+    address, manager = service
+
+    status, _ = post(address, b"", content_length=server.MAX_BODY_BYTES + 1, timeout=2)
+
+    assert status == 413
+    assert manager.submitted == []
+
+
+@pytest.mark.parametrize("body, error", [
+    (b"not json", "JSON"),
+    (b'{"method": "volcengine"}', "url"),
+    (b'{"url": "https://www.xiaoyuzhoufm.com/episode/abc", "method": "nope"}', "转录方法"),
+    (b'{"url": "https://www.xiaoyuzhoufm.com/episode/abc", "summarize": "false"}', "布尔值"),
+])
+def test_invalid_body_rejected(service, body, error):
+    address, manager = service
+
+    status, data = post(address, body)
+
+    assert status == 400
+    assert error in data["error"]
+    assert manager.submitted == []
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""流式总结：SSE解析、写入输出文件，以及连接中断时保留已生成的部分"""
+
+import json
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import summarize_transcript
+
+
+def sse_handler(deltas, finish=True, status=200):
+    """
+    创建模拟ARK流式接口的请求处理类
+
+    参数:
+        deltas: 依次推送的文本片段
+        finish: 是否在最后发送finish_reason和[DONE]；为False时直接断开连接，模拟流中断
+        status: 响应状态码
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)))
+            Handler.requests.append(body)
+            if status != 200:
+                self.send_response(status)
+                self.send_header("Content-Length", "0")
+                self.end_headers()
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.end_headers()
+            # 注释行和空行应被忽略
+            self.wfile.write(b": keep-alive\n\n")
+            for delta in deltas:
+                event = {"choices": [{"index": 0, "delta": {"content": delta}}]}
+                self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                self.wfile.flush()
+            if finish:
+                event = {"choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}],
+                         "usage": {"prompt_tokens": 10, "completion_tokens": 5}}
+                self.wfile.write(f"data: {json.dumps(event)}\n\ndata: [DONE]\n\n".encode("utf-8"))
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def llm(http_server, monkeypatch):
+    """启动模拟的LLM接口并让summarize_transcript指向它"""
+    monkeypatch.setenv("ARK_API_KEY", "test")
+
+    def start(handler_class):
+        monkeypatch.setattr(summarize_transcript, "API_URL", http_server(handler_class) + "/api/v3/chat/completions")
+        return handler_class
+
+    return start
+
+
+@pytest.fixture
+def transcript(workdir):
+    path = workdir / "节目.txt"
+    path.write_text("标题: 测试节目\n\n主持人介绍了本期的嘉宾，然后讨论了播客的制作流程。", encoding="utf-8")
+    return path
+
+
+def test_stream_completion_collects_deltas(llm):
+    llm(sse_handler(["第一段", "，第二段"]))
+    received = []
+    payload = {"model": summarize_transcript.MODEL, "messages": [{"role": "user", "content": "你好"}]}
+
+    text = summarize_transcript.stream_completion(payload, received.append)
+
+    assert text == "第一段，第二段"
+    assert received == ["第一段", "，第二段"]
+
+
+def test_stream_summary_written_to_file(llm, transcript):
+    handler = llm(sse_handler(["总结：", "嘉宾介绍", "和制作流程。"]))
+
+    output_file, summary = summarize_transcript.summarize_with_volcengine(str(transcript), use_cache=False,
+                                                                          stream=True)
+
+    assert summary == "总结：嘉宾介绍和制作流程。"
+    with open(output_file, encoding="utf-8") as f:
+        assert f.read() == summary
+    assert handler.requests[0]["stream"] is True
+    # 标题行不发送给LLM
+    assert "测试节目" not in handler.requests[0]["messages"][-1]["content"]
+
+
+def test_interrupted_stream_keeps_partial_summary(llm, transcript):
+    handler = llm(sse_handler(["总结：", "嘉宾介绍"], finish=False))
+    output_file = str(transcript.with_name("节目_summary.md"))
+
+    with pytest.raises(Exception, match="中断"):
+        summarize_transcript.summarize_with_volcengine(str(transcript), output_file, use_cache=False, stream=True)
+
+    # 已生成的部分保留在文件中，中断的补全不会被重新提交
+    with open(output_file, encoding="utf-8") as f:
+        assert f.read() == "总结：嘉宾介绍"
+    assert len(handler.requests) == 1
+
+
+def test_interrupted_stream_is_not_cached(llm, transcript):
+    llm(sse_handler(["不完整的总结"], finish=False))
+    with pytest.raises(Exception):
+        summarize_transcript.summarize_with_volcengine(str(transcript), stream=True)
+
+    handler = llm(sse_handler(["完整的总结"]))
+    _, summary = summarize_transcript.summarize_with_volcengine(str(transcript), stream=True)
+
+    assert summary == "完整的总结"
+    assert len(handler.requests) == 1
+
+
+def test_stream_error_status_raises(llm):
+    llm(sse_handler([], status=400))
+    payload = {"model": summarize_transcript.MODEL, "messages": [{"role": "user", "content": "你好"}]}
+
+    with pytest.raises(Exception, match="400"):
+        summarize_transcript.stream_completion(payload, lambda delta: None)
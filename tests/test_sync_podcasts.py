@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""播客同步：RSS解析、变化检测、条件请求的校验值，以及待处理节目的续传"""
+
+from http.server import BaseHTTPRequestHandler
+
+import pytest
+
+import sync_podcasts
+
+FEED = """<?xml version="1.0" encoding="UTF-8"?>
+<rss version="2.0" xmlns:itunes="http://www.itunes.com/dtds/podcast-1.0.dtd">
+<channel>
+  <title>测试播客</title>
+  <item>
+    <title>第二期</title>
+    <link>https://example.com/show</link>
+    <guid>ep-2</guid>
+    <enclosure url="https://cdn.example.com/ep2.mp3?sign=a" type="audio/mpeg"/>
+    <itunes:duration>01:02:03</itunes:duration>
+  </item>
+  <item>
+    <title>第一期</title>
+    <link>https://example.com/show</link>
+    <guid>ep-1</guid>
+    <enclosure url="https://cdn.example.com/ep1.mp3?sign=b" type="audio/mpeg"/>
+    <itunes:duration>1800</itunes:duration>
+  </item>
+  <item>
+    <title>没有音频的预告</title>
+  </item>
+</channel>
+</rss>
+"""
+
+
+def feed_handler(body=FEED, etag='"v1"'):
+    """创建模拟RSS订阅的请求处理类，请求头中的ETag与当前版本一致时返回304"""
+
+    class Handler(BaseHTTPRequestHandler):
+        requests = []
+
+        def do_GET(self):
+            Handler.requests.append(dict(self.headers))
+            if etag and self.headers.get("If-None-Match") == etag:
+                self.send_response(304)
+                self.end_headers()
+                return
+            data = body.encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "application/rss+xml")
+            self.send_header("Content-Length", str(len(data)))
+            if etag:
+                self.send_header("ETag", etag)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+@pytest.fixture
+def batch(monkeypatch):
+    """替换process_batch，记录提交的URL和节目信息，按error_urls中的URL模拟失败"""
+    calls = []
+    error_urls = set()
+
+    def process_batch(urls, transcription_method, summarize, stage_workers, use_cache=True, metadata=None,
+                      on_result=None):
+        calls.append({"urls": list(urls), "metadata": metadata})
+        results = []
+        for url in urls:
+            result = {"url": url, "transcript_file": f"{url}.txt", "summary_file": None,
+                      "error": "失败" if url in error_urls else None}
+            on_result(result)
+            results.append(result)
+        return results
+
+    monkeypatch.setattr(sync_podcasts, "process_batch", process_batch)
+    return calls, error_urls
+
+
+def test_parse_feed():
+    episodes = sync_podcasts.parse_feed(FEED.encode("utf-8"))
+
+    assert [e["key"] for e in episodes] == ["ep-2", "ep-1"]
+    assert episodes[0] == {
+        "key": "ep-2",
+        "url": "https://example.com/show",
+        "title": "第二期",
+        "audio_url": "https://cdn.example.com/ep2.mp3?sign=a",
+        "duration": 3723,
+    }
+    assert episodes[1]["duration"] == 1800
+
+
+def test_update_episodes_detects_changes():
+    state = {"shows": {}, "episodes": {}}
+    episodes = sync_podcasts.parse_feed(FEED.encode("utf-8"))
+    assert sync_podcasts.update_episodes("feed", episodes, state) == 2
+    for record in state["episodes"].values():
+        record["status"] = "done"
+
+    # 只有CDN签名变化：不重新处理，但更新音频地址
+    episodes[0]["audio_url"] = "https://cdn.example.com/ep2.mp3?sign=new"
+    assert sync_podcasts.update_episodes("feed", episodes, state) == 0
+    assert state["episodes"]["ep-2"]["audio_url"].endswith("sign=new")
+    assert state["episodes"]["ep-2"]["status"] == "done"
+
+    # 音频文件本身变化：重新处理
+    episodes[1]["audio_url"] = "https://cdn.example.com/ep1-fixed.mp3"
+    assert sync_podcasts.update_episodes("feed", episodes, state) == 1
+    assert state["episodes"]["ep-1"]["status"] == "pending"
+
+
+def test_fetch_show_uses_validators(http_server):
+    handler = feed_handler()
+    url = http_server(handler) + "/feed.xml"
+    show_state = {}
+
+    assert len(sync_podcasts.fetch_show(url, show_state)) == 2
+    assert show_state["etag"] == '"v1"'
+    assert sync_podcasts.fetch_show(url, show_state) is None
+    assert handler.requests[1]["If-None-Match"] == '"v1"'
+
+
+def test_fetch_show_without_episodes_drops_validators(http_server):
+    url = http_server(feed_handler(body='<?xml version="1.0"?><rss><channel></channel></rss>')) + "/feed.xml"
+    show_state = {"etag": '"old"', "last_modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+
+    assert sync_podcasts.fetch_show(url, show_state) == []
+    assert "etag" not in show_state and "last_modified" not in show_state
+
+
+def test_sync_processes_episodes_sharing_a_link(http_server, workdir, batch):
+    calls, _ = batch
+    url = http_server(feed_handler()) + "/feed.xml"
+    state_path = str(workdir / "sync_state.json")
+
+    results = sync_podcasts.sync([url], state_path=state_path)
+
+    # 两期节目的link都是播客主页，各自用音频地址处理，结果按节目记录
+    assert len(results) == 2
+    assert sorted(calls[0]["urls"]) == ["https://cdn.example.com/ep1.mp3?sign=b", "https://cdn.example.com/ep2.mp3?sign=a"]
+    assert calls[0]["metadata"]["https://cdn.example.com/ep1.mp3?sign=b"]["title"] == "第一期"
+    state = sync_podcasts.load_state(state_path)
+    assert {key: record["status"] for key, record in state["episodes"].items()} == {"ep-1": "done", "ep-2": "done"}
+
+
+def test_sync_resumes_failed_episodes(http_server, workdir, batch):
+    calls, error_urls = batch
+    url = http_server(feed_handler()) + "/feed.xml"
+    state_path = str(workdir / "sync_state.json")
+    error_urls.add("https://cdn.example.com/ep1.mp3?sign=b")
+
+    sync_podcasts.sync([url], state_path=state_path)
+    assert sync_podcasts.load_state(state_path)["episodes"]["ep-1"]["status"] == "failed"
+
+    # 订阅没有变化（304），之前失败的节目仍会重新处理
+    error_urls.clear()
+    sync_podcasts.sync([url], state_path=state_path)
+
+    assert calls[1]["urls"] == ["https://cdn.example.com/ep1.mp3?sign=b"]
+    assert sync_podcasts.load_state(state_path)["episodes"]["ep-1"]["status"] == "done"
+
+
+def test_mark_only_does_not_process(http_server, workdir, batch):
+    calls, _ = batch
+    state_path = str(workdir / "sync_state.json")
+    state = sync_podcasts.load_state(state_path)
+    state["episodes"]["old"] = {"url": "https://example.com/old", "audio_url": "https://cdn.example.com/old.mp3",
+                                "status": "failed"}
+    sync_podcasts.save_state(state, state_path)
+    url = http_server(feed_handler()) + "/feed.xml"
+
+    assert sync_podcasts.sync([url], mark_only=True, state_path=state_path) == []
+
+    assert calls == []
+    episodes = sync_podcasts.load_state(state_path)["episodes"]
+    assert episodes["ep-1"]["status"] == episodes["ep-2"]["status"] == "skipped"
+    assert episodes["old"]["status"] == "failed"
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""sr后端：合成PCM上的静音切分、片段重叠、RMS计算和按顺序传出的转录文本"""
+
+import array
+import sys
+import wave
+
+import pytest
+
+import pcm_audio
+import transcribe_with_sr
+
+SAMPLE_RATE = 8000
+SAMPLE_WIDTH = 2
+FRAME_MS = 20              # 能整除各分段时长，切分位置都落在整帧上
+FRAME_SAMPLES = SAMPLE_RATE * FRAME_MS // 1000
+BYTES_PER_SECOND = SAMPLE_RATE * SAMPLE_WIDTH
+
+
+def pcm(samples):
+    data = array.array('h', samples)
+    if sys.byteorder == 'big':
+        data.byteswap()
+    return data.tobytes()
+
+
+LOUD = pcm([8000, -8000] * (FRAME_SAMPLES // 2))
+QUIET = pcm([0] * FRAME_SAMPLES)
+
+
+def frames(*parts):
+    """按 (毫秒, 是否有声) 依次生成帧"""
+    for ms, loud in parts:
+        for _ in range(ms // FRAME_MS):
+            yield LOUD if loud else QUIET
+
+
+def segments(*parts):
+    return list(transcribe_with_sr.segment_audio(frames(*parts), SAMPLE_RATE, SAMPLE_WIDTH, frame_ms=FRAME_MS))
+
+
+def fake_recognizer(pcm, sample_rate, sample_width, language):
+    """按片段时长返回文本，便于核对片段顺序"""
+    return f"{round(len(pcm) / (sample_rate * sample_width))}秒"
+
+
+def test_rms():
+    assert pcm_audio.rms(LOUD) == pytest.approx(8000)
+    assert pcm_audio.rms(QUIET) == 0
+    assert pcm_audio.rms(b"") == 0
+    # 末尾不完整的采样被忽略
+    assert pcm_audio.rms(LOUD + b"\x7f") == pytest.approx(8000)
+    assert pcm_audio.rms(bytes([0x10, 0xf0]), sample_width=1) == pytest.approx(16)
+
+
+def test_cut_in_middle_of_silence_after_target():
+    # 31.2秒处有600毫秒静音，静音持续300毫秒（15帧）时在已有静音的中间切分
+    result = segments((31200, True), (600, False), (8800, True))
+    cut = 1560 + 15 - 15 // 2
+
+    assert [(index, start_ms) for index, start_ms, _ in result] == [(0, 0), (1, cut * FRAME_MS - 1000)]
+    first, second = result[0][2], result[1][2]
+    assert len(first) == cut * len(LOUD)
+    # 第二个片段以上一个片段末尾1秒（重叠时长）的音频开头
+    assert second[:BYTES_PER_SECOND] == first[-BYTES_PER_SECOND:]
+    assert len(first) + len(second) - BYTES_PER_SECOND == (1560 + 30 + 440) * len(LOUD)
+
+
+def test_silence_before_target_does_not_cut():
+    result = segments((10000, True), (900, False), (10000, True))
+
+    assert len(result) == 1
+    assert len(result[0][2]) == (500 + 45 + 500) * len(LOUD)
+
+
+def test_forced_cut_without_silence():
+    result = segments((120000, True))
+
+    assert [start_ms for _, start_ms, _ in result] == [0, 49000, 99000]
+    assert [len(data) // BYTES_PER_SECOND for _, _, data in result] == [50, 51, 21]
+
+
+def test_merge_overlap():
+    assert transcribe_with_sr.merge_overlap("今天我们聊一聊播客", "聊播客的制作") == "的制作"
+    assert transcribe_with_sr.merge_overlap("we talk about podcasts", "about podcasts and more") == "and more"
+    assert transcribe_with_sr.merge_overlap("", "开头") == "开头"
+
+
+@pytest.mark.parametrize("language, separator", [("zh-CN", ""), ("en-US", " ")])
+def test_transcribe_streams_text_in_order(workdir, language, separator):
+    wav_path = str(workdir / "episode.wav")
+    with wave.open(wav_path, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(SAMPLE_WIDTH)
+        wav.setframerate(SAMPLE_RATE)
+        wav.writeframes(b"".join(frames((90000, True))))
+
+    received = []
+    recognizer = f"{fake_recognizer.__module__}:fake_recognizer"
+    text = transcribe_with_sr.transcribe_with_sr(wav_path, language, recognizer=recognizer, workers=2,
+                                                 on_text=received.append)
+
+    # 50秒处强制切分，第二个片段带1秒重叠
+    assert text == separator.join(["50秒", "41秒"])
+    assert "".join(received) == text
@@ -0,0 +1,35 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""转录缓存：缓存键的组成和格式兼容"""
+
+import hashlib
+import json
+
+import transcript_cache
+
+
+def test_cache_key_depends_on_transcription_parameters():
+    key = transcript_cache.cache_key("abc123", "etag:v1", "volcengine")
+
+    assert key == transcript_cache.cache_key("abc123", "etag:v1", "volcengine", "zh-CN")
+    assert key != transcript_cache.cache_key("abc123", "etag:v2", "volcengine")
+    assert key != transcript_cache.cache_key("abc123", "etag:v1", "sr")
+    assert key != transcript_cache.cache_key("abc123", "etag:v1", "volcengine", "en-US")
+
+
+def test_cache_key_matches_earlier_format():
+    # 早期版本的缓存键包含说话人参数（流水线中总是False），已有的缓存条目仍能命中
+    raw = json.dumps(["abc123", "etag:v1", "volcengine", "zh-CN", False], ensure_ascii=False)
+
+    assert transcript_cache.cache_key("abc123", "etag:v1", "volcengine") == hashlib.sha256(raw.encode()).hexdigest()
+
+
+def test_put_and_get_transcript(workdir):
+    key = transcript_cache.cache_key("abc123", "etag:v1", "volcengine")
+    transcript_cache.put_transcript(key, "转录文本", title="测试节目")
+
+    entry = transcript_cache.get_transcript(key)
+
+    assert entry["text"] == "转录文本" and entry["title"] == "测试节目"
+    assert transcript_cache.get_transcript("missing") is None
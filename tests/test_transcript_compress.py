@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""转录文本预压缩：填充词、结巴重复、重说的近似重复句，以及不能被去掉的内容"""
+
+import pytest
+
+import transcript_compress
+from utterance_store import Utterance
+
+
+@pytest.mark.parametrize("text, expected", [
+    ("嗯，然后我们开始吧。", "我们开始吧。"),
+    ("呃呃我觉得，就是，这个问题很重要。", "我觉得，这个问题很重要。"),
+    ("那个。今天的嘉宾是一位作家。", "今天的嘉宾是一位作家。"),
+    ("um, so we begin.", "so we begin."),
+    ("Uhh the plan is simple.", "the plan is simple."),
+])
+def test_fillers_removed(text, expected):
+    assert transcript_compress.compress(text) == expected
+
+
+@pytest.mark.parametrize("text", [
+    "umbrella sales rose last year.",
+    "Emmy won the award.",
+    "Uhuru Kenyatta spoke.",
+    "Ummah is an Arabic word.",
+])
+def test_english_words_starting_like_fillers_kept(text):
+    assert transcript_compress.compress(text) == text
+
+
+def test_stutter_collapsed():
+    assert transcript_compress.compress("我我我觉得然后然后然后就好了。") == "我觉得然后就好了。"
+    assert transcript_compress.compress("we we we should go.") == "we should go."
+    assert transcript_compress.compress("对，对，对。") == "对。"
+
+
+@pytest.mark.parametrize("text", [
+    "我们需要研究研究这个问题。",
+    "你再考虑考虑吧。",
+    "大家可以讨论讨论。",
+    "谢谢大家。",
+])
+def test_reduplicated_words_kept(text):
+    assert transcript_compress.compress(text) == text
+
+
+def test_restart_keeps_complete_sentence():
+    assert transcript_compress.compress("我们今天讨论人工。我们今天讨论人工智能的发展。") == "我们今天讨论人工智能的发展。"
+    assert transcript_compress.compress("我们今天讨论人工智能的发展。我们今天讨论人工智能发展。") == "我们今天讨论人工智能的发展。"
+    assert transcript_compress.compress("这是第一句话。这是第一句话。") == "这是第一句话。"
+
+
+@pytest.mark.parametrize("text", [
+    "我们今天讨论人工智能的发展。我们今天讨论人工智能的风险。",
+    "第一季度收入增长了百分之十。第二季度收入增长了百分之十五。",
+    "他不同意这个方案。他同意这个方案。",
+    "他同意这个方案。他没同意这个方案。",
+    "We raised 10 million dollars. We raised 12 million dollars.",
+    "I think that we should go. I think that we should not go.",
+])
+def test_different_sentences_kept(text):
+    assert transcript_compress.compress(text) == text
+
+
+def test_normalize_punctuation():
+    assert transcript_compress.normalize("你好 , 世界 ! 再见。。") == "你好，世界！再见。"
+
+
+def test_compress_utterances_keeps_timing():
+    utterances = [
+        Utterance(0.0, 1.5, "1", "嗯，大家好。"),
+        Utterance(1.5, 2.0, "1", "嗯嗯。"),
+        Utterance(2.0, 4.0, "2", "大家好。"),
+        Utterance(4.0, 7.5, "2", "今天我们聊一聊播客。"),
+    ]
+
+    result = list(transcript_compress.compress_utterances(utterances))
+
+    # 只有填充词的话语被去掉，跨话语的重复句只保留第一次，其余话语的时间和说话人不变
+    assert result == [
+        Utterance(0.0, 1.5, "1", "大家好。"),
+        Utterance(4.0, 7.5, "2", "今天我们聊一聊播客。"),
+    ]
+
+
+def test_restart_across_utterances_keeps_both():
+    utterances = [Utterance(0.0, 2.0, "1", "我们今天讨论人工。"), Utterance(2.0, 5.0, "1", "我们今天讨论人工智能的发展。")]
+
+    # 上一句已经输出，不能再替换，更完整的一句也要保留
+    assert [u.text for u in transcript_compress.compress_utterances(utterances)] == [
+        "我们今天讨论人工。", "我们今天讨论人工智能的发展。"]
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+使用SpeechRecognition库分段转录音频
+把音频按静音位置切分为带少量重叠的片段，在多进程中并行识别，再按顺序拼接并去掉重叠部分的重复内容
+"""
+
+import os
+import math
+import importlib
+from concurrent.futures import ProcessPoolExecutor
+
+from dotenv import load_dotenv
+
+import metrics
+from pcm_audio import (FRAME_MS, SAMPLE_RATE, SAMPLE_WIDTH, SILENCE_THRESH_DB, decode_pcm_frames, is_mono_pcm_wav,
+                       read_wav_frames, rms)
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("transcribe_with_sr")
+
+# 分段配置（采样率、帧长和静音阈值见pcm_audio）
+SEGMENT_MS = 30000          # 片段的目标时长，达到后在下一个静音处切分
+MAX_SEGMENT_MS = 50000      # 片段的最大时长，超过后强制切分
+OVERLAP_MS = 1000           # 相邻片段的重叠时长
+MIN_SILENCE_MS = 300        # 至少持续这么久才算作静音
+SR_WORKERS = int(os.getenv("SR_WORKERS", "0")) or os.cpu_count() or 1
+
+# 识别函数，格式为 "模块:函数"，可替换为本地模型或测试用的替身
+SR_RECOGNIZER = os.getenv("SR_RECOGNIZER", "transcribe_with_sr:google_recognizer")
+
+
+def google_recognizer(pcm, sample_rate, sample_width, language):
+    """
+    使用Google Speech Recognition识别一段PCM音频
+
+    参数:
+        pcm: 单声道PCM数据
+        sample_rate: 采样率
+        sample_width: 采样字节数
+        language: 语言代码
+
+    返回:
+        str: 识别文本，片段中没有可识别的语音时返回空字符串
+    """
+    import speech_recognition as sr
+
+    recognizer = sr.Recognizer()
+    audio_data = sr.AudioData(pcm, sample_rate, sample_width)
+    try:
+        return recognizer.recognize_google(audio_data, language=language)
+    except sr.UnknownValueError:
+        return ""
+
+
+def load_recognizer(recognizer=None):
+    """把 "模块:函数" 形式的识别函数名解析为可调用对象"""
+    recognizer = recognizer or SR_RECOGNIZER
+    if callable(recognizer):
+        return recognizer
+    module_name, _, func_name = recognizer.partition(":")
+    return getattr(importlib.import_module(module_name), func_name)
+
+
+def segment_audio(frames, sample_rate, sample_width, frame_ms=FRAME_MS, segment_ms=SEGMENT_MS,
+                  max_segment_ms=MAX_SEGMENT_MS, overlap_ms=OVERLAP_MS, min_silence_ms=MIN_SILENCE_MS,
+                  silence_thresh_db=SILENCE_THRESH_DB):
+    """
+    把PCM帧流切分为按静音对齐、带重叠的片段
+
+    片段达到目标时长后，在下一段足够长的静音中间切分；超过最大时长仍没有静音时强制切分。
+    每个片段开头会带上前一个片段末尾overlap_ms的音频，避免切分处的词被截断。
+
+    参数:
+        frames: PCM帧的迭代器，每帧frame_ms毫秒
+        其余参数见模块顶部的分段配置
+
+    生成:
+        tuple: (片段序号, 片段起始时间（毫秒）, PCM数据)
+    """
+    max_amplitude = float(2 ** (8 * sample_width - 1))
+    thresh = max_amplitude * math.pow(10, silence_thresh_db / 20.0)
+    silence_frames = max(1, min_silence_ms // frame_ms)
+    overlap_bytes = int(sample_rate * overlap_ms / 1000) * sample_width
+
+    index = 0
+    start_ms = 0          # 当前片段（不含重叠部分）的起始时间
+    carry = b""           # 上一个片段末尾用于重叠的音频
+    buffer = []           # 当前片段的帧
+    quiet_run = 0         # 连续静音帧数
+    for frame in frames:
+        buffer.append(frame)
+        quiet_run = quiet_run + 1 if rms(frame, sample_width) < thresh else 0
+
+        duration = len(buffer) * frame_ms
+        cut = None
+        if duration >= segment_ms and quiet_run >= silence_frames:
+            # 在静音段中间切分
+            cut = len(buffer) - quiet_run // 2
+        elif duration >= max_segment_ms:
+            cut = len(buffer)
+        if cut is None:
+            continue
+
+        pcm = b"".join(buffer[:cut])
+        yield index, max(start_ms - overlap_ms, 0) if carry else start_ms, carry + pcm
+        index += 1
+        start_ms += cut * frame_ms
+        carry = pcm[-overlap_bytes:] if overlap_bytes else b""
+        buffer = buffer[cut:]
+        quiet_run = min(quiet_run, len(buffer))
+
+    if buffer:
+        yield index, max(start_ms - overlap_ms, 0) if carry else start_ms, carry + b"".join(buffer)
+
+
+def merge_overlap(previous, current, min_units=2, max_units=30):
+    """
+    去掉当前片段开头与上一片段结尾重复的内容
+
+    有空格的文本按词比较，中文等无空格文本按字符比较，取最长的重复部分
+
+    返回:
+        str: 去重后的当前片段文本
+    """
+    if not previous or not current:
+        return current
+    by_word = " " in current.strip()
+    prev_units = previous.split() if by_word else list(previous)
+    curr_units = current.split() if by_word else list(current)
+
+    for size in range(min(max_units, len(prev_units), len(curr_units)), min_units - 1, -1):
+        if prev_units[-size:] == curr_units[:size]:
+            rest = curr_units[size:]
+            return " ".join(rest) if by_word else "".join(rest)
+    return current
+
+
+def _recognize_segment(args):
+    """在子进程中识别一个片段"""
+    recognizer, pcm, sample_rate, sample_width, language = args
+    return load_recognizer(recognizer)(pcm, sample_rate, sample_width, language)
+
+
+def iter_transcribe_segments(segments, sample_rate, sample_width, language="zh-CN", recognizer=None,
+                             workers=None):
+    """
+    在进程池中并行识别片段，按片段顺序逐个返回去重后的文本
+
+    同时在处理中的片段数量有上限，内存占用不随音频长度增长
+
+    生成:
+        tuple: (片段序号, 片段起始时间（毫秒）, 文本)
+    """
+    recognizer = recognizer or SR_RECOGNIZER
+    workers = workers or SR_WORKERS
+    max_pending = workers * 2
+
+    previous = ""
+    pending = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        def drain(limit):
+            nonlocal previous
+            while len(pending) > limit:
+                index, start_ms, future = pending.pop(0)
+                text = merge_overlap(previous, future.result().strip())
+                previous = text or previous
+                yield index, start_ms, text
+
+        for index, start_ms, pcm in segments:
+            future = executor.submit(_recognize_segment, (recognizer, pcm, sample_rate, sample_width, language))
+            pending.append((index, start_ms, future))
+            yield from drain(max_pending)
+        yield from drain(0)
+
+
+def text_separator(language="zh-CN"):
+    """片段文本之间的分隔符，中文和日文不加空格"""
+    return "" if language.split("-")[0].lower() in ("zh", "ja") else " "
+
+
+def join_texts(texts, language="zh-CN"):
+    """按语言拼接各片段文本"""
+    return text_separator(language).join(text for text in texts if text)
+
+
+def transcribe_with_sr(audio_path, language="zh-CN", recognizer=None, workers=None, on_text=None):
+    """
+    使用SpeechRecognition库转录音频，长音频会分段并行识别
+
+    on_text: 可选，每个片段按顺序识别完成后以新增的文本调用（已带上分隔符，依次拼接即为返回的完整文本），
+    用于在转录过程中提前开始总结
+    """
+    try:
+        logger.info("正在使用Speech Recognition进行音频转录...")
+
+        # 单声道PCM WAV直接读取，其它格式通过ffmpeg流式解码，内存占用与音频长度无关
+        if is_mono_pcm_wav(audio_path):
+            sample_rate, sample_width, frames = read_wav_frames(audio_path)
+        else:
+            sample_rate, sample_width, frames = decode_pcm_frames(audio_path)
+
+        segments = segment_audio(frames, sample_rate, sample_width)
+        texts = []
+        for index, start_ms, text in iter_transcribe_segments(
+                segments, sample_rate, sample_width, language, recognizer, workers):
+            logger.info(f"片段{index + 1}识别完成（起始于{start_ms // 1000}秒）")
+            metrics.incr("sr_segments_total", help="sr后端识别的片段数")
+            if on_text and text:
+                on_text(text_separator(language) + text if any(texts) else text)
+            texts.append(text)
+
+        return join_texts(texts, language)
+
+    except Exception as e:
+        logger.error(f"使用Speech Recognition转录时出错: {e}")
+        raise
+
+
+def transcribe(source, language="zh-CN", audio_duration=None, utterance_file=None, on_text=None):
+    """后端注册表使用的统一入口，source为本地音频文件路径；该后端不产生话语级结果"""
+    return transcribe_with_sr(source, language=language, on_text=on_text)
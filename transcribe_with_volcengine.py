@@ -8,21 +8,36 @@
 import os
 import json
 import time
-import requests
+import heapq
+import random
+import itertools
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
+from urllib.parse import urlparse
 from dotenv import load_dotenv
 
+import backends
+import http_client
+import metrics
+import object_store
+import rate_limiter
+import utterance_store
+
 # 加载环境变量
 load_dotenv()
 
+logger = metrics.get_logger("transcribe_with_volcengine")
+
 # 火山引擎API配置
 VOLCENGINE_APPID = os.getenv("VOLCENGINE_APPID", "8503125436")
 VOLCENGINE_TOKEN = os.getenv("VOLCENGINE_TOKEN", "7ZUtArAGWSuh3qu2Z48EcFs4HhwTifYd")
 VOLCENGINE_CLUSTER = os.getenv("VOLCENGINE_CLUSTER", "volc_auc_common")
 
 # API URL
-SUBMIT_URL = "https://openspeech.bytedance.com/api/v1/auc/submit"
-QUERY_URL = "https://openspeech.bytedance.com/api/v1/auc/query"
+SUBMIT_URL = os.getenv("VOLCENGINE_SUBMIT_URL", "https://openspeech.bytedance.com/api/v1/auc/submit")
+QUERY_URL = os.getenv("VOLCENGINE_QUERY_URL", "https://openspeech.bytedance.com/api/v1/auc/query")
 
 # 请求头
 HEADERS = {
@@ -30,40 +45,61 @@ HEADERS = {
     'Authorization': f'Bearer; {VOLCENGINE_TOKEN}'
 }
 
-def transcribe_with_volcengine(audio_url=None, audio_path=None, language="zh-CN", with_speaker_info=False):
+# 轮询配置：首次查询间隔随音频时长增加，之后按指数退避并加入随机抖动
+MIN_POLL_INTERVAL = 2      # 最短查询间隔（秒）
+MAX_POLL_INTERVAL = 30     # 最长查询间隔（秒）
+POLL_BACKOFF = 1.5         # 每次查询未完成后间隔的增长倍数
+POLL_JITTER = 0.2          # 随机抖动比例
+DEFAULT_MAX_WAIT = 600     # 默认最长等待时间（秒）
+POLL_WORKERS = int(os.getenv("ASR_POLL_WORKERS", "4"))  # 同时进行的状态查询数量
+
+
+def poll_interval(attempt, audio_duration=None):
     """
-    使用火山引擎语音识别服务转录音频
+    计算第attempt次（从0开始）查询前的等待时间
     
     参数:
-        audio_url: 音频URL
-        audio_path: 本地音频文件路径
-        language: 语言代码，默认为中文
-        with_speaker_info: 是否返回说话人信息
-        
+        attempt: 已经查询的次数
+        audio_duration: 音频时长（秒），未知时按短音频处理
+    
     返回:
-        转录文本
+        float: 等待秒数
     """
-    if not audio_url and not audio_path:
-        raise ValueError("必须提供音频URL或本地音频文件路径")
-    
-    # 如果提供了本地文件路径，需要上传到可访问的URL
-    if audio_path and not audio_url:
-        # 这里需要实现文件上传逻辑，或者使用本地文件路径
-        # 由于火山引擎API需要可访问的URL，这里暂时抛出错误
-        raise NotImplementedError("暂不支持直接使用本地文件，请提供可访问的音频URL")
+    # 识别耗时大致与音频时长成正比，首次查询约在音频时长的1%之后
+    base = MIN_POLL_INTERVAL
+    if audio_duration:
+        base = min(max(audio_duration * 0.01, MIN_POLL_INTERVAL), MAX_POLL_INTERVAL)
     
-    # 确定音频格式
+    interval = min(base * (POLL_BACKOFF ** attempt), MAX_POLL_INTERVAL)
+    return interval * random.uniform(1 - POLL_JITTER, 1 + POLL_JITTER)
+
+
+def max_wait_time(audio_duration=None):
+    """根据音频时长计算最长等待时间（秒），长音频至少等待音频时长的一半"""
+    if not audio_duration:
+        return DEFAULT_MAX_WAIT
+    return max(DEFAULT_MAX_WAIT, audio_duration * 0.5)
+
+
+def detect_audio_format(audio_url):
+    """根据URL后缀确定音频格式"""
     audio_format = "mp3"  # 默认格式
     if audio_url:
-        if audio_url.lower().endswith(".mp3"):
-            audio_format = "mp3"
-        elif audio_url.lower().endswith(".wav"):
-            audio_format = "wav"
-        elif audio_url.lower().endswith(".m4a"):
-            audio_format = "m4a"
-        elif audio_url.lower().endswith(".ogg"):
-            audio_format = "ogg"
+        path = audio_url.lower().split("?", 1)[0]
+        for ext in ("mp3", "wav", "m4a", "ogg"):
+            if path.endswith("." + ext):
+                audio_format = ext
+                break
+    return audio_format
+
+
+def submit_task(audio_url, language="zh-CN", with_speaker_info=False):
+    """
+    提交音频识别任务
     
+    返回:
+        str: 任务ID
+    """
     # 构建请求数据
     submit_data = {
         "app": {
@@ -75,7 +111,7 @@ def transcribe_with_volcengine(audio_url=None, audio_path=None, language="zh-CN"
             "uid": f"user_{int(time.time())}"  # 使用时间戳作为用户ID
         },
         "audio": {
-            "format": audio_format,
+            "format": detect_audio_format(audio_url),
             "url": audio_url
         },
         "additions": {
@@ -86,71 +122,320 @@ def transcribe_with_volcengine(audio_url=None, audio_path=None, language="zh-CN"
         }
     }
     
-    try:
-        print(f"正在提交音频识别任务...")
-        # 提交任务
-        submit_response = requests.post(SUBMIT_URL, headers=HEADERS, data=json.dumps(submit_data))
+    logger.info(f"正在提交音频识别任务...")
+    limiter = rate_limiter.get_limiter("asr_submit", VOLCENGINE_CLUSTER)
+    with limiter.slot():
+        submit_response = http_client.post(SUBMIT_URL, headers=HEADERS, data=json.dumps(submit_data),
+                                           limiter=limiter)
         submit_response.raise_for_status()
-        
         submit_result = submit_response.json()
-        if 'resp' not in submit_result or submit_result['resp'].get('code') != 1000:
-            error_msg = submit_result.get('resp', {}).get('message', '未知错误')
-            raise Exception(f"提交任务失败: {error_msg}")
-        
-        task_id = submit_result['resp']['id']
-        print(f"任务提交成功，任务ID: {task_id}")
+    if 'resp' not in submit_result or submit_result['resp'].get('code') != 1000:
+        error_msg = submit_result.get('resp', {}).get('message', '未知错误')
+        raise Exception(f"提交任务失败: {error_msg}")
+    
+    task_id = submit_result['resp']['id']
+    logger.info(f"任务提交成功，任务ID: {task_id}")
+    return task_id
+
+
+def query_task(task_id):
+    """
+    查询一次识别任务状态
+    
+    返回:
+        dict: 任务完成时返回完整的查询结果，仍在处理中时返回None
+    """
+    query_data = {
+        "appid": VOLCENGINE_APPID,
+        "token": VOLCENGINE_TOKEN,
+        "cluster": VOLCENGINE_CLUSTER,
+        "id": task_id
+    }
+    
+    # 查询不会改变任务状态，可以安全重试
+    limiter = rate_limiter.get_limiter("asr_query", VOLCENGINE_CLUSTER)
+    with limiter.slot():
+        query_response = http_client.post(QUERY_URL, idempotent=True, headers=HEADERS, data=json.dumps(query_data),
+                                          limiter=limiter)
+        query_response.raise_for_status()
+        query_result = query_response.json()
+    if 'resp' not in query_result:
+        raise Exception("查询结果格式错误")
+    
+    code = query_result['resp'].get('code', 0)
+    message = query_result['resp'].get('message', '')
+    
+    # 任务完成
+    if code == 1000:
+        return query_result
+    
+    # 任务失败（包括任务不存在），同一个任务ID不会再有结果
+    if code < 2000:
+        raise backends.TaskFailedError(f"任务失败: {message}")
+    
+    return None
+
+
+class AsrPoller:
+    """
+    识别任务轮询器
+    
+    用一个后台线程统一跟踪多个任务ID，按各自的自适应间隔安排查询，到期的查询交给一个小线程池执行，
+    单个任务的慢查询或限流等待不会推迟其它任务。任务完成或失败时设置对应Future的结果并调用回调函数；
+    查询时的网络错误等临时错误在下一次查询时重试，只有识别服务报告任务失败或超过最长等待时间时才失败。
+    """
+    
+    def __init__(self, query=query_task, workers=None):
+        self._query = query
+        self._workers = workers or POLL_WORKERS
+        self._lock = threading.Condition()
+        self._heap = []     # (下次查询时间, 序号, 任务ID)
+        self._tasks = {}    # 任务ID -> 跟踪状态
+        self._counter = itertools.count()
+        self._thread = None
+        self._executor = None
+        self._closed = False
+    
+    def track(self, task_id, audio_duration=None, callback=None, max_wait=None):
+        """
+        开始跟踪一个识别任务
         
-        # 构建查询数据
-        query_data = {
-            "appid": VOLCENGINE_APPID,
-            "token": VOLCENGINE_TOKEN,
-            "cluster": VOLCENGINE_CLUSTER,
-            "id": task_id
-        }
+        参数:
+            task_id: 任务ID
+            audio_duration: 音频时长（秒），用于计算查询间隔
+            callback: 任务结束时调用的回调函数，参数为Future
+            max_wait: 最长等待时间（秒），默认根据音频时长计算
         
-        # 查询结果，最多等待10分钟
-        start_time = time.time()
-        max_wait_time = 600  # 10分钟
+        返回:
+            Future: 任务完成时结果为完整的查询结果
+        """
+        future = Future()
+        if callback:
+            future.add_done_callback(callback)
         
+        now = time.time()
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("轮询器已关闭")
+            self._tasks[task_id] = {
+                "future": future,
+                "attempt": 0,
+                "audio_duration": audio_duration,
+                "started": now,
+                "deadline": now + (max_wait or max_wait_time(audio_duration)),
+                # 在查询线程中输出日志时沿用调用方的节目ID
+                "context": contextvars.copy_context(),
+            }
+            heapq.heappush(self._heap, (now + poll_interval(0, audio_duration), next(self._counter), task_id))
+            self._ensure_thread()
+            self._lock.notify()
+        return future
+    
+    def pending(self):
+        """返回仍在跟踪中的任务数量"""
+        with self._lock:
+            return len(self._tasks)
+    
+    def close(self):
+        """停止轮询，未完成的任务会被取消"""
+        with self._lock:
+            self._closed = True
+            tasks = list(self._tasks.values())
+            self._tasks.clear()
+            self._heap.clear()
+            self._lock.notify()
+            executor = self._executor
+        if executor:
+            executor.shutdown(wait=False)
+        for state in tasks:
+            state["future"].cancel()
+    
+    def _ensure_thread(self):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="asr-query")
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name="asr-poller", daemon=True)
+            self._thread.start()
+    
+    def _next_due(self):
+        """等待并取出下一个到期的任务ID，轮询器关闭时返回None"""
+        with self._lock:
+            while True:
+                if self._closed:
+                    return None
+                if not self._heap:
+                    self._lock.wait()
+                    continue
+                due, _, task_id = self._heap[0]
+                delay = due - time.time()
+                if delay > 0:
+                    self._lock.wait(delay)
+                    continue
+                heapq.heappop(self._heap)
+                if task_id in self._tasks:
+                    return task_id
+    
+    def _run(self):
+        # 每个任务同一时间只在堆中或查询中的一处，不会对同一任务并发查询
         while True:
-            # 等待15秒后查询
-            time.sleep(15)
-            
-            query_response = requests.post(QUERY_URL, headers=HEADERS, data=json.dumps(query_data))
-            query_response.raise_for_status()
-            
-            query_result = query_response.json()
-            if 'resp' not in query_result:
-                raise Exception("查询结果格式错误")
-            
-            code = query_result['resp'].get('code', 0)
-            message = query_result['resp'].get('message', '')
-            
-            # 任务完成
-            if code == 1000:
-                text = query_result['resp'].get('text', '')
-                
-                # 保存详细结果到文件
-                result_file = f"volcengine_result_{task_id}.json"
-                with open(result_file, 'w', encoding='utf-8') as f:
-                    json.dump(query_result, f, ensure_ascii=False, indent=2)
-                print(f"详细结果已保存到: {result_file}")
-                
-                return text
-            
-            # 任务失败
-            elif code < 2000 and code != 1000:
-                raise Exception(f"任务失败: {message}")
-            
-            # 检查是否超时
-            if time.time() - start_time > max_wait_time:
-                raise Exception("等待超时，任务可能仍在处理中")
-            
-            print(f"任务处理中: {message}，继续等待...")
+            task_id = self._next_due()
+            if task_id is None:
+                return
+            with self._lock:
+                state = self._tasks.get(task_id)
+            if state is None:
+                continue
+            try:
+                self._executor.submit(state["context"].run, self._poll, task_id, state)
+            except RuntimeError:
+                # 轮询器已关闭
+                return
+    
+    def _poll(self, task_id, state):
+        """在查询线程中查询一次任务状态，未结束时重新安排下一次查询"""
+        error = None
+        try:
+            result = self._query(task_id)
+        except backends.TaskFailedError as e:
+            metrics.incr("asr_polls_total", help="识别任务状态查询次数", result="failed")
+            self._finish(task_id, exception=e)
+            return
+        except Exception as e:
+            metrics.incr("asr_polls_total", help="识别任务状态查询次数", result="error")
+            error = e
+            result = None
+        
+        if result is not None:
+            metrics.incr("asr_polls_total", help="识别任务状态查询次数", result="done")
+            self._finish(task_id, result=result)
+            return
+        if error is None:
+            metrics.incr("asr_polls_total", help="识别任务状态查询次数", result="pending")
+        
+        now = time.time()
+        if now > state["deadline"]:
+            timeout = TimeoutError(f"等待超时，任务可能仍在处理中，任务ID: {task_id}")
+            if error is not None:
+                timeout.__cause__ = error
+            self._finish(task_id, exception=timeout)
+            return
+        
+        waited = int(now - state["started"])
+        if error is not None:
+            logger.warning(f"查询任务状态失败（任务ID: {task_id}），稍后重试: {error}")
+        else:
+            logger.info(f"任务处理中（任务ID: {task_id}，已等待{waited}秒），继续等待...")
+        with self._lock:
+            # 任务已结束、被取消或被重新跟踪时不再安排
+            if self._tasks.get(task_id) is not state:
+                return
+            state["attempt"] += 1
+            delay = poll_interval(state["attempt"], state["audio_duration"])
+            heapq.heappush(self._heap, (now + delay, next(self._counter), task_id))
+            self._lock.notify()
+    
+    def _finish(self, task_id, result=None, exception=None):
+        with self._lock:
+            state = self._tasks.pop(task_id, None)
+        if state is None or state["future"].done():
+            return
+        if exception is not None:
+            state["future"].set_exception(exception)
+        else:
+            state["future"].set_result(result)
+
+
+_poller = None
+_poller_lock = threading.Lock()
+
+
+def get_poller():
+    """获取进程内共享的识别任务轮询器"""
+    global _poller
+    with _poller_lock:
+        if _poller is None:
+            _poller = AsrPoller()
+        return _poller
+
+
+def transcribe_with_volcengine(audio_url=None, audio_path=None, language="zh-CN", with_speaker_info=False,
+                               audio_duration=None, utterance_file=None):
+    """
+    使用火山引擎语音识别服务转录音频
+    
+    参数:
+        audio_url: 音频URL
+        audio_path: 本地音频文件路径
+        language: 语言代码，默认为中文
+        with_speaker_info: 是否返回说话人信息
+        audio_duration: 音频时长（秒），用于调整查询间隔，未知时可不提供
+        utterance_file: 保存话语级结果（起止时间、说话人）的文件路径，为None时不保存
+        
+    返回:
+        转录文本
+    """
+    if not audio_url and not audio_path:
+        raise ValueError("必须提供音频URL或本地音频文件路径")
+    
+    # 本地文件先存入对象存储，识别服务通过返回的URL读取，识别结束后删除
+    store = None
+    if audio_path and not audio_url:
+        store = object_store.get_store()
+        with metrics.span("upload"):
+            audio_url = store.put(audio_path)
+    
+    try:
+        # 提交任务
+        with metrics.span("asr_submit"):
+            task_id = submit_task(audio_url, language, with_speaker_info)
+        
+        return wait_for_result(task_id, audio_duration, utterance_file)
     
     except Exception as e:
-        print(f"使用火山引擎转录时出错: {e}")
+        logger.error(f"使用火山引擎转录时出错: {e}")
         raise
+    finally:
+        if store:
+            store.delete(audio_url)
+
+
+def transcribe(source, language="zh-CN", audio_duration=None, utterance_file=None):
+    """后端注册表使用的统一入口，source为音频URL或本地音频文件路径"""
+    if urlparse(source).scheme in ("http", "https"):
+        return transcribe_with_volcengine(audio_url=source, language=language, audio_duration=audio_duration,
+                                          utterance_file=utterance_file)
+    return transcribe_with_volcengine(audio_path=source, language=language, audio_duration=audio_duration,
+                                      utterance_file=utterance_file)
+
+
+def wait_for_result(task_id, audio_duration=None, utterance_file=None):
+    """
+    等待已提交的识别任务完成，可用于重新关联之前提交但尚未取回结果的任务
+    
+    参数:
+        task_id: 任务ID
+        audio_duration: 音频时长（秒），用于调整查询间隔
+        utterance_file: 保存话语级结果的文件路径，为None时不保存
+    
+    返回:
+        转录文本
+    """
+    # 由共享轮询器跟踪任务状态，直到完成、失败或超时
+    logger.info(f"等待识别结果（任务ID: {task_id}）...")
+    with metrics.span("asr_wait", task_id=task_id):
+        query_result = get_poller().track(task_id, audio_duration).result()
+    text = query_result['resp'].get('text', '')
+
+    # 保存带时间戳和说话人的话语级结果，没有话语信息时删除可能残留的旧文件
+    if utterance_file:
+        utterances = utterance_store.from_volcengine(query_result)
+        if utterances:
+            utterance_store.write_utterances(utterance_file, utterances)
+            logger.info(f"话语级结果已保存到: {utterance_file}")
+        else:
+            utterance_store.copy_store(None, utterance_file)
+
+    return text
 
 if __name__ == "__main__":
     import argparse
@@ -164,11 +449,13 @@ if __name__ == "__main__":
     args = parser.parse_args()
     
     try:
+        output_file = f"volcengine_transcript_{int(time.time())}.txt"
         text = transcribe_with_volcengine(
             audio_url=args.url,
             audio_path=args.path,
             language=args.language,
-            with_speaker_info=args.speaker
+            with_speaker_info=args.speaker,
+            utterance_file=utterance_store.sidecar_path(output_file)
         )
         
         print("\n转录文本预览:")
@@ -178,7 +465,6 @@ if __name__ == "__main__":
         print("-" * 40)
         
         # 保存文本到文件
-        output_file = f"volcengine_transcript_{int(time.time())}.txt"
         with open(output_file, 'w', encoding='utf-8') as f:
             f.write(text)
         print(f"完整转录已保存到: {output_file}")
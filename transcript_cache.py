@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+转录结果本地缓存
+以 节目ID + 音频标识 + 转录参数 作为键，把转录文本保存在磁盘上，
+重复处理同一期节目时直接读取缓存，不再重新提交语音识别任务
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import tempfile
+
+import requests
+from dotenv import load_dotenv
+
+import http_client
+import utterance_store
+
+# 加载环境变量
+load_dotenv()
+
+# 缓存目录和容量上限（超出后按最近使用时间淘汰）
+CACHE_DIR = os.getenv("TRANSCRIPT_CACHE_DIR", os.path.join(".cache", "transcripts"))
+CACHE_MAX_BYTES = int(float(os.getenv("TRANSCRIPT_CACHE_MAX_MB", "500")) * 1024 * 1024)
+
+
+def episode_id_from_url(url):
+    """从小宇宙节目URL中提取节目ID，无法识别时返回URL本身"""
+    match = re.search(r'/episode/([0-9a-zA-Z]+)', url or "")
+    return match.group(1) if match else url
+
+
+def audio_identity(audio_url, headers=None):
+    """
+    获取音频文件的标识
+
+    优先使用服务端返回的ETag，其次使用去掉查询参数的URL加文件大小，
+    这样CDN链接中的临时签名变化时仍能命中缓存。请求失败时退回到完整URL。
+    """
+    try:
+        response = http_client.head(audio_url, headers=headers, allow_redirects=True)
+        response.raise_for_status()
+        etag = response.headers.get('ETag')
+        if etag:
+            return f"etag:{etag.strip()}"
+        length = response.headers.get('Content-Length')
+        if length:
+            return f"size:{audio_url.split('?', 1)[0]}:{length}"
+    except requests.RequestException:
+        pass
+    return f"url:{audio_url}"
+
+
+def cache_key(episode_id, identity, method, language="zh-CN"):
+    """
+    根据节目和转录参数计算缓存键
+
+    流水线提交识别任务时不请求说话人信息，缓存的转录都不带说话人标注；
+    末尾的False是早期版本中说话人参数的位置，保留它使已有的缓存条目继续有效
+    """
+    raw = json.dumps([episode_id, identity, method, language, False], ensure_ascii=False)
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _entry_path(key, cache_dir=None):
+    return os.path.join(cache_dir or CACHE_DIR, f"{key}.json")
+
+
+def utterance_path(key, cache_dir=None):
+    """缓存条目对应的话语文件路径（起止时间、说话人），与转录文本一起淘汰"""
+    return os.path.join(cache_dir or CACHE_DIR, f"{key}{utterance_store.SUFFIX}")
+
+
+def get_transcript(key, cache_dir=None):
+    """
+    读取缓存的转录结果
+
+    返回:
+        dict: 缓存条目（包含 text、title 等字段），未命中时返回None
+    """
+    path = _entry_path(key, cache_dir)
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+
+    # 更新修改时间，作为LRU淘汰的依据
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+    return entry
+
+
+def put_transcript(key, text, cache_dir=None, max_bytes=None, **metadata):
+    """
+    写入转录结果到缓存，写入后按容量上限淘汰最久未使用的条目
+
+    参数:
+        key: 缓存键
+        text: 转录文本
+        metadata: 额外保存的信息，如标题、音频URL
+    """
+    cache_dir = cache_dir or CACHE_DIR
+    os.makedirs(cache_dir, exist_ok=True)
+
+    entry = dict(metadata, text=text, created_at=time.time())
+    # 先写临时文件再替换，避免并发读取到不完整的内容
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(entry, f, ensure_ascii=False)
+        os.replace(tmp_path, _entry_path(key, cache_dir))
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+    evict(cache_dir, max_bytes)
+
+
+def evict(cache_dir=None, max_bytes=None):
+    """淘汰最久未使用的缓存条目，直到总大小不超过上限"""
+    cache_dir = cache_dir or CACHE_DIR
+    max_bytes = CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    # 同一个缓存键的转录文本、话语文件和索引作为一个条目，按其中最近的修改时间淘汰
+    entries = {}
+    total = 0
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return
+    for name in names:
+        if name.endswith('.tmp'):
+            continue
+        try:
+            stat = os.stat(os.path.join(cache_dir, name))
+        except OSError:
+            continue
+        entry = entries.setdefault(name.split('.', 1)[0], [0, 0, []])
+        entry[0] = max(entry[0], stat.st_mtime)
+        entry[1] += stat.st_size
+        entry[2].append(name)
+        total += stat.st_size
+
+    for _, size, group in sorted(entries.values()):
+        if total <= max_bytes:
+            break
+        for name in group:
+            try:
+                os.unlink(os.path.join(cache_dir, name))
+            except OSError:
+                pass
+        total -= size
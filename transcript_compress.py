@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+转录文本预压缩
+在发送给LLM之前去掉口语填充词（嗯、呃、然后、就是说……）、识别产生的结巴重复和相邻的近似重复句，
+并统一空白和标点，减少提示词的token数和总结耗时。处理是确定性的，只对文本做一遍线性扫描，
+几小时的转录文本也能在一秒内完成
+"""
+
+import os
+import re
+import sys
+import argparse
+from collections import deque
+
+from dotenv import load_dotenv
+
+import metrics
+
+# 加载环境变量
+load_dotenv()
+
+logger = metrics.get_logger("transcript_compress")
+
+# 预压缩配置
+COMPRESS_ENABLED = os.getenv("TRANSCRIPT_COMPRESS", "0").lower() in ("1", "true", "yes")  # 默认不压缩
+# 相邻两句中较短一句按顺序包含在较长一句中、且长度不低于较长一句的该比例时，视为识别时重说的近似重复句
+SIMILARITY = float(os.getenv("TRANSCRIPT_COMPRESS_SIMILARITY", "0.8"))
+EXTRA_FILLERS = [w.strip() for w in os.getenv("TRANSCRIPT_COMPRESS_FILLERS", "").split(",") if w.strip()]
+DEDUP_WINDOW = 8            # 与最近多少个保留的句子比较是否完全重复
+MIN_SIMILAR_CHARS = 6       # 少于该字数的句子只去掉完全重复的
+
+CJK = '\u3400-\u9fff\uf900-\ufaff'
+
+# 语气词：出现在子句开头时去掉；英文语气词后面不能紧跟字母，避免截掉umbrella、Emmy这类单词的开头
+INTERJECTIONS = ["嗯+", "呃+", "唔+", "啊+", "哦+", "噢+", "诶", "欸",
+                 "emm+(?![A-Za-z])", "um+(?![A-Za-z])", "uh+(?![A-Za-z])"]
+# 出现在子句开头时去掉的口头禅
+LEADING_FILLERS = ["然后", "就是说", "怎么说呢"]
+# 单独构成子句时去掉的口头禅
+CLAUSE_FILLERS = ["额", "就是", "那个", "这个", "其实", "反正", "你知道吗", "你知道吧", "对吧", "是吧", "哈+"]
+
+# 全角化与子句切分使用的标点
+FULLWIDTH = {',': '，', '.': '。', '!': '！', '?': '？', ';': '；', ':': '：'}
+CLAUSE_PUNCT = '，。！？；、,!?;\n'
+SENTENCE_PUNCT = '。！？!?\n'
+
+ASCII_PUNCT_RE = re.compile(rf'(?<=[{CJK}])[ \t]*([,!?;:]|\.(?![0-9]))[ \t]*|[ \t]*([,!?;:])[ \t]*(?=[{CJK}])')
+CJK_SPACE_RE = re.compile(rf'(?<=[{CJK}，。！？；：、])[ \t　]+|[ \t　]+(?=[{CJK}，。！？；：、])')
+SPACE_RE = re.compile(r'[ \t　]+')
+NEWLINE_RE = re.compile(r' *\n[ \n]*')
+REPEAT_PUNCT_RE = re.compile(r'([，。！？；、])\1+|[，、；]+(?=[。！？])')
+CLAUSE_SPLIT_RE = re.compile(rf'(?<=[{CLAUSE_PUNCT}])(?![{CLAUSE_PUNCT}])')
+INLINE_FILLER_RE = re.compile(r'呃+|嗯+')
+REPEAT_CHAR_RE = re.compile(rf'([{CJK}])\1{{2,}}')
+# 多字的重复至少连续三次才合并，“研究研究”“考虑考虑”这类叠词保持原样
+REPEAT_UNIT_RE = re.compile(rf'([{CJK}]{{2,4}}?)\1{{2,}}')
+REPEAT_WORD_RE = re.compile(r'\b([A-Za-z]+)(?:\s+\1\b)+', re.IGNORECASE)
+KEY_RE = re.compile(rf'[^{CJK}0-9A-Za-z]+')
+# 重说时多出或缺少这些内容的两句话意思不同（数字、否定），不当作重复
+MEANINGFUL_RE = re.compile(r'[0-9零〇一二三四五六七八九十百千万亿两不没无非未别勿莫否]|not|never|no')
+
+
+def _alternation(words):
+    return '|'.join(sorted(words, key=len, reverse=True))
+
+
+def normalize(text):
+    """统一空白和标点：中文前后的半角标点转为全角，去掉中文之间的空格，合并重复的标点和空行"""
+    text = text.replace('\r\n', '\n').replace('\r', '\n')
+    text = ASCII_PUNCT_RE.sub(lambda m: FULLWIDTH[m.group(1) or m.group(2)], text)
+    text = CJK_SPACE_RE.sub('', text)
+    text = SPACE_RE.sub(' ', text)
+    text = NEWLINE_RE.sub('\n', text)
+    text = REPEAT_PUNCT_RE.sub(r'\1', text)
+    return text.strip()
+
+
+def _extra_chars(short, long):
+    """short按顺序包含在long中时，返回long中多出的字符，否则返回None"""
+    extra = []
+    i = 0
+    for c in long:
+        if i < len(short) and c == short[i]:
+            i += 1
+        else:
+            extra.append(c)
+    return ''.join(extra) if i == len(short) else None
+
+
+class TranscriptCompressor:
+    """
+    转录文本预压缩器
+
+    可以对整篇文本调用一次compress()，也可以按话语依次调用：重复句的比较会跨越多次调用
+
+    参数:
+        fillers: 额外的填充词，单独构成子句时去掉
+        similarity: 相邻句子的相似度阈值
+    """
+
+    def __init__(self, fillers=None, similarity=None):
+        self.similarity = SIMILARITY if similarity is None else similarity
+        interjections = _alternation(INTERJECTIONS)
+        self._leading_re = re.compile(rf'^(?:(?:{interjections}|{_alternation(LEADING_FILLERS)})[，、,\s]*)+',
+                                      re.IGNORECASE)
+        filler_words = INTERJECTIONS + LEADING_FILLERS + CLAUSE_FILLERS + EXTRA_FILLERS + list(fillers or [])
+        self._filler_only_re = re.compile(rf'(?:(?:{_alternation(filler_words)})[\s、]*)+', re.IGNORECASE)
+        self._recent = deque(maxlen=DEDUP_WINDOW)   # 最近保留的句子的键
+        self._last = None                            # 上一个保留的句子的键
+        self._last_clause = None
+
+    def _clean_clause(self, body):
+        body = self._leading_re.sub('', body).strip()
+        if not body or self._filler_only_re.fullmatch(body):
+            return ''
+        return body
+
+    def _sentences(self, text):
+        """按子句切分并清理，生成每个句子保留下来的子句列表 [[内容, 标点], ...]"""
+        sentence = []
+        for piece in CLAUSE_SPLIT_RE.split(text):
+            body = piece.rstrip(CLAUSE_PUNCT)
+            # 去掉填充词后可能留下连续的标点，只保留最强的一个
+            marks = piece[len(body):]
+            punct = next((c for c in marks if c in SENTENCE_PUNCT), marks[:1])
+            body = self._clean_clause(body)
+            # 与上一个子句完全相同的子句（如“对，对，对”）只保留一个
+            if body and body != self._last_clause:
+                self._last_clause = body
+                sentence.append([body, punct])
+            if not punct or punct not in SENTENCE_PUNCT:
+                continue
+            if sentence:
+                # 句末的子句被去掉时，把句末标点移到最后保留的子句上
+                sentence[-1][1] = punct
+                yield sentence
+            sentence = []
+        if sentence:
+            yield sentence
+
+    def _is_restart(self, key, last_key):
+        """
+        判断相邻两句是否是识别时的重说：较短一句是较长一句的一部分（如说了一半重新开始），
+        或者按顺序包含在长度相近的较长一句中（只多出个别字），并且多出的内容不涉及数字和否定
+        """
+        if min(len(key), len(last_key)) < MIN_SIMILAR_CHARS:
+            return False
+        short, long = sorted((key, last_key), key=len)
+        extra = _extra_chars(short, long)
+        if extra is None or MEANINGFUL_RE.search(extra):
+            return False
+        return short in long or len(short) >= len(long) * self.similarity
+
+    def _keep(self, out, sentence):
+        """判断句子是否与前面的句子重复，保留时追加到out"""
+        text = ''.join(body + punct + (' ' if punct[-1:] in ',!?;' else '') for body, punct in sentence)
+        key = KEY_RE.sub('', text).lower()
+        if not key or key in self._recent:
+            return
+        if self._last and self._is_restart(key, self._last):
+            if len(key) <= len(self._last):
+                return
+            # 重说后的句子更完整：替换上一句；上一句已在之前的调用中输出时两句都保留
+            if out:
+                out[-1] = text
+                self._recent.append(key)
+                self._last = key
+                return
+        out.append(text)
+        self._recent.append(key)
+        self._last = key
+
+    def compress(self, text):
+        """压缩一段文本，返回压缩后的文本（可能为空字符串）"""
+        out = []
+        # 结巴重复不会跨越标点，在切分子句前对整段文本处理一次
+        text = INLINE_FILLER_RE.sub('', normalize(text))
+        text = REPEAT_UNIT_RE.sub(r'\1', text)
+        text = REPEAT_CHAR_RE.sub(r'\1', text)
+        text = REPEAT_WORD_RE.sub(r'\1', text)
+        for sentence in self._sentences(text):
+            self._keep(out, sentence)
+        return ''.join(out).strip()
+
+
+def compress(text, fillers=None, similarity=None):
+    """压缩整篇转录文本"""
+    return TranscriptCompressor(fillers, similarity).compress(text)
+
+
+def compress_utterances(utterances, fillers=None, similarity=None):
+    """
+    逐句压缩话语级转录结果，去掉压缩后为空的话语
+
+    参数:
+        utterances: Utterance的可迭代对象
+
+    生成:
+        Utterance: 文本压缩后的话语
+    """
+    compressor = TranscriptCompressor(fillers, similarity)
+    for u in utterances:
+        text = compressor.compress(u.text)
+        if text:
+            yield u._replace(text=text)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="压缩转录文本（去掉填充词和重复句），并显示压缩前后的token估算")
+    parser.add_argument("transcript_file", help="转录文本文件路径")
+    parser.add_argument("-o", "--output", help="输出文件路径，不提供时只显示统计")
+    parser.add_argument("--similarity", type=float, default=SIMILARITY, help="相邻句子的相似度阈值")
+
+    args = parser.parse_args()
+    from summarize_transcript import estimate_tokens
+    try:
+        with open(args.transcript_file, 'r', encoding='utf-8') as f:
+            text = f.read()
+    except OSError as e:
+        print(f"错误: {e}")
+        sys.exit(1)
+
+    compressed = compress(text, similarity=args.similarity)
+    before, after = estimate_tokens(text), estimate_tokens(compressed)
+    print(f"压缩前: {len(text)}字，约{before} tokens")
+    print(f"压缩后: {len(compressed)}字，约{after} tokens（减少{(before - after) / max(before, 1):.1%}）")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(compressed)
+        print(f"已保存到: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
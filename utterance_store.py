@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+话语级转录结果存储
+把语音识别返回的每句话（起止时间、说话人、文本）按行保存为制表符分隔的文本文件，
+并附带一个小的偏移量索引（每STEP行记录一次起止时间、文件偏移和出现的说话人）。
+按时间段或说话人查找时只需定位到对应的块再顺序读取，不用解析整个识别结果
+"""
+
+import os
+import sys
+import json
+import bisect
+import shutil
+import argparse
+import tempfile
+from collections import namedtuple
+
+SUFFIX = ".utterances.tsv"
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = 1
+STEP = 64  # 每多少行记录一个索引项
+
+# start、end 为秒数
+Utterance = namedtuple("Utterance", "start end speaker text")
+
+
+def sidecar_path(transcript_file):
+    """转录文本文件对应的话语文件路径"""
+    return os.path.splitext(transcript_file)[0] + SUFFIX
+
+
+def index_path(path):
+    return path + INDEX_SUFFIX
+
+
+def from_volcengine(query_result):
+    """
+    从火山引擎的查询结果中提取话语列表
+
+    返回:
+        list: Utterance列表，结果中没有话语信息时为空列表
+    """
+    utterances = []
+    for item in query_result.get('resp', {}).get('utterances') or []:
+        text = item.get('text') or ''
+        if not text:
+            continue
+        speaker = (item.get('additions') or {}).get('speaker') or ''
+        utterances.append(Utterance(item.get('start_time', 0) / 1000, item.get('end_time', 0) / 1000,
+                                    str(speaker), text))
+    return utterances
+
+
+def _escape(text):
+    return text.replace('\\', '\\\\').replace('\t', '\\t').replace('\n', '\\n').replace('\r', '')
+
+
+def _unescape(text):
+    if '\\' not in text:
+        return text
+    out = []
+    chars = iter(text)
+    for char in chars:
+        if char == '\\':
+            char = {'t': '\t', 'n': '\n'}.get(next(chars, ''), '\\')
+        out.append(char)
+    return ''.join(out)
+
+
+def _parse_line(line):
+    start_ms, end_ms, speaker, text = line.rstrip('\n').split('\t', 3)
+    return int(start_ms), int(end_ms), speaker, text
+
+
+def _atomic_write(path, mode, write):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode, **({} if 'b' in mode else {'encoding': 'utf-8'})) as f:
+            write(f)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.unlink(tmp_path)
+        raise
+
+
+class _IndexBuilder:
+    """在写入或扫描话语文件时逐行建立索引"""
+
+    def __init__(self):
+        self.count = 0
+        self.max_end = 0
+        self.speakers = {}
+        self.blocks = []   # [块内首行开始时间, 截至该块末尾的最大结束时间, 文件偏移, 块内说话人]
+
+    def add(self, offset, start_ms, end_ms, speaker):
+        if self.count % STEP == 0:
+            self.blocks.append([start_ms, 0, offset, []])
+        block = self.blocks[-1]
+        self.max_end = max(self.max_end, end_ms)
+        block[1] = self.max_end
+        if speaker and speaker not in block[3]:
+            block[3].append(speaker)
+        if speaker:
+            self.speakers[speaker] = self.speakers.get(speaker, 0) + 1
+        self.count += 1
+
+    def to_dict(self, size):
+        return {"version": INDEX_VERSION, "size": size, "count": self.count, "duration": self.max_end / 1000,
+                "speakers": self.speakers, "step": STEP, "blocks": self.blocks}
+
+
+def write_utterances(path, utterances):
+    """
+    写入话语文件和索引
+
+    参数:
+        path: 话语文件路径
+        utterances: Utterance的可迭代对象，按开始时间排序
+
+    返回:
+        dict: 索引内容
+    """
+    builder = _IndexBuilder()
+
+    def write(f):
+        offset = 0
+        for u in utterances:
+            start_ms, end_ms = int(round(u.start * 1000)), int(round(u.end * 1000))
+            speaker = _escape(str(u.speaker or ''))
+            line = f"{start_ms}\t{end_ms}\t{speaker}\t{_escape(u.text)}\n".encode('utf-8')
+            builder.add(offset, start_ms, end_ms, speaker)
+            f.write(line)
+            offset += len(line)
+
+    _atomic_write(path, 'wb', write)
+    index = builder.to_dict(os.path.getsize(path))
+    _atomic_write(index_path(path), 'w', lambda f: json.dump(index, f, ensure_ascii=False,
+                                                              separators=(',', ':')))
+    return index
+
+
+def build_index(path):
+    """扫描话语文件重建索引"""
+    builder = _IndexBuilder()
+    offset = 0
+    with open(path, 'rb') as f:
+        for raw in f:
+            start_ms, end_ms, speaker, _ = _parse_line(raw.decode('utf-8'))
+            builder.add(offset, start_ms, end_ms, speaker)
+            offset += len(raw)
+    index = builder.to_dict(offset)
+    _atomic_write(index_path(path), 'w', lambda f: json.dump(index, f, ensure_ascii=False,
+                                                              separators=(',', ':')))
+    return index
+
+
+def read_index(path):
+    """读取索引，索引缺失或与话语文件不一致时重新建立"""
+    try:
+        with open(index_path(path), 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get("version") == INDEX_VERSION and index.get("size") == os.path.getsize(path):
+            return index
+    except (OSError, ValueError):
+        pass
+    return build_index(path)
+
+
+def iter_utterances(path, start=None, end=None, speaker=None):
+    """
+    按顺序读取话语，可以只读取某个时间段或某个说话人的部分
+
+    参数:
+        path: 话语文件路径
+        start: 开始时间（秒），返回结束时间晚于该时间的话语
+        end: 结束时间（秒），返回开始时间早于该时间的话语
+        speaker: 说话人
+
+    返回:
+        generator: Utterance
+    """
+    index = read_index(path)
+    blocks = index["blocks"]
+    start_ms = None if start is None else start * 1000
+    end_ms = None if end is None else end * 1000
+    speaker = None if speaker is None else _escape(str(speaker))
+
+    # 截至每块末尾的最大结束时间单调递增，第一个超过start的块之前不会有需要的话语
+    first = 0
+    if start_ms is not None:
+        first = bisect.bisect_right([block[1] for block in blocks], start_ms)
+
+    with open(path, 'rb') as f:
+        for block_start, _, offset, speakers in blocks[first:]:
+            if end_ms is not None and block_start >= end_ms:
+                return
+            if speaker is not None and speaker not in speakers:
+                continue
+            f.seek(offset)
+            for _ in range(index["step"]):
+                raw = f.readline()
+                if not raw:
+                    return
+                u_start, u_end, u_speaker, text = _parse_line(raw.decode('utf-8'))
+                if end_ms is not None and u_start >= end_ms:
+                    return
+                if start_ms is not None and u_end <= start_ms:
+                    continue
+                if speaker is not None and u_speaker != speaker:
+                    continue
+                yield Utterance(u_start / 1000, u_end / 1000, _unescape(u_speaker), _unescape(text))
+
+
+def map_times(path, mapper):
+    """
+    换算话语文件中的时间并重写文件，例如把预处理后音频中的时间换算回原始音频的时间
+
+    参数:
+        path: 话语文件路径
+        mapper: 把秒数换算为新秒数的函数
+    """
+    utterances = [u._replace(start=mapper(u.start), end=mapper(u.end)) for u in iter_utterances(path)]
+    return write_utterances(path, utterances)
+
+
+def copy_store(src, dst):
+    """
+    复制话语文件及其索引到dst；src为None或不存在时删除dst，避免留下与转录文本不一致的旧文件
+
+    返回:
+        bool: 是否复制了文件
+    """
+    if src and os.path.exists(src):
+        if os.path.abspath(src) != os.path.abspath(dst):
+            read_index(src)
+            for suffix in ("", INDEX_SUFFIX):
+                def write(f, source=src + suffix):
+                    with open(source, 'rb') as s:
+                        shutil.copyfileobj(s, f)
+                _atomic_write(dst + suffix, 'wb', write)
+        return True
+    for suffix in ("", INDEX_SUFFIX):
+        try:
+            os.unlink(dst + suffix)
+        except OSError:
+            pass
+    return False
+
+
+def format_time(seconds):
+    """把秒数格式化为 时:分:秒"""
+    seconds = int(seconds)
+    return f"{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def parse_time(value):
+    """解析 时:分:秒、分:秒 或秒数形式的时间"""
+    seconds = 0.0
+    for part in value.split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="按时间段或说话人查看话语级转录结果")
+    parser.add_argument("path", help="话语文件路径（.utterances.tsv）或对应的转录文本文件路径")
+    parser.add_argument("--start", type=parse_time, help="开始时间，如 00:10:00 或 600")
+    parser.add_argument("--end", type=parse_time, help="结束时间")
+    parser.add_argument("--speaker", help="只显示该说话人的话语")
+    parser.add_argument("--info", action="store_true", help="只显示时长、话语数量和说话人统计")
+
+    args = parser.parse_args()
+    path = args.path if args.path.endswith(SUFFIX) else sidecar_path(args.path)
+    if not os.path.exists(path):
+        print(f"错误: 找不到话语文件 {path}")
+        sys.exit(1)
+
+    if args.info:
+        index = read_index(path)
+        print(f"时长: {format_time(index['duration'])}，话语数: {index['count']}")
+        for speaker, count in sorted(index["speakers"].items()):
+            print(f"  说话人{_unescape(speaker)}: {count}句")
+        return
+
+    for u in iter_utterances(path, args.start, args.end, args.speaker):
+        speaker = f" 说话人{u.speaker}" if u.speaker else ""
+        print(f"[{format_time(u.start)}]{speaker}: {u.text}")
+
+
+if __name__ == "__main__":
+    main()
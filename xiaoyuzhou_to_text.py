@@ -11,130 +11,239 @@ import re
 import sys
 import json
 import time
+import hashlib
 import argparse
 import tempfile
 from pathlib import Path
+from contextlib import contextmanager
 from urllib.parse import urlparse
 
-import requests
-from bs4 import BeautifulSoup
-import speech_recognition as sr
-from pydub import AudioSegment
 from dotenv import load_dotenv
 
-# 导入火山引擎转录模块
-from transcribe_with_volcengine import transcribe_with_volcengine
+import audio_dedup
+import backends
+import downloader
+import episode_cache
+import http_client
+import metrics
+import object_store
+import search_index
+import transcript_cache
+import utterance_store
 
 # 加载环境变量
 load_dotenv()
 
+logger = metrics.get_logger("xiaoyuzhou_to_text")
+
 # 用户代理头
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.114 Safari/537.36',
 }
 
+# 识别前是否预处理音频，默认不预处理；audio_preprocess只在启用时导入
+PREPROCESS_AUDIO = os.getenv("AUDIO_PREPROCESS", "0").lower() in ("1", "true", "yes")
+
+
+# 页面内嵌的节目数据（__INITIAL_STATE__ 或 Next.js 的 __NEXT_DATA__）
+INITIAL_STATE_RE = re.compile(r'window\.__INITIAL_STATE__\s*=\s*')
+NEXT_DATA_RE = re.compile(r'<script[^>]*id=["\']__NEXT_DATA__["\'][^>]*>\s*')
+TITLE_RE = re.compile(r'<title[^>]*>(.*?)</title>', re.S | re.I)
+
+# 在页面源代码中搜索音频URL的模式，合并为一个正则只扫描一遍，按分组顺序决定优先级
+AUDIO_URL_RE = re.compile(
+    r'(?P<mp3>https?://[^"\']+\.mp3)'
+    r'|(?P<m4a>https?://[^"\']+\.m4a)'
+    r'|(?P<wav>https?://[^"\']+\.wav)'
+    r'|(?P<ogg>https?://[^"\']+\.ogg)'
+    r'|(?P<aac>https?://[^"\']+\.aac)'
+    r'|(?P<xyzcdn>https?://media\.xyzcdn\.net/[^"\']+)'
+)
+AUDIO_URL_PRIORITY = ("mp3", "m4a", "wav", "ogg", "aac", "xyzcdn")
+
+
+def embedded_data(html):
+    """不构建DOM，直接从页面源代码中解析内嵌的JSON数据"""
+    decoder = json.JSONDecoder()
+    for pattern in (INITIAL_STATE_RE, NEXT_DATA_RE):
+        match = pattern.search(html)
+        if not match:
+            continue
+        try:
+            data, _ = decoder.raw_decode(html, match.end())
+        except ValueError:
+            continue
+        if isinstance(data, dict):
+            yield data
+
+
+def parse_episodes(data):
+    """
+    从页面内嵌数据中列出带音频的节目
+    
+    返回:
+        list: 节目信息列表，每项包含 eid、title、audio_url、duration、pub_date
+    """
+    candidates = []
+    try:
+        if 'podcast' in data and 'episodes' in data['podcast']:
+            candidates.extend(data['podcast']['episodes'])
+    except TypeError:
+        pass
+    
+    # Next.js页面把数据放在 props.pageProps 下
+    page_props = (data.get('props') or {}).get('pageProps') or {}
+    if isinstance(page_props.get('episode'), dict):
+        candidates.append(page_props['episode'])
+    if isinstance(page_props.get('podcast'), dict) and isinstance(page_props['podcast'].get('episodes'), list):
+        candidates.extend(page_props['podcast']['episodes'])
+    
+    episodes = []
+    for episode in candidates:
+        if not isinstance(episode, dict) or not isinstance(episode.get('enclosure'), dict):
+            continue
+        if not episode['enclosure'].get('url'):
+            continue
+        episodes.append({
+            "eid": episode.get('eid'),
+            "title": episode.get('title'),
+            "audio_url": episode['enclosure']['url'],
+            "duration": episode['duration'] if isinstance(episode.get('duration'), (int, float)) else None,
+            "pub_date": episode.get('pubDate'),
+        })
+    return episodes
+
+
+def parse_episode_page(html):
+    """
+    从节目页面源代码中解析节目信息
+    
+    优先从内嵌JSON中直接提取（不构建DOM），失败时才解析HTML查找audio标签和音频链接，
+    最后在源代码中搜索音频URL
+    
+    返回:
+        dict: 包含 title、audio_url、duration
+    """
+    title_match = TITLE_RE.search(html)
+    metadata = {
+        "title": title_match.group(1).strip() if title_match else "未知标题",
+        "audio_url": None,
+        "duration": None,
+    }
+    
+    # 方法1: 从内嵌的JSON数据中查找音频URL
+    for data in embedded_data(html):
+        episodes = parse_episodes(data)
+        if episodes:
+            episode = episodes[0]
+            metadata["audio_url"] = episode["audio_url"]
+            metadata["duration"] = episode["duration"]
+            if episode["title"]:
+                metadata["title"] = episode["title"]
+            return metadata
+    
+    # 方法2和方法3需要解析HTML
+    from bs4 import BeautifulSoup
+    soup = BeautifulSoup(html, 'html.parser')
+    
+    # 方法2: 查找audio标签
+    logger.info("尝试从音频标签提取...")
+    for audio in soup.find_all('audio'):
+        if audio.get('src'):
+            metadata["audio_url"] = audio.get('src')
+            break
+        for source in audio.find_all('source'):
+            if source.get('src'):
+                metadata["audio_url"] = source.get('src')
+                break
+        if metadata["audio_url"]:
+            break
+    
+    # 方法3: 查找可能的音频链接
+    if not metadata["audio_url"]:
+        logger.info("尝试查找可能的音频链接...")
+        audio_extensions = ['.mp3', '.m4a', '.wav', '.ogg', '.aac']
+        for link in soup.find_all('a', href=True):
+            href = link.get('href')
+            if any(href.endswith(ext) for ext in audio_extensions):
+                metadata["audio_url"] = href
+                break
+    
+    # 方法4: 在页面源代码中直接搜索音频URL模式
+    if not metadata["audio_url"]:
+        logger.info("尝试在源代码中搜索音频URL...")
+        found = {}
+        for match in AUDIO_URL_RE.finditer(html):
+            found.setdefault(match.lastgroup, match.group())
+        for name in AUDIO_URL_PRIORITY:
+            if name in found:
+                metadata["audio_url"] = found[name]
+                break
+    
+    return metadata
+
 
-def extract_audio_url(xiaoyuzhou_url):
-    """从小宇宙URL中提取音频URL"""
+def extract_episode_metadata(xiaoyuzhou_url, use_cache=True):
+    """
+    获取节目的标题、音频URL和时长
+    
+    使用缓存时会带上ETag/Last-Modified发送条件请求，页面未变化时直接返回缓存的结果
+    
+    参数:
+        xiaoyuzhou_url: 小宇宙播客URL
+        use_cache: 是否使用节目信息缓存
+    
+    返回:
+        dict: 包含 title、audio_url、duration
+    """
     try:
         # 获取页面内容
-        print(f"正在从{xiaoyuzhou_url}提取音频...")
-        response = requests.get(xiaoyuzhou_url, headers=HEADERS)
-        response.raise_for_status()
-        
-        # 解析HTML
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 查找标题
-        title_tag = soup.find('title')
-        episode_title = title_tag.text.strip() if title_tag else "未知标题"
-        
-        # 方法1: 从脚本标签中查找音频URL
-        scripts = soup.find_all('script')
-        audio_url = None
-        
-        for script in scripts:
-            if script.string and 'window.__INITIAL_STATE__' in script.string:
-                # 提取JSON数据
-                match = re.search(r'window\.__INITIAL_STATE__\s*=\s*({.*});', script.string)
-                if match:
-                    data = json.loads(match.group(1))
-                    # 查找音频URL的可能路径
-                    try:
-                        if 'podcast' in data and 'episodes' in data['podcast']:
-                            for episode in data['podcast']['episodes']:
-                                if 'enclosure' in episode and 'url' in episode['enclosure']:
-                                    audio_url = episode['enclosure']['url']
-                                    if 'title' in episode:
-                                        episode_title = episode['title']
-                                    break
-                    except (KeyError, TypeError):
-                        continue
-        
-        # 方法2: 查找audio标签
-        if not audio_url:
-            print("尝试从音频标签提取...")
-            audio_tags = soup.find_all('audio')
-            for audio in audio_tags:
-                if audio.get('src'):
-                    audio_url = audio.get('src')
-                    break
-                for source in audio.find_all('source'):
-                    if source.get('src'):
-                        audio_url = source.get('src')
-                        break
-        
-        # 方法3: 查找可能的音频链接
-        if not audio_url:
-            print("尝试查找可能的音频链接...")
-            audio_extensions = ['.mp3', '.m4a', '.wav', '.ogg', '.aac']
-            links = soup.find_all('a', href=True)
-            
-            for link in links:
-                href = link.get('href')
-                if any(href.endswith(ext) for ext in audio_extensions):
-                    audio_url = href
-                    break
+        logger.info(f"正在从{xiaoyuzhou_url}提取音频...")
+        cached = episode_cache.get_metadata(xiaoyuzhou_url) if use_cache else None
+        headers = dict(HEADERS, **episode_cache.conditional_headers(cached))
+        response = http_client.get(xiaoyuzhou_url, headers=headers)
         
-        # 方法4: 在页面源代码中直接搜索音频URL模式
-        if not audio_url:
-            print("尝试在源代码中搜索音频URL...")
-            url_patterns = [
-                r'https?://[^"\']+\.mp3',
-                r'https?://[^"\']+\.m4a',
-                r'https?://[^"\']+\.wav',
-                r'https?://[^"\']+\.ogg',
-                r'https?://[^"\']+\.aac',
-                r'https?://media\.xyzcdn\.net/[^"\']+' 
-            ]
-            
-            for pattern in url_patterns:
-                matches = re.findall(pattern, response.text)
-                if matches:
-                    audio_url = matches[0]
-                    break
+        if response.status_code == 304 and cached:
+            logger.info(f"页面未变化，使用缓存的节目信息: {cached['audio_url']}")
+            return cached
+        response.raise_for_status()
         
-        if not audio_url:
+        metadata = parse_episode_page(response.text)
+        if not metadata["audio_url"]:
             raise ValueError("无法从页面中提取音频URL")
         
-        print(f"成功提取音频URL: {audio_url}")
-        return audio_url, episode_title
+        if use_cache:
+            metadata["etag"] = response.headers.get('ETag')
+            metadata["last_modified"] = response.headers.get('Last-Modified')
+            episode_cache.put_metadata(xiaoyuzhou_url, metadata)
+        
+        logger.info(f"成功提取音频URL: {metadata['audio_url']}")
+        return metadata
     
     except Exception as e:
-        print(f"提取音频URL时出错: {e}")
+        logger.error(f"提取音频URL时出错: {e}")
         raise
 
 
+def extract_audio_url(xiaoyuzhou_url, use_cache=True):
+    """从小宇宙URL中提取音频URL
+    
+    返回:
+        tuple: (音频URL, 节目标题)
+    """
+    metadata = extract_episode_metadata(xiaoyuzhou_url, use_cache)
+    return metadata["audio_url"], metadata["title"]
+
+
 def download_audio(audio_url, output_path=None):
     """下载音频文件到临时目录或指定路径"""
     try:
-        print(f"正在下载音频: {audio_url}")
+        logger.info(f"正在下载音频: {audio_url}")
         
-        response = requests.get(audio_url, headers=HEADERS, stream=True)
-        response.raise_for_status()
+        info = downloader.probe(audio_url, HEADERS)
         
         # 确定文件类型
-        content_type = response.headers.get('Content-Type', '')
+        content_type = info["content_type"]
         ext = '.mp3'  # 默认扩展名
         if 'audio/mpeg' in content_type:
             ext = '.mp3'
@@ -143,70 +252,36 @@ def download_audio(audio_url, output_path=None):
         elif 'audio/x-wav' in content_type or 'audio/wav' in content_type:
             ext = '.wav'
         
-        # 如果未指定输出路径，则使用临时文件
-        if not output_path:
-            temp_file = tempfile.NamedTemporaryFile(delete=False, suffix=ext)
-            output_path = temp_file.name
-            temp_file.close()
-        
-        # 下载文件
-        with open(output_path, 'wb') as f:
-            total_size = int(response.headers.get('content-length', 0))
-            downloaded = 0
-            chunk_size = 8192
-            
-            for chunk in response.iter_content(chunk_size=chunk_size):
-                if chunk:
-                    f.write(chunk)
-                    downloaded += len(chunk)
-                    # 显示下载进度
-                    if total_size > 0:
-                        done = int(50 * downloaded / total_size)
-                        sys.stdout.write('\r[%s%s] %d%%' % ('█' * done, ' ' * (50 - done), done * 2))
-                        sys.stdout.flush()
-            
-            if total_size > 0:
-                sys.stdout.write('\n')
+        # 下载文件（支持Range时并行分段下载）
+        if output_path:
+            downloader.download(audio_url, output_path, HEADERS, info=info)
+        else:
+            # 未指定输出路径时先下载到临时目录下由URL决定的固定文件名，中断后再次下载时可以续传。
+            # 多个节目共用同一音频时按锁排队，下载完成后移到本次调用独有的文件名，
+            # 调用方用完后删除自己的文件，不会影响同时在下载或使用同一音频的其它调用
+            url_hash = hashlib.sha1(audio_url.split('?', 1)[0].encode('utf-8')).hexdigest()[:16]
+            shared_path = os.path.join(tempfile.gettempdir(), f"xiaoyuzhou_{url_hash}{ext}")
+            with downloader.path_lock(shared_path):
+                downloader.download(audio_url, shared_path, HEADERS, info=info)
+                fd, output_path = tempfile.mkstemp(prefix=f"xiaoyuzhou_{url_hash}_", suffix=ext)
+                os.close(fd)
+                os.replace(shared_path, output_path)
         
-        print(f"音频下载完成: {output_path}")
+        logger.info(f"音频下载完成: {output_path}")
         return output_path
     
     except Exception as e:
-        print(f"下载音频时出错: {e}")
-        if not output_path and 'temp_file' in locals():
-            os.unlink(temp_file.name)
+        logger.error(f"下载音频时出错: {e}")
         raise
 
 
 
-def transcribe_with_sr(audio_path, language="zh-CN"):
-    """使用SpeechRecognition库转录音频（较短音频适用）"""
-    try:
-        print("正在使用Speech Recognition进行音频转录...")
-        
-        # 如果是mp3或m4a，转换为wav
-        if not audio_path.endswith('.wav'):
-            print("转换音频格式为WAV...")
-            sound = AudioSegment.from_file(audio_path)
-            wav_path = audio_path.rsplit('.', 1)[0] + '.wav'
-            sound.export(wav_path, format="wav")
-            audio_path = wav_path
-        
-        # 初始化识别器
-        recognizer = sr.Recognizer()
-        
-        # 加载音频文件
-        with sr.AudioFile(audio_path) as source:
-            audio_data = recognizer.record(source)
-        
-        # 使用Google Speech Recognition API
-        text = recognizer.recognize_google(audio_data, language=language)
-        return text
-    
-    except Exception as e:
-        print(f"使用Speech Recognition转录时出错: {e}")
-        print("注意: 此方法仅适用于短音频。对于长播客，请使用Whisper API。")
-        raise
+def transcript_filename(title):
+    """使用标题作为转录文件名的一部分"""
+    safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
+    if len(safe_title) > 50:
+        safe_title = safe_title[:50]
+    return f"{safe_title}.txt"
 
 
 def save_text(text, output_file=None, title=None):
@@ -223,71 +298,179 @@ def save_text(text, output_file=None, title=None):
                 f.write(f"标题: {title}\n\n")
             f.write(text)
         
-        print(f"转录文本已保存到: {output_file}")
+        logger.info(f"转录文本已保存到: {output_file}")
+        search_index.add_document(output_file)
         return output_file
     
     except Exception as e:
-        print(f"保存文本时出错: {e}")
+        logger.error(f"保存文本时出错: {e}")
         raise
 
 
-def process_url(url, output_file=None, transcription_method="volcengine"):
+@contextmanager
+def stage_limit(limits, stage):
+    """在某个处理阶段的并发限制（信号量）内执行，记录排队等待的时间；未设置限制时直接执行"""
+    semaphore = limits.get(stage) if limits else None
+    if semaphore is None:
+        yield
+        return
+    start = time.perf_counter()
+    with semaphore:
+        metrics.observe("stage_queue_seconds", time.perf_counter() - start,
+                        help="各阶段排队等待并发名额的时间（秒）", stage=stage)
+        yield
+
+
+def process_url(url, output_file=None, transcription_method="volcengine", limits=None,
+                use_cache=True, refresh=False, metadata=None, preprocess=None, on_text=None):
     """处理小宇宙URL，将音频转为文字
     
     参数:
         url: 小宇宙播客URL
         output_file: 输出文件路径
-        transcription_method: 转录方法，可选值: "whisper", "sr", "volcengine"
+        transcription_method: 转录方法，即后端注册表中语音识别后端的名称，如 "volcengine"、"sr"
+        limits: 各阶段并发限制，形如 {"scrape": 信号量, "asr": 信号量}，批量模式下使用
+        use_cache: 是否使用转录缓存
+        refresh: 忽略已有缓存重新转录，并用新结果更新缓存
+        metadata: 已知的节目信息（包含 audio_url、title，可选 duration），提供时跳过页面抓取
+        preprocess: 识别前是否预处理音频（单声道16kHz、压缩静音、重新编码），默认为AUDIO_PREPROCESS
+        on_text: 可选，识别过程中以新识别出的文本调用（只有支持流式输出的后端才会调用），命中缓存时不调用
     """
-    try:
-        # 验证URL格式
-        parsed_url = urlparse(url)
-        if not parsed_url.scheme or not parsed_url.netloc:
-            raise ValueError("无效的URL格式")
-        
-        # 1. 提取音频URL
-        print(f"正在从{url}提取音频...")
-        audio_url, title = extract_audio_url(url)
-        
-        # 2. 下载音频
-        audio_path = download_audio(audio_url)
-        
-        # 3. 转录音频
-        text = None
-        if transcription_method == "volcengine":
-            print("使用火山引擎进行转录...")
-            text = transcribe_with_volcengine(audio_url=audio_url)
-        else:  # sr
-            print("使用Speech Recognition进行转录...")
-            text = transcribe_with_sr(audio_path)
-        
-        # 4. 保存文本
-        if not output_file and title:
-            # 使用标题作为文件名的一部分
-            safe_title = re.sub(r'[^\w\s-]', '', title).strip().replace(' ', '_')
-            if len(safe_title) > 50:
-                safe_title = safe_title[:50]
-            output_file = f"{safe_title}.txt"
-        
-        result_file = save_text(text, output_file, title)
-        
-        # 5. 清理临时文件
-        if os.path.exists(audio_path):
-            os.unlink(audio_path)
-        
-        print(f"处理完成! 文本已保存到: {result_file}")
-        return result_file, text
-    
-    except Exception as e:
-        print(f"处理URL时出错: {e}")
-        raise
-    finally:
-        # 确保临时文件被删除
-        if 'audio_path' in locals() and os.path.exists(audio_path):
-            try:
+    with metrics.episode_context(transcript_cache.episode_id_from_url(url)):
+        try:
+            # 验证URL格式
+            parsed_url = urlparse(url)
+            if not parsed_url.scheme or not parsed_url.netloc:
+                raise ValueError("无效的URL格式")
+            backend = backends.get_asr(transcription_method)
+            if preprocess is None:
+                preprocess = PREPROCESS_AUDIO
+            if preprocess and not backend.files:
+                logger.warning(f"{backend.name}不支持本地音频文件，跳过音频预处理")
+                preprocess = False
+            # 只接受URL的后端需要从对象存储读取处理后的音频，本地存储默认只监听本机，远程服务无法访问，
+            # 在下载音频之前就跳过预处理
+            if preprocess and backend.input == "url" and not object_store.is_public():
+                logger.warning(f"{backend.name}需要通过URL读取预处理后的音频，但本地对象存储只能在本机访问，跳过音频预处理；"
+                               f"设置OBJECT_STORE_PUBLIC_URL或OBJECT_STORE后可以启用")
+                preprocess = False
+            
+            # 1. 提取音频URL
+            if not metadata:
+                logger.info(f"正在从{url}提取音频...")
+                with stage_limit(limits, "scrape"), metrics.span("scrape"):
+                    metadata = extract_episode_metadata(url, use_cache)
+            audio_url, title = metadata["audio_url"], metadata["title"]
+            if not output_file and title:
+                output_file = transcript_filename(title)
+            # 话语级结果（起止时间、说话人）保存在转录文件旁边
+            utterance_file = utterance_store.sidecar_path(output_file) if output_file else None
+            
+            # 2. 查询转录缓存
+            audio_path = None
+            processed_path = None
+            language = "zh-CN"
+            text = None
+            key = None
+            identity = None
+            episode_id = transcript_cache.episode_id_from_url(url)
+            # 预处理后的识别结果可能与直接识别略有不同，分开缓存
+            method_key = f"{transcription_method}+preprocess" if preprocess else transcription_method
+            variant = f"{method_key}|{language}"
+            if use_cache:
+                key = transcript_cache.cache_key(
+                    episode_id,
+                    transcript_cache.audio_identity(audio_url, HEADERS),
+                    method_key,
+                    language,
+                )
+                if not refresh:
+                    cached = transcript_cache.get_transcript(key)
+                    if cached:
+                        logger.info("命中转录缓存，跳过语音识别")
+                        metrics.incr("transcript_cache_hits_total", help="命中转录缓存的次数")
+                        text = cached["text"]
+                        if utterance_file:
+                            utterance_store.copy_store(transcript_cache.utterance_path(key), utterance_file)
+                
+                # 其它节目URL下的相同音频已经转录过时复用其结果
+                if text is None and audio_dedup.DEDUP_ENABLED:
+                    identity = audio_dedup.AudioIdentity(audio_url, HEADERS)
+                    match = None
+                    if not refresh:
+                        with metrics.span("dedup"):
+                            match = audio_dedup.find(identity, variant, episode_id)
+                    if match:
+                        match_key, entry = match
+                        text = entry["text"]
+                        transcript_cache.put_transcript(key, text, title=title, url=url, audio_url=audio_url)
+                        utterance_store.copy_store(transcript_cache.utterance_path(match_key),
+                                                   transcript_cache.utterance_path(key))
+                        if utterance_file:
+                            utterance_store.copy_store(transcript_cache.utterance_path(key), utterance_file)
+            
+            # 3. 转录音频（只有需要本地文件的转录方式才下载音频）
+            if text is None:
+                with stage_limit(limits, "asr"):
+                    # 先删除可能残留的旧话语文件，支持话语级结果的后端会重新写入
+                    if utterance_file:
+                        utterance_store.copy_store(None, utterance_file)
+                    source = audio_url
+                    offset_map = None
+                    if backend.input == "file" or preprocess:
+                        with metrics.span("download"):
+                            source = audio_path = download_audio(audio_url)
+                    if preprocess:
+                        import audio_preprocess
+                        try:
+                            with metrics.span("preprocess"):
+                                processed_path, offset_map = audio_preprocess.preprocess(audio_path)
+                            source = processed_path
+                        except Exception as e:
+                            logger.warning(f"音频预处理失败，使用原始音频: {e}")
+                    logger.info(f"使用{backend.description or backend.name}进行转录...")
+                    options = {"on_text": on_text} if on_text and backend.streaming else {}
+                    with metrics.span("asr", method=transcription_method):
+                        text = backend(source, language=language,
+                                       audio_duration=offset_map.duration if offset_map else metadata.get("duration"),
+                                       utterance_file=utterance_file, **options)
+                    # 话语时间换算回原始音频的时间
+                    if offset_map and utterance_file and os.path.exists(utterance_file):
+                        utterance_store.map_times(utterance_file, offset_map.to_original)
+                
+                if key:
+                    transcript_cache.put_transcript(key, text, title=title, url=url, audio_url=audio_url)
+                    utterance_store.copy_store(utterance_file, transcript_cache.utterance_path(key))
+                if identity:
+                    audio_dedup.record(identity, variant, key, episode_id)
+            
+            # 4. 保存文本
+            result_file = save_text(text, output_file, title)
+            
+            # 5. 清理临时文件
+            if audio_path and os.path.exists(audio_path):
                 os.unlink(audio_path)
-            except:
-                pass
+            
+            logger.info(f"处理完成! 文本已保存到: {result_file}")
+            return result_file, text
+        
+        except Exception as e:
+            logger.error(f"处理URL时出错: {e}")
+            raise
+        finally:
+            # 确保临时文件被删除
+            if 'audio_path' in locals() and audio_path and os.path.exists(audio_path):
+                try:
+                    os.unlink(audio_path)
+                except:
+                    pass
+            if 'processed_path' in locals() and processed_path:
+                import audio_preprocess
+                for path in (processed_path, audio_preprocess.offsets_path(processed_path)):
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
 
 
 def main():
@@ -295,15 +478,23 @@ def main():
     parser = argparse.ArgumentParser(description="将小宇宙播客转换为文字")
     parser.add_argument("url", help="小宇宙播客的URL")
     parser.add_argument("-o", "--output", help="输出文件路径")
-    parser.add_argument("--method", choices=["volcengine", "sr"], default="volcengine",
-                        help="转录方法: volcengine (火山引擎), sr (Speech Recognition)")
+    parser.add_argument("--method", choices=backends.asr_names(), default=backends.DEFAULT_ASR,
+                        help=f"转录方法: {backends.help_text('asr')}")
     parser.add_argument("--summarize", action="store_true",
                         help="转录完成后使用LLM进行总结")
+    parser.add_argument("--no-cache", action="store_true", help="不读取也不写入转录和总结缓存")
+    parser.add_argument("--refresh", action="store_true", help="忽略已有缓存，重新转录、总结并更新缓存")
+    parser.add_argument("--preprocess", action="store_true", default=None,
+                        help="识别前预处理音频（单声道16kHz、压缩静音、重新编码），减少上传和识别时间")
+    parser.add_argument("--compress", action="store_true", default=None,
+                        help="总结前先在本地去掉填充词和重复句（与--summarize一起使用）")
     
     args = parser.parse_args()
     
     try:
-        file_path, text = process_url(args.url, args.output, args.method)
+        file_path, text = process_url(args.url, args.output, args.method,
+                                      use_cache=not args.no_cache, refresh=args.refresh,
+                                      preprocess=args.preprocess)
         print("\n转录文本预览:")
         print("-" * 40)
         preview = text[:500] + "..." if len(text) > 500 else text
@@ -314,9 +505,11 @@ def main():
         # 如果指定了总结选项，则调用总结功能
         if args.summarize:
             try:
-                from summarize_transcript import summarize_with_volcengine
                 print("\n正在使用LLM对转录内容进行总结...")
-                summary_path, summary = summarize_with_volcengine(file_path)
+                options = {} if args.compress is None else {"compress": args.compress}
+                summary_path, summary = backends.get_summarizer()(
+                    file_path, use_cache=not args.no_cache, refresh=args.refresh, **options
+                )
                 print("\n总结预览:")
                 print("-" * 40)
                 preview = summary[:500] + "..." if len(summary) > 500 else summary